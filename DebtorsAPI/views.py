@@ -7,8 +7,11 @@ from rest_framework.response import Response
 from app1.models import AccMaster
 import jwt
 from django.conf import settings
+from task_backend.authentication import decode_token
+from task_backend.report_cache import cache_report
 
 @api_view(['GET'])
+@cache_report
 def get_debtors_list(request):
     """Return all debtors with Balance > 0 (Balance = debit - credit) and super_code='DEBTO'"""
     try:
@@ -19,7 +22,7 @@ def get_debtors_list(request):
         
         token = auth_header.split(' ')[1]
         try:
-            payload = jwt.decode(token, settings.SECRET_KEY, algorithms=['HS256'])
+            payload = decode_token(token)
             client_id = payload.get('client_id')
         except jwt.ExpiredSignatureError:
             return Response({'success': False, 'error': 'Token expired'}, status=401)
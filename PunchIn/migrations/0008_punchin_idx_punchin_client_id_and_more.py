@@ -0,0 +1,22 @@
+# Generated by Django 5.0.2 on 2026-10-18 14:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('PunchIn', '0007_userareas_client_id'),
+        ('app1', '0004_ledgerdailybalance_ledgersnapshotstate'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='punchin',
+            index=models.Index(fields=['client_id', 'id'], name='idx_punchin_client_id'),
+        ),
+        migrations.AddIndex(
+            model_name='shoplocation',
+            index=models.Index(fields=['client_id', 'id'], name='idx_shop_client_id'),
+        ),
+    ]
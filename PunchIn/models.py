@@ -31,6 +31,7 @@ class ShopLocation(models.Model):
         indexes = [
             models.Index(fields=["firm", "client_id"], name="idx_shop_firm_client"),
             models.Index(fields=["created_at"], name="idx_shop_created_at"),
+            models.Index(fields=["client_id", "id"], name="idx_shop_client_id"),
         ]
 
 
@@ -81,6 +82,7 @@ class PunchIn(models.Model):
             models.Index(fields=["firm", "client_id"], name="idx_punchin_firm_client"),
             models.Index(fields=["punchin_time"], name="idx_punchin_time"),
             models.Index(fields=["client_id", "created_by"], name="idx_punchin_client_user"),
+            models.Index(fields=["client_id", "id"], name="idx_punchin_client_id"),
         ]
         ordering = ["-punchin_time"]  # newest first
 
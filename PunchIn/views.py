@@ -9,7 +9,6 @@ from decimal import Decimal, InvalidOperation
 from django.http import JsonResponse
 import uuid
 
-import jwt
 import logging
 import time
 import hashlib
@@ -17,37 +16,17 @@ import hashlib
 from .models import ShopLocation, PunchIn, UserAreas
 from .serializers import ShopLocationSerializer
 from app1.models import Misel, AccMaster, AccUser
+from app1.search import search_rows
+from task_backend.authentication import decode_jwt_token, get_client_from_token
+from task_backend.streaming import iter_query, stream_mode, stream_response
+from task_backend.delta import delta_response, delta_sql, parse_delta
 
 logger = logging.getLogger(__name__)
 
 
-def decode_jwt_token(request):
-    """Decode JWT token from Authorization header"""
-    auth_header = request.META.get("HTTP_AUTHORIZATION")
-    
-    if not auth_header or not auth_header.startswith("Bearer "):
-        return None
-    
-    token = auth_header.split(' ')[1]
-
-    try:
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=['HS256'])
-        return payload
-    except Exception:
-        return None
-
-
 def get_client_id_from_token(request):
     """Get client_id from JWT token"""
-    auth_header = request.META.get('HTTP_AUTHORIZATION')
-    if not auth_header or not auth_header.startswith('Bearer '):
-        return None
-    token = auth_header.split(' ')[1]
-    try:
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=['HS256'])
-        return payload.get('client_id')
-    except Exception:
-        return None
+    return get_client_from_token(request)
 
 
 @api_view(['POST'])
@@ -209,30 +188,27 @@ def get_firms(request):
         # ---- NON-ADMIN LOGIC ----
         else:
             # Get areas assigned to this user
-            user_areas = UserAreas.objects.filter(
+            user_areas = list(UserAreas.objects.filter(
                 client_id=client_id,
                 user=username
-            ).values_list('area_code', flat=True)
+            ).values_list('area_code', flat=True))
 
-            from django.db.models import Q
-            area_filter = Q()
-
-            # Build LIKE filters: name__icontains or area__icontains
-            for area in user_areas:
-                area_filter |= Q(name__icontains=area) | Q(area__icontains=area)
-
-            # Apply dynamic filters
             firms = (
                 AccMaster.objects.filter(client_id=client_id)
-                .filter(area_filter)
                 .annotate(
                     latitude=Subquery(latest_shop.values('latitude')[:1]),
                     longitude=Subquery(latest_shop.values('longitude')[:1]),
                 )
             )
+            # Firms whose name or area contains any of the user's areas, best
+            # match first (app1/search.py)
+            if user_areas:
+                firms = search_rows(firms, client_id, user_areas, fields=('name', 'area'))
+            else:
+                firms = firms.order_by('code')
 
         # ---- RESPONSE ----
-        if not firms.exists():
+        if not firms:
             return Response({'success': True, 'firms': [], 'message': 'No firms found'}, status=200)
 
         data = [
@@ -256,6 +232,35 @@ def get_firms(request):
         return Response({'error': 'An unexpected error occurred'}, status=500)
 
 # shop location table 
+def _shop_location_row(row_dict):
+    """One get_table_data record from a shop_location/acc_master row"""
+    # Safe coordinate conversion
+    try:
+        latitude = float(row_dict['latitude']) if row_dict['latitude'] is not None else None
+        longitude = float(row_dict['longitude']) if row_dict['longitude'] is not None else None
+    except (ValueError, TypeError):
+        latitude, longitude = None, None
+
+    # Safe timestamp formatting
+    try:
+        last_captured = row_dict['created_at'].isoformat() if row_dict['created_at'] else None
+    except Exception:
+        last_captured = str(row_dict['created_at']) if row_dict['created_at'] else None
+
+    return {
+        'id': row_dict['id'],
+        'firm_code': row_dict['firm_code'],
+        'storeName': row_dict['firm_name'],
+        'storeLocation': row_dict['firm_place'],
+        'latitude': latitude,
+        'longitude': longitude,
+        'status': row_dict['status'] or 'pending',
+        'taskDoneBy': row_dict['created_by'] or 'Unknown',
+        'lastCapturedTime': last_captured,
+        'client_id': row_dict['client_id'],
+    }
+
+
 @api_view(['GET'])
 def get_table_data(request):
     """Get shop location data for authenticated client using optimized raw SQL"""
@@ -277,6 +282,16 @@ def get_table_data(request):
         else:
             date_filter = ""
 
+        # ?since_id= / ?since=: only the rows after the client's watermark
+        try:
+            delta = parse_delta(request)
+            if delta:
+                delta_filter, delta_params, order_clause = delta_sql(delta, 's.id', 's.created_at')
+            else:
+                delta_filter, delta_params, order_clause = "", [], "ORDER BY s.created_at DESC"
+        except ValueError as e:
+            return Response({'error': str(e)}, status=400)
+
 
         # print("Start/End date :",startDate ,endDate)
 
@@ -305,8 +320,8 @@ def get_table_data(request):
             COALESCE(a.place, 'No address') as firm_place
             FROM {shop_table} s
             LEFT JOIN {firm_table} a ON s.firm_code = a.code AND s.client_id = a.client_id
-            WHERE s.client_id = %s  {date_filter}
-            ORDER BY s.created_at DESC
+            WHERE s.client_id = %s  {date_filter} {delta_filter}
+            {order_clause}
             """
         else :
                         sql_query = f"""
@@ -323,16 +338,32 @@ def get_table_data(request):
             COALESCE(a.place, 'No address') as firm_place
             FROM {shop_table} s
             LEFT JOIN {firm_table} a ON s.firm_code = a.code AND s.client_id = a.client_id
-            WHERE s.client_id = %s AND s.created_by = '{userName}'  {date_filter}
-            ORDER BY s.created_at DESC
+            WHERE s.client_id = %s AND s.created_by = '{userName}'  {date_filter} {delta_filter}
+            {order_clause}
             """
 
 
+        query_params = [client_id] + delta_params
+
+        try:
+            mode = stream_mode(request)
+            if delta and mode:
+                raise ValueError('since_id / since cannot be combined with stream')
+        except ValueError as e:
+            return Response({'error': str(e)}, status=400)
+        if mode:
+            rows = (_shop_location_row(row) for row in iter_query(sql_query, query_params))
+            return stream_response(rows, mode, {'message': 'Shop locations retrieved successfully'}, count_key='count')
+
         with connection.cursor() as cursor:
-            cursor.execute(sql_query, [client_id])
+            cursor.execute(sql_query, query_params)
             rows = cursor.fetchall()
             columns = [desc[0] for desc in cursor.description]
 
+        if delta:
+            data = [_shop_location_row(dict(zip(columns, row))) for row in rows]
+            return delta_response(data, delta, message='Shop locations retrieved successfully')
+
         if not rows:
             return Response({
                 'success': True,
@@ -342,35 +373,7 @@ def get_table_data(request):
             }, status=200)
 
         # ✅ Convert rows → dicts
-        data = []
-        for row in rows:
-            row_dict = dict(zip(columns, row))
-
-            # Safe coordinate conversion
-            try:
-                latitude = float(row_dict['latitude']) if row_dict['latitude'] is not None else None
-                longitude = float(row_dict['longitude']) if row_dict['longitude'] is not None else None
-            except (ValueError, TypeError):
-                latitude, longitude = None, None
-
-            # Safe timestamp formatting
-            try:
-                last_captured = row_dict['created_at'].isoformat() if row_dict['created_at'] else None
-            except Exception:
-                last_captured = str(row_dict['created_at']) if row_dict['created_at'] else None
-
-            data.append({
-                'id': row_dict['id'],
-                'firm_code': row_dict['firm_code'],
-                'storeName': row_dict['firm_name'],
-                'storeLocation': row_dict['firm_place'],
-                'latitude': latitude,
-                'longitude': longitude,
-                'status': row_dict['status'] or 'pending',
-                'taskDoneBy': row_dict['created_by'] or 'Unknown',
-                'lastCapturedTime': last_captured,
-                'client_id': row_dict['client_id'],
-            })
+        data = [_shop_location_row(dict(zip(columns, row))) for row in rows]
 
         return Response({
             'success': True,
@@ -794,6 +797,58 @@ def get_active_punchin(request):
         return Response({'error': 'Failed to get punch status'}, status=500)
 
 
+def _punchin_row(row_dict):
+    """One punchin_table record from a punchin/acc_master row"""
+    # Safe coordinate conversion
+    try:
+        latitude = float(row_dict['latitude']) if row_dict['latitude'] is not None else None
+        longitude = float(row_dict['longitude']) if row_dict['longitude'] is not None else None
+    except (ValueError, TypeError):
+        latitude, longitude = None, None
+
+    # Safe timestamp formatting
+    try:
+        punchin_time = row_dict['punchin_time'].isoformat() if row_dict['punchin_time'] else None
+    except Exception:
+        punchin_time = str(row_dict['punchin_time']) if row_dict['punchin_time'] else None
+
+    try:
+        punchout_time = row_dict['punchout_time'].isoformat() if row_dict['punchout_time'] else None
+    except Exception:
+        punchout_time = str(row_dict['punchout_time']) if row_dict['punchout_time'] else None
+
+    # Calculate work duration if both times exist
+    work_duration_hours = None
+    if row_dict['punchin_time'] and row_dict['punchout_time']:
+        try:
+            if hasattr(row_dict['punchin_time'], 'timestamp') and hasattr(row_dict['punchout_time'], 'timestamp'):
+                duration = row_dict['punchout_time'] - row_dict['punchin_time']
+                work_duration_hours = round(duration.total_seconds() / 3600, 2)
+        except Exception:
+            work_duration_hours = None
+
+    return {
+        'id': row_dict['id'],
+        'firm_code': row_dict['firm_code'],
+        'firm_name': row_dict['firm_name'],
+        'firm_location': row_dict['firm_place'],
+        'latitude': latitude,
+        'longitude': longitude,
+        'punchin_time': punchin_time,
+        'punchout_time': punchout_time,
+        'work_duration_hours': work_duration_hours,
+        'photo_url': row_dict['photo_url'],
+        'address': row_dict['address'] or '',
+        'notes': row_dict['notes'] or '',
+        'status': row_dict['status'] or 'pending',
+        'created_by': row_dict['created_by'] or 'Unknown',
+        'client_id': row_dict['client_id'],
+        'is_active': row_dict['punchout_time'] is None,  # Still punched in
+        'created_at': row_dict['created_at'].isoformat() if row_dict['created_at'] else None,
+        'updated_at': row_dict['updated_at'].isoformat() if row_dict['updated_at'] else None
+    }
+
+
 @api_view(['GET'])
 def punchin_table(request):
     """Get punch-in table data for authenticated client with role-based filtering"""
@@ -816,6 +871,16 @@ def punchin_table(request):
         else:
             date_filter = ""
 
+        # ?since_id= / ?since=: only the rows after the client's watermark
+        try:
+            delta = parse_delta(request)
+            if delta:
+                delta_filter, delta_params, order_clause = delta_sql(delta, 'p.id', 'p.created_at')
+            else:
+                delta_filter, delta_params, order_clause = "", [], "ORDER BY p.punchin_time DESC"
+        except ValueError as e:
+            return Response({'error': str(e)}, status=400)
+
         
         from django.db import connection
 
@@ -846,10 +911,10 @@ def punchin_table(request):
                 COALESCE(a.place, 'No address') as firm_place
             FROM {punchin_table} p
             LEFT JOIN {firm_table} a ON p.firm_code = a.code AND p.client_id = a.client_id
-            WHERE p.client_id = %s {date_filter}
-            ORDER BY p.punchin_time DESC
+            WHERE p.client_id = %s {date_filter} {delta_filter}
+            {order_clause}
             """
-            query_params = [client_id]
+            query_params = [client_id] + delta_params
         else:
             # Regular user sees only their own punch-ins
             sql_query = f"""
@@ -872,16 +937,32 @@ def punchin_table(request):
                 COALESCE(a.place, 'No address') as firm_place
             FROM {punchin_table} p
             LEFT JOIN {firm_table} a ON p.firm_code = a.code AND p.client_id = a.client_id
-            WHERE p.client_id = %s AND p.created_by = %s {date_filter}
-            ORDER BY p.punchin_time DESC
+            WHERE p.client_id = %s AND p.created_by = %s {date_filter} {delta_filter}
+            {order_clause}
             """
-            query_params = [client_id, username]
+            query_params = [client_id, username] + delta_params
+
+        try:
+            mode = stream_mode(request)
+            if delta and mode:
+                raise ValueError('since_id / since cannot be combined with stream')
+        except ValueError as e:
+            return Response({'error': str(e)}, status=400)
+        is_admin_view = user_role and user_role.lower() == 'admin'
+        if mode:
+            rows = (_punchin_row(row) for row in iter_query(sql_query, query_params))
+            envelope = {'user_role': user_role, 'is_admin_view': is_admin_view}
+            return stream_response(rows, mode, envelope, count_key='count')
 
         with connection.cursor() as cursor:
             cursor.execute(sql_query, query_params)
             rows = cursor.fetchall()
             columns = [desc[0] for desc in cursor.description]
 
+        if delta:
+            data = [_punchin_row(dict(zip(columns, row))) for row in rows]
+            return delta_response(data, delta, user_role=user_role, is_admin_view=is_admin_view)
+
         if not rows:
             return Response({
                 'success': True,
@@ -891,62 +972,7 @@ def punchin_table(request):
             }, status=200)
 
         # Process rows into structured data
-        data = []
-        for row in rows:
-            row_dict = dict(zip(columns, row))
-
-            # Safe coordinate conversion
-            try:
-                latitude = float(row_dict['latitude']) if row_dict['latitude'] is not None else None
-                longitude = float(row_dict['longitude']) if row_dict['longitude'] is not None else None
-            except (ValueError, TypeError):
-                latitude, longitude = None, None
-
-            # Safe timestamp formatting
-            try:
-                punchin_time = row_dict['punchin_time'].isoformat() if row_dict['punchin_time'] else None
-            except Exception:
-                punchin_time = str(row_dict['punchin_time']) if row_dict['punchin_time'] else None
-
-            try:
-                punchout_time = row_dict['punchout_time'].isoformat() if row_dict['punchout_time'] else None
-            except Exception:
-                punchout_time = str(row_dict['punchout_time']) if row_dict['punchout_time'] else None
-
-            # Calculate work duration if both times exist
-            work_duration_hours = None
-            if row_dict['punchin_time'] and row_dict['punchout_time']:
-                try:
-                    from django.utils import timezone
-                    if hasattr(row_dict['punchin_time'], 'timestamp') and hasattr(row_dict['punchout_time'], 'timestamp'):
-                        duration = row_dict['punchout_time'] - row_dict['punchin_time']
-                        work_duration_hours = round(duration.total_seconds() / 3600, 2)
-                except Exception:
-                    work_duration_hours = None
-
-            # Build response record
-            record = {
-                'id': row_dict['id'],
-                'firm_code': row_dict['firm_code'],
-                'firm_name': row_dict['firm_name'],
-                'firm_location': row_dict['firm_place'],
-                'latitude': latitude,
-                'longitude': longitude,
-                'punchin_time': punchin_time,
-                'punchout_time': punchout_time,
-                'work_duration_hours': work_duration_hours,
-                'photo_url': row_dict['photo_url'],
-                'address': row_dict['address'] or '',
-                'notes': row_dict['notes'] or '',
-                'status': row_dict['status'] or 'pending',
-                'created_by': row_dict['created_by'] or 'Unknown',
-                'client_id': row_dict['client_id'],
-                'is_active': row_dict['punchout_time'] is None,  # Still punched in
-                'created_at': row_dict['created_at'].isoformat() if row_dict['created_at'] else None,
-                'updated_at': row_dict['updated_at'].isoformat() if row_dict['updated_at'] else None
-            }
-
-            data.append(record)
+        data = [_punchin_row(dict(zip(columns, row))) for row in rows]
 
         return Response({
             'success': True,
@@ -954,7 +980,7 @@ def punchin_table(request):
             'count': len(data),
             'message': f'Punch-in records retrieved successfully ({len(data)} records)',
             'user_role': user_role,
-            'is_admin_view': user_role and user_role.lower() == 'admin'
+            'is_admin_view': is_admin_view
         }, status=200)
 
     except DatabaseError as e:
@@ -1,8 +1,10 @@
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
+from task_backend.report_cache import cache_report
 from .models import SalesReturnReport
 
 @api_view(['GET'])
+@cache_report
 def get_sales_return_data(request):
     """
     Get all sales return report data for a specific client_id
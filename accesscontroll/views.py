@@ -1,6 +1,5 @@
 from django.shortcuts import render
-from django.conf import settings
-import jwt
+from task_backend.authentication import decode_jwt_token
 from rest_framework.response import Response
 from .models import AllowedMenu
 from rest_framework.decorators import api_view
@@ -21,22 +20,6 @@ from rest_framework import status
     # "user-menu",
     # "settings"
 
-def decode_jwt_token(request):
-    """Decode JWT token from Authorization header"""
-    auth_header = request.META.get("HTTP_AUTHORIZATION")
-    
-    if not auth_header or not auth_header.startswith("Bearer "):
-        return None
-    
-    token = auth_header.split(' ')[1]
-
-    try:
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=['HS256'])
-        return payload
-    except Exception:
-        return None
-    
-
 @api_view(["POST"])
 def update_user_menu(request):
     try:
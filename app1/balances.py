@@ -0,0 +1,259 @@
+"""
+Balance-at-date engine.
+
+``ledger_daily_balance`` holds, per account and per day with activity, the
+cumulative debit and credit up to the end of that day.  The cumulative totals
+at any date are then one index seek (the newest snapshot on or before it)
+plus the ledger rows the snapshots do not cover yet (id > last_ledger_id of
+the client's LedgerSnapshotState), so opening/closing balances for every
+account of a client cost O(accounts) plus the rows added since the last
+refresh, instead of O(ledger rows).
+
+A sync that deletes and re-inserts the client's rows gives them new ids, so
+the lowest ledger id no longer matches the one recorded at the refresh, or
+the highest is below it (two index seeks).  The ledger is then summed in
+full for that request.  Either way, a request that finds the snapshots
+behind starts a refresh in the background (``LEDGER_SNAPSHOTS_AUTO_REFRESH``),
+which also counts the covered rows and so catches deletes the id bounds
+miss; the slow path lasts until it finishes rather than until the next
+``refresh_ledger_snapshots`` run.
+
+Balances follow the ledger view convention: opening_balance + debit - credit.
+"""
+import logging
+import threading
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import connections, router, transaction
+from django.db.models import Count, Max, Min, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import AccLedgers, AccMaster, CashAndBankAccMaster, LedgerDailyBalance, LedgerSnapshotState
+
+logger = logging.getLogger(__name__)
+
+# Ledger rows without an entry date count from the beginning of time
+NO_DATE = date(1, 1, 1)
+BULK_SIZE = 5000
+
+# book -> (master model, super_code or None)
+BOOKS = {
+    'accounts': (AccMaster, None),
+    'cash': (CashAndBankAccMaster, 'CASH'),
+    'bank': (CashAndBankAccMaster, 'BANK'),
+}
+
+
+def _daily_totals(client_id, max_id, codes=None, from_day=None, using='default'):
+    """(code, day, debit, credit) per day with activity, ordered by code and day"""
+    queryset = AccLedgers.objects.using(using).filter(client_id=client_id, id__lte=max_id)
+    if codes is not None:
+        queryset = queryset.filter(code__in=codes)
+    queryset = queryset.annotate(day=Coalesce('entry_date', Value(NO_DATE)))
+    if from_day is not None:
+        queryset = queryset.filter(day__gte=from_day)
+    return queryset.values('code', 'day').annotate(
+        day_debit=Sum('debit'), day_credit=Sum('credit')
+    ).order_by('code', 'day').values_list('code', 'day', 'day_debit', 'day_credit')
+
+
+def _rebuild(client_id, max_id, codes=None, from_day=None, using='default'):
+    """Rewrite the snapshots of ``codes`` (all when None) from ``from_day`` on."""
+    snapshots = LedgerDailyBalance.objects.filter(client_id=client_id)
+    if codes is not None:
+        snapshots = snapshots.filter(code__in=codes)
+
+    # Cumulative totals carried in from the day before from_day
+    carried = {}
+    if from_day is not None:
+        newest = snapshots.filter(code=OuterRef('code'), date__lt=from_day).order_by('-date')
+        for code, debit, credit in snapshots.filter(date__lt=from_day).values('code').distinct().annotate(
+            last_debit=Subquery(newest.values('cumulative_debit')[:1]),
+            last_credit=Subquery(newest.values('cumulative_credit')[:1]),
+        ).values_list('code', 'last_debit', 'last_credit'):
+            carried[code] = (debit, credit)
+        snapshots.filter(date__gte=from_day).delete()
+    else:
+        snapshots.delete()
+
+    batch = []
+    written = 0
+    current_code = None
+    for code, day, day_debit, day_credit in _daily_totals(client_id, max_id, codes, from_day, using).iterator(chunk_size=BULK_SIZE):
+        if code != current_code:
+            current_code = code
+            debit, credit = carried.get(code, (Decimal(0), Decimal(0)))
+        debit += day_debit or 0
+        credit += day_credit or 0
+        batch.append(LedgerDailyBalance(
+            client_id=client_id, code=code, date=day,
+            cumulative_debit=debit, cumulative_credit=credit,
+        ))
+        if len(batch) >= BULK_SIZE:
+            LedgerDailyBalance.objects.bulk_create(batch)
+            written += len(batch)
+            batch = []
+    LedgerDailyBalance.objects.bulk_create(batch)
+    return written + len(batch)
+
+
+def refresh_snapshots(client_id, full=False):
+    """
+    Bring the snapshots of one client up to date and return a summary dict.
+
+    Incremental by default: only accounts with new ledger rows (id above the
+    last refresh) are rewritten, from the earliest date among those rows.
+    When rows covered by the previous refresh have disappeared (a sync
+    deleted or re-inserted them) the client is rebuilt in full.  Edits to
+    existing rows cannot be detected; run with ``full=True`` after those.
+    The ledger is read on the database the snapshots are written to, never
+    on a replica that may be behind it.
+    """
+    using = router.db_for_write(LedgerDailyBalance)
+    with transaction.atomic(using=using):
+        ledger = AccLedgers.objects.using(using).filter(client_id=client_id)
+        bounds = ledger.aggregate(min_id=Min('id'), max_id=Max('id'))
+        max_id = bounds['max_id'] or 0
+        state = LedgerSnapshotState.objects.select_for_update().filter(client_id=client_id).first()
+
+        mode = 'full'
+        codes = from_day = None
+        if state is not None and not full:
+            if ledger.filter(id__lte=state.last_ledger_id).count() == state.ledger_rows:
+                new_rows = ledger.filter(id__gt=state.last_ledger_id, id__lte=max_id)
+                summary = new_rows.aggregate(rows=Count('id'), from_day=Min(Coalesce('entry_date', Value(NO_DATE))))
+                if not summary['rows']:
+                    # States saved before first_ledger_id was recorded
+                    if state.first_ledger_id != (bounds['min_id'] or 0):
+                        state.first_ledger_id = bounds['min_id'] or 0
+                        state.save(update_fields=['first_ledger_id'])
+                    return {'client_id': client_id, 'mode': 'unchanged', 'snapshots': 0, 'last_ledger_id': state.last_ledger_id}
+                mode = 'incremental'
+                codes = list(new_rows.values_list('code', flat=True).distinct())
+                from_day = summary['from_day']
+
+        written = _rebuild(client_id, max_id, codes, from_day, using)
+        LedgerSnapshotState.objects.update_or_create(client_id=client_id, defaults={
+            'first_ledger_id': bounds['min_id'] or 0,
+            'last_ledger_id': max_id,
+            'ledger_rows': ledger.filter(id__lte=max_id).count(),
+            'refreshed_at': timezone.now(),
+        })
+    return {'client_id': client_id, 'mode': mode, 'snapshots': written, 'last_ledger_id': max_id}
+
+
+_refreshing = set()
+_refreshing_lock = threading.Lock()
+
+
+def _refresh(client_id):
+    try:
+        refresh_snapshots(client_id)
+    except Exception:
+        logger.exception("Background refresh of the ledger snapshots of %s failed", client_id)
+    finally:
+        connections.close_all()
+        with _refreshing_lock:
+            _refreshing.discard(client_id)
+
+
+def refresh_in_background(client_id):
+    """Start refresh_snapshots(client_id) on a thread, unless one is already running in this process"""
+    if not getattr(settings, 'LEDGER_SNAPSHOTS_AUTO_REFRESH', True):
+        return
+    with _refreshing_lock:
+        if client_id in _refreshing:
+            return
+        _refreshing.add(client_id)
+    threading.Thread(target=_refresh, args=(client_id,), name='ledger-snapshots', daemon=True).start()
+
+
+def _cumulative_at(day):
+    """Subqueries for the cumulative (debit, credit) of OuterRef account at the end of ``day``"""
+    newest = LedgerDailyBalance.objects.filter(
+        client_id=OuterRef('client_id'), code=OuterRef('code'), date__lte=day
+    ).order_by('-date')
+    return (
+        Subquery(newest.values('cumulative_debit')[:1]),
+        Subquery(newest.values('cumulative_credit')[:1]),
+    )
+
+
+def account_balances(client_id, start=None, end=None, book='accounts', codes=None, super_code=None):
+    """
+    Opening balance at the start of ``start`` (None: from the beginning),
+    closing balance at the end of ``end`` (None: today) and the debit/credit
+    posted in between, for every account of ``book`` (see BOOKS), and the
+    LedgerSnapshotState used (None when computed from the ledger alone).
+    """
+    end = end or timezone.localdate()
+    before = start - timedelta(days=1) if start else None
+    master, book_super_code = BOOKS[book]
+
+    accounts = master.objects.filter(client_id=client_id)
+    if book_super_code:
+        accounts = accounts.filter(super_code=book_super_code)
+    elif super_code:
+        accounts = accounts.filter(super_code=super_code)
+    if codes:
+        accounts = accounts.filter(code__in=codes)
+
+    state = LedgerSnapshotState.objects.filter(client_id=client_id).first()
+    ledger = AccLedgers.objects.filter(client_id=client_id)
+    bounds = ledger.aggregate(min_id=Min('id'), max_id=Max('id'))
+    if state is None:
+        if bounds['max_id'] is not None:
+            refresh_in_background(client_id)
+    elif state.last_ledger_id and (
+        bounds['min_id'] != state.first_ledger_id or (bounds['max_id'] or 0) < state.last_ledger_id
+    ):
+        # The rows of the last refresh were deleted or re-inserted since (a
+        # sync gives re-inserted rows new ids): the snapshots no longer match
+        # the ledger, which is summed whole until they are rebuilt
+        state = None
+        refresh_in_background(client_id)
+    elif (bounds['max_id'] or 0) > state.last_ledger_id:
+        refresh_in_background(client_id)
+
+    annotations = {}
+    if state is not None:
+        annotations['end_debit'], annotations['end_credit'] = _cumulative_at(end)
+        if before is not None:
+            annotations['before_debit'], annotations['before_credit'] = _cumulative_at(before)
+    accounts = accounts.annotate(**annotations).order_by('code')
+
+    # Ledger rows newer than the last refresh are summed live
+    pending = ledger.filter(id__gt=state.last_ledger_id if state else 0).annotate(
+        day=Coalesce('entry_date', Value(NO_DATE))
+    ).filter(day__lte=end)
+    if codes:
+        pending = pending.filter(code__in=codes)
+    pending_aggregates = {'end_debit': Sum('debit'), 'end_credit': Sum('credit')}
+    if before is not None:
+        pending_aggregates['before_debit'] = Sum('debit', filter=Q(day__lte=before))
+        pending_aggregates['before_credit'] = Sum('credit', filter=Q(day__lte=before))
+    live = {row.pop('code'): row for row in pending.values('code').annotate(**pending_aggregates).order_by()}
+
+    results = []
+    for account in accounts.values('code', 'name', 'opening_balance', *annotations):
+        extra = live.get(account['code'], {})
+
+        def total(key):
+            return (account.get(key) or 0) + (extra.get(key) or 0)
+
+        opening_balance = account['opening_balance'] or 0
+        end_debit, end_credit = total('end_debit'), total('end_credit')
+        before_debit = total('before_debit') if before is not None else 0
+        before_credit = total('before_credit') if before is not None else 0
+        results.append({
+            'code': account['code'],
+            'name': account['name'],
+            'opening': opening_balance + before_debit - before_credit,
+            'debit': end_debit - before_debit,
+            'credit': end_credit - before_credit,
+            'closing': opening_balance + end_debit - end_credit,
+        })
+    return results, state
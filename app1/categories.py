@@ -0,0 +1,87 @@
+"""
+Keyword categorisation of ledger ``particulars`` for the expense charts.
+
+All category keywords are compiled into one Aho-Corasick automaton when the
+module is imported, so classifying a string is a single pass over it no matter
+how many keywords there are.  Results are memoised per distinct particulars
+value.
+"""
+from collections import deque
+from functools import lru_cache
+
+
+# Checked in order: the first category with a matching keyword wins.
+EXPENSE_CATEGORIES = [
+    ('foodDining', ['food', 'dining', 'restaurant', 'hotel', 'meal']),
+    ('transportation', ['transport', 'travel', 'fuel', 'petrol', 'diesel', 'taxi', 'uber', 'bus', 'auto']),
+    ('shopping', ['shop', 'purchase', 'store', 'mart', 'retail']),
+]
+# Uncategorised expenses stay visible in the chart under shopping.
+DEFAULT_CATEGORY = 'shopping'
+
+
+class KeywordMatcher:
+    """
+    Aho-Corasick automaton that reports the best-priority category whose
+    keyword occurs anywhere in the text (plain substring match, like ``in``).
+    """
+
+    def __init__(self, categories):
+        self.labels = [label for label, _ in categories]
+        self._goto = [{}]
+        self._fail = [0]
+        self._best = [None]  # lowest category index ending at this state
+
+        for priority, (_, keywords) in enumerate(categories):
+            for keyword in keywords:
+                state = 0
+                for ch in keyword:
+                    nxt = self._goto[state].get(ch)
+                    if nxt is None:
+                        nxt = len(self._goto)
+                        self._goto[state][ch] = nxt
+                        self._goto.append({})
+                        self._fail.append(0)
+                        self._best.append(None)
+                    state = nxt
+                self._best[state] = priority if self._best[state] is None else min(self._best[state], priority)
+
+        # Breadth-first pass to wire failure links and inherit outputs.
+        # Depth-1 states keep failing to the root.
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fallback = self._fail[state]
+                while fallback and ch not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[nxt] = self._goto[fallback].get(ch, 0)
+                inherited = self._best[self._fail[nxt]]
+                if inherited is not None and (self._best[nxt] is None or inherited < self._best[nxt]):
+                    self._best[nxt] = inherited
+
+    def match(self, text):
+        """Return the label of the best matching category, or None."""
+        goto, fail, best_at = self._goto, self._fail, self._best
+        state = 0
+        best = None
+        for ch in text:
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            found = best_at[state]
+            if found is not None and (best is None or found < best):
+                best = found
+                if best == 0:
+                    break
+        return self.labels[best] if best is not None else None
+
+
+expense_matcher = KeywordMatcher(EXPENSE_CATEGORIES)
+
+
+@lru_cache(maxsize=65536)
+def categorize_expense(particulars):
+    """Chart category for a ledger particulars value (None counts as empty)."""
+    return expense_matcher.match((particulars or '').lower()) or DEFAULT_CATEGORY
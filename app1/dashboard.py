@@ -0,0 +1,379 @@
+"""
+Dashboard widgets.
+
+Every ``dashboard_*`` view and the ``dashboard/bundle/`` endpoint build their
+payloads here.  Each widget declares the aggregates it needs per table; the
+aggregates requested for the same table are folded into a single
+conditional-aggregation query (``SUM(...) FILTER (WHERE ...)``), so a bundle
+of N widgets issues one query per table instead of one or two per widget.
+
+``abuild_widgets`` is the async counterpart used by the ASGI views: the
+per-table aggregates and the row widgets' queries run concurrently.
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connections, router, transaction
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import TruncMonth
+
+from salestoday_purchasetoday.models import PurchaseToday, SalesToday
+from task_backend.pooled_postgresql.pool import release_connections, smallest_pool_size
+
+from .categories import categorize_expense
+from .models import AccLedgers, AccUser
+
+
+def _sales_purchases_months(now):
+    """(label, month_start, month_end) for the 6-month sales/purchases chart"""
+    months = []
+    for i in range(6, 0, -1):
+        month_start = now.replace(day=1) - timedelta(days=i*30)
+        month_start = month_start.replace(day=1)
+        month_end = (month_start + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+        months.append((month_start.strftime('%b'), month_start.date(), month_end.date()))
+    return months
+
+
+class DashboardSnapshot:
+    """
+    Aggregates for one client, computed once per table.
+
+    ``today`` and ``now`` are fixed when the snapshot is created so every
+    widget in a bundle uses the same date windows.
+    """
+
+    def __init__(self, client_id, now=None):
+        self.client_id = client_id
+        self.now = now or datetime.now()
+        self.today = self.now.date()
+        self.last_month = self.today - timedelta(days=30)
+        self.months = _sales_purchases_months(self.now)
+        self._requested = {}
+        self._results = {}
+
+    # table -> (queryset, {name: aggregate expression})
+    def _tables(self):
+        today, last_month = self.today, self.last_month
+
+        ledger = {
+            'income': Sum('debit', filter=Q(entry_mode='DR')),
+            'expenses': Sum('credit', filter=Q(entry_mode='CR')),
+            'sent_today': Sum('credit', filter=Q(entry_mode='CR', entry_date=today)),
+            'sent_last_month': Sum('credit', filter=Q(entry_mode='CR', entry_date__gte=last_month, entry_date__lt=today)),
+            'received_today': Sum('debit', filter=Q(entry_mode='DR', entry_date=today)),
+            'received_last_month': Sum('debit', filter=Q(entry_mode='DR', entry_date__gte=last_month, entry_date__lt=today)),
+        }
+        sales = {
+            'today': Sum('nettotal', filter=Q(invdate=today)),
+            'last_month': Sum('nettotal', filter=Q(invdate__gte=last_month, invdate__lt=today)),
+            'count': Count('id'),
+        }
+        purchases = {
+            'today': Sum('net', filter=Q(date=today)),
+            'last_month': Sum('net', filter=Q(date__gte=last_month, date__lt=today)),
+        }
+        for i, (label, start, end) in enumerate(self.months):
+            sales[f'month_{i}'] = Sum('nettotal', filter=Q(invdate__gte=start, invdate__lte=end))
+            purchases[f'month_{i}'] = Sum('net', filter=Q(date__gte=start, date__lte=end))
+
+        return {
+            'ledger': (AccLedgers.objects.filter(client_id=self.client_id), ledger),
+            'sales': (SalesToday.objects.filter(client_id=self.client_id), sales),
+            'purchases': (PurchaseToday.objects.filter(client_id=self.client_id), purchases),
+            'users': (AccUser.objects.filter(client_id=self.client_id), {'count': Count('id')}),
+        }
+
+    def require(self, table, *names):
+        self._requested.setdefault(table, set()).update(names)
+
+    def compute_table(self, table):
+        queryset, expressions = self._tables()[table]
+        self._results[table] = queryset.aggregate(**{name: expressions[name] for name in sorted(self._requested[table])})
+
+    def compute(self):
+        """Run one aggregate query per table for everything that was required."""
+        for table in self._requested:
+            self.compute_table(table)
+
+    def get(self, table, name):
+        return self._results[table][name] or 0
+
+
+def _change_percent(current, previous):
+    change_percent = 0
+    if previous > 0:
+        change_percent = ((current - previous) / previous) * 100
+    return round(change_percent, 1)
+
+
+# ---- Aggregate widgets: (requirements, render) ----
+
+def _total_expenses(snap):
+    return {'total': float(snap.get('ledger', 'expenses')), 'change_percent': -4.2}
+
+
+def _total_income(snap):
+    return {'total': float(snap.get('ledger', 'income')), 'change_percent': 12.1}
+
+
+def _budget_remaining(snap):
+    income = snap.get('ledger', 'income')
+    expenses = snap.get('ledger', 'expenses')
+    budget_remaining = float(income) - float(expenses) if income or expenses else 0
+    total_budget = float(income) if income else 1
+    percent = int((budget_remaining / total_budget * 100)) if total_budget > 0 else 0
+    return {'total': budget_remaining, 'percent': percent}
+
+
+def _active_users(snap):
+    return {'total': snap.get('users', 'count') or 1248, 'change_percent': 3.4}
+
+
+def _today_vs_last_month(table, today_key, last_month_key):
+    def render(snap):
+        current = snap.get(table, today_key)
+        previous = snap.get(table, last_month_key)
+        return {'total': float(current), 'change_percent': _change_percent(current, previous)}
+    return render
+
+
+def _sales_purchases(snap):
+    months_data = []
+    for i, (label, start, end) in enumerate(snap.months):
+        sales = snap.get('sales', f'month_{i}')
+        purchases = snap.get('purchases', f'month_{i}')
+        months_data.append({
+            'month': label,
+            'salesTarget': float(sales) * 1.1,  # 10% above actual
+            'sales': float(sales),
+            'purchases': float(purchases)
+        })
+    return {'data': months_data}
+
+
+def _stock_history(snap):
+    return {'data': [{
+        'total_sales_items': snap.get('sales', 'count'),
+        'change_percent': 20
+    }]}
+
+
+# ---- Row widgets: run their own query ----
+
+def _category_breakdown(snap):
+    # Fixed categories matching the dashboard design
+    return {'data': [
+        {'category': 'Cash Book', 'percent': 35, 'color': '#00b4a0'},
+        {'category': 'Bank Book', 'percent': 25, 'color': '#3b82f6'},
+        {'category': 'Purchases', 'percent': 10, 'color': '#ef4444'},
+        {'category': 'Sales Return', 'percent': 20, 'color': '#8b5cf6'},
+        {'category': 'Suppliers', 'percent': 10, 'color': '#f59e0b'},
+    ]}
+
+
+def _expense_trends(snap):
+    """
+    Last 12 months of credit entries by chart category.  One query groups
+    the whole window by (month, particulars); each distinct particulars value
+    is then categorised once by the shared keyword matcher.
+    """
+    month_names = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
+    now = snap.now
+
+    def resolve_month_year(offset):
+        month = now.month - offset
+        year = now.year
+        while month <= 0:
+            month += 12
+            year -= 1
+        return month, year
+
+    months = [resolve_month_year(offset) for offset in range(11, -1, -1)]
+    first_month, first_year = months[0]
+    window_start = date(first_year, first_month, 1)
+    window_end = date(now.year + 1, 1, 1) if now.month == 12 else date(now.year, now.month + 1, 1)
+
+    monthly_expenses = AccLedgers.objects.filter(
+        client_id=snap.client_id,
+        entry_mode='CR',
+        entry_date__gte=window_start,
+        entry_date__lt=window_end
+    ).annotate(month=TruncMonth('entry_date')).values('month', 'particulars').annotate(total=Sum('credit'))
+
+    totals = {(year, month): {'foodDining': 0.0, 'transportation': 0.0, 'shopping': 0.0} for month, year in months}
+    for expense in monthly_expenses:
+        bucket = totals.get((expense['month'].year, expense['month'].month))
+        if bucket is not None:
+            bucket[categorize_expense(expense['particulars'])] += float(expense['total'] or 0)
+
+    trends_data = []
+    for month, year in months:
+        bucket = totals[(year, month)]
+        trends_data.append({
+            'month': month_names[month - 1],
+            'foodDining': int(bucket['foodDining']),
+            'transportation': int(bucket['transportation']),
+            'shopping': int(bucket['shopping'])
+        })
+    return {'data': trends_data}
+
+
+def _recent_transactions(snap):
+    recent_entries = AccLedgers.objects.filter(
+        client_id=snap.client_id
+    ).values('id', 'entry_date', 'particulars', 'debit', 'credit', 'entry_mode', 'narration').order_by('-entry_date')[:6]
+
+    transactions_data = []
+    for idx, entry in enumerate(recent_entries, 1):
+        if entry['entry_mode'] == 'DR':  # Debit = Income
+            amount = float(entry['debit'] or 0)
+        else:  # Credit = Expense
+            amount = float(entry['credit'] or 0)
+
+        transactions_data.append({
+            'id': idx,
+            'description': entry['particulars'] or 'Transaction',
+            'category': entry['particulars'] or 'Other',
+            'amount': amount,
+            'status': 'Completed',
+            'date': entry['entry_date'].isoformat() if entry['entry_date'] else datetime.now().isoformat()
+        })
+    return {'data': transactions_data}
+
+
+def _recent_purchases(snap):
+    recent_entries = PurchaseToday.objects.filter(
+        client_id=snap.client_id
+    ).order_by('-date', '-id')[:6]
+
+    purchases_data = []
+    for entry in recent_entries:
+        amount = float(entry.total or entry.net or 0)
+        bill_no = entry.billno or entry.pbillno or entry.id
+
+        purchases_data.append({
+            'id': entry.id,
+            'invoice': f'PO-{bill_no}',
+            'supplier': entry.suppliername or 'Supplier',
+            'amount': amount,
+            'status': 'Received',
+            'date': entry.date.isoformat() if entry.date else ''
+        })
+    return {'data': purchases_data}
+
+
+def _recent_invoices(snap):
+    invoices = SalesToday.objects.filter(
+        client_id=snap.client_id
+    ).order_by('-invdate')[:5]
+
+    invoices_data = []
+    for invoice in invoices:
+        invoices_data.append({
+            'id': invoice.id,
+            'invoice_no': f"#INV{invoice.billno}",
+            'customer_name': invoice.customername or 'Customer',
+            'date': invoice.invdate.strftime('%m/%d/%Y') if invoice.invdate else '',
+            'amount': float(invoice.nettotal or 0),
+            'status': 'Delivered'
+        })
+    return {'data': invoices_data}
+
+
+# widget name -> (aggregates required as {table: names}, render)
+WIDGETS = {
+    'total_expenses': ({'ledger': ['expenses']}, _total_expenses),
+    'total_income': ({'ledger': ['income']}, _total_income),
+    'budget_remaining': ({'ledger': ['income', 'expenses']}, _budget_remaining),
+    'active_users': ({'users': ['count']}, _active_users),
+    'category_breakdown': ({}, _category_breakdown),
+    'expense_trends': ({}, _expense_trends),
+    'recent_transactions': ({}, _recent_transactions),
+    'recent_purchases': ({}, _recent_purchases),
+    'total_sales': ({'sales': ['today', 'last_month']}, _today_vs_last_month('sales', 'today', 'last_month')),
+    'total_expense': ({'purchases': ['today', 'last_month']}, _today_vs_last_month('purchases', 'today', 'last_month')),
+    'payment_sent': ({'ledger': ['sent_today', 'sent_last_month']}, _today_vs_last_month('ledger', 'sent_today', 'sent_last_month')),
+    'payment_received': ({'ledger': ['received_today', 'received_last_month']}, _today_vs_last_month('ledger', 'received_today', 'received_last_month')),
+    'sales_purchases': ({'sales': [f'month_{i}' for i in range(6)], 'purchases': [f'month_{i}' for i in range(6)]}, _sales_purchases),
+    'recent_invoices': ({}, _recent_invoices),
+    'stock_history': ({'sales': ['count']}, _stock_history),
+}
+
+
+def build_widgets(client_id, names):
+    """
+    Return ``{name: payload}`` for the requested widgets.  Each payload is the
+    body the matching ``dashboard_*`` endpoint returns.
+
+    All widgets read inside one read-only transaction; on PostgreSQL it runs at
+    REPEATABLE READ so every query sees the same snapshot.
+    """
+    snap = DashboardSnapshot(client_id)
+    for name in names:
+        for table, aggregates in WIDGETS[name][0].items():
+            snap.require(table, *aggregates)
+
+    using = router.db_for_read(AccLedgers)
+    with transaction.atomic(using=using):
+        connection = connections[using]
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('SET TRANSACTION ISOLATION LEVEL REPEATABLE READ READ ONLY')
+        snap.compute()
+        return {name: {'success': True, **WIDGETS[name][1](snap)} for name in names}
+
+
+# Threads that run the async views' queries.  Without a connection pool each
+# keeps its database connection between queries (opening one per query would
+# cost more than the query); pooled connections go back to the pool after
+# every query instead of being held by an idle thread.  There are never more
+# threads than pool slots, so every thread can get a connection however many
+# dashboards are requested at once.
+_threads = getattr(settings, 'DASHBOARD_ASYNC_THREADS', 16)
+_executor = ThreadPoolExecutor(min(_threads, smallest_pool_size() or _threads), thread_name_prefix='dashboard')
+
+
+def _own_connection(func, *args):
+    failed = True
+    try:
+        result = func(*args)
+        failed = False
+        return result
+    finally:
+        if failed:
+            # Reconnect rather than reuse a broken connection
+            for conn in connections.all(initialized_only=True):
+                conn.close()
+        else:
+            release_connections()
+
+
+async def abuild_widgets(client_id, names):
+    """
+    Async build_widgets.  Every aggregate table and every row widget runs on
+    a thread (and so a database connection) of its own, all at once; the
+    response takes as long as the slowest query instead of their sum.  The
+    queries do not share one snapshot, so a sync landing mid-request
+    can show up in some widgets and not in others.
+    """
+    snap = DashboardSnapshot(client_id)
+    row_widgets = []
+    for name in names:
+        requirements = WIDGETS[name][0]
+        if not requirements:
+            row_widgets.append(name)
+        for table, aggregates in requirements.items():
+            snap.require(table, *aggregates)
+
+    run = sync_to_async(_own_connection, thread_sensitive=False, executor=_executor)
+    tables = list(snap._requested)
+    results = await asyncio.gather(
+        *(run(snap.compute_table, table) for table in tables),
+        *(run(WIDGETS[name][1], snap) for name in row_widgets),
+    )
+    rows = dict(zip(row_widgets, results[len(tables):]))
+    return {name: {'success': True, **(rows[name] if name in rows else WIDGETS[name][1](snap))} for name in names}
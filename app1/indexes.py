@@ -0,0 +1,194 @@
+"""
+Indexes on the legacy tables that Django does not manage.
+
+acc_master, acc_ledgers, acc_invmast, cashandbankaccmaster and
+salesreturn_report are ``managed = False``, so neither migrations nor
+``Meta.indexes`` create anything on them.  ``INDEXES`` declares the indexes
+their views need; ``manage.py provision_indexes`` creates the missing ones
+and compares the declared set with ``pg_indexes``.
+
+Every other index on these tables is reported as undeclared, so an index
+created by hand (or by the sync tool) shows up as drift until it is added
+here or dropped.
+"""
+import re
+
+from django.db import connections
+
+from .search import SEARCH_FIELDS
+
+# name: table, method, columns (with operator class where needed) and the
+# views (URL names) whose queries use it
+INDEXES = {
+    'acc_ledgers_client_code_idx': {
+        'table': 'acc_ledgers',
+        'method': 'btree',
+        'columns': ['client_id', 'code'],
+        'views': [
+            'get_ledger_details', 'get_cash_ledger_details', 'get_bank_ledger_details',
+            'get_account_balances', 'export_dataset',
+        ],
+    },
+    # max(id) and the rows added since the last snapshot refresh
+    'acc_ledgers_client_id_idx': {
+        'table': 'acc_ledgers',
+        'method': 'btree',
+        'columns': ['client_id', 'id'],
+        'views': ['get_account_balances', 'dashboard_bundle'],
+    },
+    'acc_ledgers_client_date_idx': {
+        'table': 'acc_ledgers',
+        'method': 'btree',
+        'columns': ['client_id', 'entry_date'],
+        'views': ['dashboard_expense_trends', 'dashboard_recent_transactions', 'dashboard_bundle'],
+    },
+    'acc_master_client_super_code_idx': {
+        'table': 'acc_master',
+        'method': 'btree',
+        'columns': ['client_id', 'super_code', 'code'],
+        'views': ['get_debtors_data', 'get_debtors_list', 'suppliers_list', 'get_account_balances'],
+    },
+    # invdate serves the newest-first order of the invoice list
+    'acc_invmast_client_customer_idx': {
+        'table': 'acc_invmast',
+        'method': 'btree',
+        'columns': ['client_id', 'customerid', 'invdate'],
+        'views': ['get_invoice_details'],
+    },
+    'cashandbankaccmaster_client_super_code_idx': {
+        'table': 'cashandbankaccmaster',
+        'method': 'btree',
+        'columns': ['client_id', 'super_code', 'code'],
+        'views': ['get_cash_book_data', 'get_bank_book_data', 'get_cash_ledger_details', 'get_bank_ledger_details'],
+    },
+    'salesreturn_report_client_date_idx': {
+        'table': 'salesreturn_report',
+        'method': 'btree',
+        'columns': ['client_id', 'date'],
+        'views': ['get_sales_return_data'],
+    },
+    # Account search (app1/search.py), also created by create_search_indexes
+    **{
+        f'acc_master_{field}_trgm': {
+            'table': 'acc_master',
+            'method': 'gin',
+            'columns': [f'{field} gin_trgm_ops'],
+            'views': ['get_debtors_data', 'suppliers_list', 'get_table_data'],
+        }
+        for field in SEARCH_FIELDS
+    },
+}
+
+TABLES = sorted({index['table'] for index in INDEXES.values()})
+
+# "USING btree (a, b) INCLUDE (c) WHERE (...)" part of an index definition
+_DEFINITION = re.compile(r' USING (\w+) \((.*?)\)(?: INCLUDE \((.*?)\))?(?: WHERE (.*))?$')
+_IDENTIFIER = re.compile(r'^"?\w+"?$')
+
+
+def declared_definition(name):
+    """The part of ``pg_indexes.indexdef`` after USING that index ``name`` should have"""
+    index = INDEXES[name]
+    return f"{index['method']} ({', '.join(index['columns'])})"
+
+
+def create_sql(name):
+    index = INDEXES[name]
+    return f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {index['table']} USING {declared_definition(name)}"
+
+
+def drop_sql(name):
+    return f"DROP INDEX CONCURRENTLY IF EXISTS {name}"
+
+
+def existing_indexes(using='default', tables=None):
+    """
+    Indexes on ``tables`` (all tables when None) in the current schema of
+    database ``using``, from ``pg_indexes``, with validity, uniqueness, scans
+    since the statistics were reset and size.
+    """
+    sql = """
+        SELECT pi.tablename, pi.indexname, pi.indexdef, ix.indisvalid, ix.indisunique OR ix.indisprimary,
+               COALESCE(s.idx_scan, 0), pg_relation_size(ix.indexrelid)
+        FROM pg_indexes pi
+        JOIN pg_index ix ON ix.indexrelid = format('%%I.%%I', pi.schemaname, pi.indexname)::regclass
+        LEFT JOIN pg_stat_user_indexes s ON s.indexrelid = ix.indexrelid
+        WHERE pi.schemaname = current_schema()
+    """
+    params = []
+    if tables is not None:
+        sql += " AND pi.tablename = ANY(%s)"
+        params.append(list(tables))
+    with connections[using].cursor() as cursor:
+        cursor.execute(sql + " ORDER BY pi.tablename, pi.indexname", params)
+        indexes = {}
+        for table, name, indexdef, valid, unique, scans, size in cursor.fetchall():
+            match = _DEFINITION.search(indexdef)
+            indexes[name] = {
+                'table': table,
+                'definition': indexdef.split(' USING ', 1)[1] if ' USING ' in indexdef else indexdef,
+                'method': match.group(1) if match else None,
+                'columns': [column.strip() for column in match.group(2).split(',')] if match else [],
+                'include': match.group(3) if match else None,
+                'where': match.group(4) if match else None,
+                'valid': valid,
+                'unique': unique,
+                'scans': scans,
+                'bytes': size,
+            }
+    return indexes
+
+
+def drift(existing):
+    """
+    (missing, changed, invalid, undeclared) index names: declared but absent,
+    present with another definition, left invalid by a failed concurrent
+    build, and present on a declared table without being declared
+    """
+    missing, changed, invalid = [], [], []
+    for name in INDEXES:
+        index = existing.get(name)
+        if index is None:
+            missing.append(name)
+        elif not index['valid']:
+            invalid.append(name)
+        elif index['definition'] != declared_definition(name):
+            changed.append(name)
+    undeclared = [
+        name for name, index in existing.items()
+        if index['table'] in TABLES and name not in INDEXES and not index['unique']
+    ]
+    return missing, changed, invalid, undeclared
+
+
+def duplicates(existing):
+    """
+    [(index, covered_by)] of indexes that another index on the same table
+    makes unnecessary: the same definition, or a btree whose columns are the
+    leading columns of another btree with no predicate.  Unique indexes are
+    kept, as they enforce a constraint.
+    """
+    found = []
+    for name, index in existing.items():
+        if index['unique'] or not index['valid']:
+            continue
+        for other_name, other in existing.items():
+            if other_name == name or other['table'] != index['table'] or not other['valid']:
+                continue
+            if other['definition'] == index['definition']:
+                # Of two identical indexes report only one
+                if other['unique'] or other_name < name:
+                    found.append((name, other_name))
+                    break
+                continue
+            prefix = (
+                index['method'] == other['method'] == 'btree'
+                and not index['where'] and not other['where'] and not index['include']
+                and all(_IDENTIFIER.match(column) for column in index['columns'])
+                and len(index['columns']) < len(other['columns'])
+                and other['columns'][:len(index['columns'])] == index['columns']
+            )
+            if prefix:
+                found.append((name, other_name))
+                break
+    return found
@@ -0,0 +1,155 @@
+"""
+Account ledger statements with a running balance.
+
+The balance of every row is the account's opening balance plus the cumulative
+``debit - credit`` of all rows up to and including it in (entry_date, id)
+order.  It is computed by a window function in the same query that reads the
+page, so clients no longer have to download the whole ledger to sum it.
+Rows without an entry date sort before every dated row.
+"""
+from datetime import date
+
+from django.db import connections, router
+from rest_framework.response import Response
+
+from task_backend.streaming import iter_query, stream_mode, stream_response
+
+from .ledger_export import EXPORT_FORMATS, export_response, statement_rows, xlsxwriter
+from .models import AccLedgers
+
+NO_DATE = date(1, 1, 1)
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+ORDERS = ('desc', 'asc')
+
+LEDGER_SQL = """
+    SELECT id, entry_date, particulars, voucher_no, entry_mode, debit, credit, narration, running_balance
+    FROM (
+        SELECT
+            l.id, l.entry_date, l.particulars, l.voucher_no, l.entry_mode,
+            l.debit, l.credit, l.narration,
+            COALESCE(l.entry_date, %s) AS sort_date,
+            (
+                SELECT COALESCE(MAX(m.opening_balance), 0)
+                FROM {master_table} m
+                WHERE m.code = %s AND m.client_id = %s
+            ) + SUM(COALESCE(l.debit, 0) - COALESCE(l.credit, 0)) OVER (
+                ORDER BY COALESCE(l.entry_date, %s), l.id
+                ROWS BETWEEN UNBOUNDED PRECEDING AND CURRENT ROW
+            ) AS running_balance
+        FROM acc_ledgers l
+        WHERE l.code = %s AND l.client_id = %s
+    ) ledger
+    {seek_condition}
+    ORDER BY sort_date {direction}, id {direction}
+    {limit_clause}
+"""
+
+
+def parse_cursor(value):
+    """'YYYY-MM-DD:id' -> (date, id); raises ValueError when malformed"""
+    entry_date, _, row_id = value.partition(':')
+    return date.fromisoformat(entry_date), int(row_id)
+
+
+def make_cursor(row):
+    return f"{row['entry_date'] or NO_DATE}:{row['id']}"
+
+
+def ledger_query(client_id, account_code, master_table='acc_master', order='desc', cursor=None, limit=None):
+    """
+    (sql, params) for the ledger of ``account_code``, newest first for
+    order='desc'.  ``cursor`` is a parsed cursor: only rows after it (in the
+    requested order) are returned.  The opening balance is read from
+    ``master_table`` (acc_master or cashandbankaccmaster).
+    """
+    params = [NO_DATE, account_code, client_id, NO_DATE, account_code, client_id]
+    seek_condition = ''
+    if cursor is not None:
+        seek_condition = 'WHERE (sort_date, id) {} (%s, %s)'.format('<' if order == 'desc' else '>')
+        params += list(cursor)
+    limit_clause = ''
+    if limit is not None:
+        limit_clause = 'LIMIT %s'
+        params.append(limit)
+    sql = LEDGER_SQL.format(
+        master_table=master_table,
+        seek_condition=seek_condition,
+        direction='DESC' if order == 'desc' else 'ASC',
+        limit_clause=limit_clause,
+    )
+    return sql, params
+
+
+def _fetch(using, sql, params):
+    with connections[using].cursor() as cursor:
+        cursor.execute(sql, params)
+        columns = [col[0] for col in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+
+def ledger_response(request, client_id, account_code, master_table='acc_master'):
+    """
+    Ledger rows of one account, each with ``id`` and ``running_balance``.
+
+    Query params:
+        page_size   cursor pagination, at most MAX_PAGE_SIZE rows per page
+        cursor      next_cursor of the previous page (implies page_size=100)
+        order       desc (default, newest first) | asc
+        stream      json | ndjson: stream every row after ``cursor``
+        export      csv | xlsx: the whole ledger, oldest first, with opening
+                    and closing rows, as a download (see ledger_export.py)
+
+    Without page_size, cursor or stream the whole ledger is returned as one
+    list, as before.
+    """
+    order = request.GET.get('order', 'desc')
+    if order not in ORDERS:
+        return Response({'success': False, 'error': f"order must be one of: {', '.join(ORDERS)}"}, status=400)
+    try:
+        mode = stream_mode(request)
+        cursor = parse_cursor(request.GET['cursor']) if request.GET.get('cursor') else None
+        page_size = request.GET.get('page_size')
+        if page_size is not None:
+            page_size = min(max(int(page_size), 1), MAX_PAGE_SIZE)
+        elif cursor is not None:
+            page_size = DEFAULT_PAGE_SIZE
+    except ValueError as e:
+        return Response({'success': False, 'error': f'Invalid parameter: {e}'}, status=400)
+
+    export = request.GET.get('export', '')
+    if export and export not in EXPORT_FORMATS:
+        return Response({'success': False, 'error': f"export must be one of: {', '.join(EXPORT_FORMATS)}"}, status=400)
+    if export == 'xlsx' and xlsxwriter is None:
+        return Response({'success': False, 'error': 'XLSX export is not available on this server (xlsxwriter is not installed)'}, status=501)
+
+    using = router.db_for_read(AccLedgers)
+
+    if export:
+        sql, params = ledger_query(client_id, account_code, master_table, order='asc')
+        rows = statement_rows(using, client_id, account_code, master_table, sql, params)
+        return export_response(export, rows, f'ledger-{account_code}')
+
+    if mode:
+        sql, params = ledger_query(client_id, account_code, master_table, order, cursor)
+        return stream_response(iter_query(sql, params, using=using), mode, {'account_code': account_code})
+
+    if page_size is None:
+        sql, params = ledger_query(client_id, account_code, master_table, order)
+        return Response({'success': True, 'data': _fetch(using, sql, params)})
+
+    # One extra row tells whether there is a next page
+    sql, params = ledger_query(client_id, account_code, master_table, order, cursor, limit=page_size + 1)
+    rows = _fetch(using, sql, params)
+    has_next = len(rows) > page_size
+    rows = rows[:page_size]
+    return Response({
+        'success': True,
+        'data': rows,
+        'pagination': {
+            'page_size': page_size,
+            'order': order,
+            'has_next': has_next,
+            'next_cursor': make_cursor(rows[-1]) if has_next else None,
+        }
+    })
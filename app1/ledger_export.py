@@ -0,0 +1,136 @@
+"""
+Spreadsheet export of an account ledger (``?export=csv|xlsx``).
+
+Rows come straight from the running-balance query of ledger.py through a
+server-side cursor, oldest first, between an opening row (the master's
+opening balance) and a closing row with the debit/credit totals and the
+final balance.
+
+``csv``   streamed; the download starts with the first rows
+``xlsx``  written by xlsxwriter in constant-memory mode (each row is flushed
+          to a temporary file as soon as it is written) and sent when the
+          workbook is closed, since an XLSX is a zip whose directory comes
+          last; needs ``xlsxwriter``
+"""
+import csv
+import tempfile
+
+from django.db import connections
+from django.http import FileResponse, StreamingHttpResponse
+
+from task_backend.streaming import iter_query
+
+try:
+    import xlsxwriter
+except ImportError:
+    xlsxwriter = None
+
+EXPORT_FORMATS = ('csv', 'xlsx')
+
+COLUMNS = (
+    ('entry_date', 'Date'),
+    ('particulars', 'Particulars'),
+    ('voucher_no', 'Voucher No'),
+    ('entry_mode', 'Mode'),
+    ('debit', 'Debit'),
+    ('credit', 'Credit'),
+    ('narration', 'Narration'),
+    ('running_balance', 'Balance'),
+)
+
+# Rows per chunk of the streamed CSV
+CSV_CHUNK_ROWS = 500
+
+
+def _opening_balance(using, client_id, account_code, master_table):
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            f'SELECT COALESCE(MAX(opening_balance), 0) FROM {master_table} WHERE code = %s AND client_id = %s',
+            [account_code, client_id],
+        )
+        return cursor.fetchone()[0]
+
+
+def statement_rows(using, client_id, account_code, master_table, sql, params):
+    """Ledger rows of ``sql`` (ascending order) between the opening and closing rows"""
+    opening = _opening_balance(using, client_id, account_code, master_table)
+    yield {'particulars': 'Opening Balance', 'running_balance': opening}
+
+    total_debit = total_credit = 0
+    balance = opening
+    for row in iter_query(sql, params, using=using):
+        total_debit += row['debit'] or 0
+        total_credit += row['credit'] or 0
+        balance = row['running_balance']
+        yield row
+
+    yield {'particulars': 'Closing Balance', 'debit': total_debit, 'credit': total_credit, 'running_balance': balance}
+
+
+class _Echo:
+    """File-like object for csv.writer that hands every line back"""
+
+    def write(self, value):
+        return value
+
+
+def _csv_chunks(rows):
+    writer = csv.writer(_Echo())
+    # BOM so Excel opens the file as UTF-8.  The header goes out before the
+    # query runs, so the download starts at once
+    yield ('\ufeff' + writer.writerow([title for _, title in COLUMNS])).encode('utf-8')
+    lines = []
+    for row in rows:
+        lines.append(writer.writerow([row.get(key) for key, _ in COLUMNS]))
+        if len(lines) >= CSV_CHUNK_ROWS:
+            yield ''.join(lines).encode('utf-8')
+            lines = []
+    yield ''.join(lines).encode('utf-8')
+
+
+def _xlsx_file(rows):
+    """Workbook of ``rows`` in a temporary file, positioned at its start"""
+    output = tempfile.TemporaryFile()
+    workbook = xlsxwriter.Workbook(output, {'constant_memory': True})
+    worksheet = workbook.add_worksheet('Ledger')
+    bold = workbook.add_format({'bold': True})
+    date_format = workbook.add_format({'num_format': 'dd-mm-yyyy'})
+    amount_format = workbook.add_format({'num_format': '#,##0.00'})
+    bold_amount_format = workbook.add_format({'num_format': '#,##0.00', 'bold': True})
+    formats = {'entry_date': date_format, 'debit': amount_format, 'credit': amount_format, 'running_balance': amount_format}
+    # Opening and closing rows (the ones without a ledger id) in bold
+    summary_formats = {'particulars': bold, 'debit': bold_amount_format, 'credit': bold_amount_format, 'running_balance': bold_amount_format}
+
+    worksheet.freeze_panes(1, 0)
+    worksheet.set_column(0, 0, 12)
+    worksheet.set_column(1, 1, 40)
+    worksheet.set_column(4, 5, 14)
+    worksheet.set_column(6, 6, 40)
+    worksheet.set_column(7, 7, 16)
+    worksheet.write_row(0, 0, [title for _, title in COLUMNS], bold)
+
+    # constant_memory flushes every row once the next one starts, so rows
+    # must be written strictly in order
+    for row_number, row in enumerate(rows, start=1):
+        row_formats = formats if 'id' in row else summary_formats
+        for col, (key, _) in enumerate(COLUMNS):
+            value = row.get(key)
+            if value is not None:
+                worksheet.write(row_number, col, value, row_formats.get(key))
+
+    workbook.close()
+    output.seek(0)
+    return output
+
+
+def export_response(export, rows, filename):
+    """CSV or XLSX download of ``rows`` (see statement_rows); ``filename`` without extension"""
+    if export == 'csv':
+        response = StreamingHttpResponse(_csv_chunks(rows), content_type='text/csv; charset=utf-8')
+        response['Content-Disposition'] = f'attachment; filename="{filename}.csv"'
+        response['X-Accel-Buffering'] = 'no'
+        return response
+    return FileResponse(
+        _xlsx_file(rows), as_attachment=True, filename=f'{filename}.xlsx',
+        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    )
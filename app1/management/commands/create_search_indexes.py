@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from app1.search import SEARCH_FIELDS
+
+# acc_master is not managed by Django migrations, so its search indexes are
+# created here.  CONCURRENTLY keeps the table writable while they build.
+INDEX_SQL = "CREATE INDEX CONCURRENTLY IF NOT EXISTS acc_master_{field}_trgm ON acc_master USING gin ({field} gin_trgm_ops)"
+
+
+class Command(BaseCommand):
+    help = "Install pg_trgm and create the GIN trigram indexes used by account search"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default')
+        parser.add_argument('--dry-run', action='store_true', help="Print the statements without running them")
+
+    def handle(self, *args, **options):
+        connection = connections[options['database']]
+        statements = ['CREATE EXTENSION IF NOT EXISTS pg_trgm']
+        statements += [INDEX_SQL.format(field=field) for field in SEARCH_FIELDS]
+
+        if options['dry_run']:
+            for sql in statements:
+                self.stdout.write(sql + ';')
+            return
+
+        if connection.vendor != 'postgresql':
+            raise CommandError(
+                f"Trigram indexes need PostgreSQL (database '{options['database']}' is {connection.vendor}); "
+                "other databases use the in-process search index."
+            )
+
+        with connection.cursor() as cursor:
+            for sql in statements:
+                self.stdout.write(sql)
+                cursor.execute(sql)
+        self.stdout.write(self.style.SUCCESS(f"Created {len(SEARCH_FIELDS)} trigram indexes on acc_master"))
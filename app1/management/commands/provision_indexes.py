@@ -0,0 +1,154 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, connections
+
+from app1.indexes import INDEXES, TABLES, create_sql, declared_definition, drift, drop_sql, duplicates, existing_indexes
+from task_backend.replicas import replica_settings
+
+
+def size(n):
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if n < 1024 or unit == 'GB':
+            return f"{n:.0f} {unit}" if unit == 'B' else f"{n:.1f} {unit}"
+        n /= 1024
+
+
+class Command(BaseCommand):
+    help = (
+        "Create the declared indexes (app1/indexes.py) on the unmanaged legacy tables with CREATE INDEX "
+        "CONCURRENTLY, and report drift from pg_indexes and unused or duplicate indexes"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default')
+        parser.add_argument('--view', action='append', default=[],
+                            help="Only the indexes used by this view (URL name, repeatable)")
+        parser.add_argument('--check', action='store_true',
+                            help="Only report; exit with an error when a declared index is missing, changed or invalid")
+        parser.add_argument('--dry-run', action='store_true', help="Print the statements without running them")
+        parser.add_argument('--replace', action='store_true',
+                            help="Also drop and rebuild indexes whose definition differs from the declared one")
+        parser.add_argument('--all-tables', action='store_true',
+                            help="Report unused and duplicate indexes on every table, not only the declared ones")
+
+    def handle(self, *args, **options):
+        names = [name for name in INDEXES if not options['view'] or set(options['view']) & set(INDEXES[name]['views'])]
+        if not names:
+            views = sorted({view for index in INDEXES.values() for view in index['views']})
+            raise CommandError(f"No declared index is used by --view; views: {', '.join(views)}")
+
+        connection = connections[options['database']]
+        if connection.vendor != 'postgresql':
+            if options['dry_run']:
+                for name in names:
+                    self.stdout.write(create_sql(name) + ';')
+                return
+            raise CommandError(f"Index provisioning needs PostgreSQL (database '{options['database']}' is {connection.vendor})")
+
+        existing = existing_indexes(options['database'], None if options['all_tables'] else TABLES)
+        missing, changed, invalid, undeclared = drift(existing)
+        missing, changed, invalid = ([name for name in group if name in names] for group in (missing, changed, invalid))
+
+        self.stdout.write(f"Declared indexes on {options['database']}:")
+        for name in names:
+            index = existing.get(name)
+            if name in missing:
+                state = self.style.WARNING('missing')
+            elif name in invalid:
+                state = self.style.WARNING('invalid')
+            elif name in changed:
+                state = self.style.WARNING(f"differs: {index['definition']}")
+            else:
+                state = f"ok  {size(index['bytes'])}, {index['scans']} scans"
+            self.stdout.write(f"  {name:<44} {state}")
+        for name in undeclared:
+            self.stdout.write(f"  {name:<44} {self.style.WARNING('undeclared')}: {existing[name]['table']} {existing[name]['definition']}")
+        self.stdout.write(
+            f"Drift: {len(missing)} missing, {len(changed)} changed, {len(invalid)} invalid, {len(undeclared)} undeclared"
+        )
+        self.report_unused(existing, options['database'])
+        self.report_duplicates(existing)
+
+        rebuild = invalid + (changed if options['replace'] else [])
+        build = [name for name in names if name in rebuild or name in missing]
+        # Trigram indexes last, after their extension, so a server without
+        # pg_trgm still gets the others
+        trigram = [name for name in build if 'gin_trgm_ops' in declared_definition(name)]
+        steps = [(name, [drop_sql(name)] * (name in rebuild) + [create_sql(name)]) for name in build if name not in trigram]
+        if trigram:
+            steps.append((None, ['CREATE EXTENSION IF NOT EXISTS pg_trgm']))
+            steps += [(name, [drop_sql(name)] * (name in rebuild) + [create_sql(name)]) for name in trigram]
+
+        if options['check']:
+            if missing or changed or invalid:
+                raise CommandError(f"{len(missing) + len(changed) + len(invalid)} declared index(es) out of date")
+            return
+        if options['dry_run']:
+            for _, statements in steps:
+                for sql in statements:
+                    self.stdout.write(sql + ';')
+            return
+        if changed and not options['replace']:
+            self.stdout.write(f"{len(changed)} changed index(es) left as they are; rebuild them with --replace")
+        if not steps:
+            self.stdout.write(self.style.SUCCESS("Nothing to create"))
+            return
+
+        # CONCURRENTLY cannot run in a transaction; each statement commits on
+        # its own and the tables stay writable while the indexes build.  A
+        # build that fails leaves an invalid index, rebuilt by the next run.
+        created, failed = 0, []
+        with connection.cursor() as cursor:
+            for name, statements in steps:
+                if name in trigram and None in failed:
+                    failed.append(name)
+                    continue
+                try:
+                    for sql in statements:
+                        self.stdout.write(sql)
+                        cursor.execute(sql)
+                except DatabaseError as e:
+                    self.stderr.write(f"  failed: {e}".rstrip())
+                    failed.append(name)
+                    continue
+                created += name is not None
+        if failed:
+            raise CommandError(
+                f"Created {created} index(es); failed: {', '.join(name or 'pg_trgm' for name in failed)}"
+            )
+        self.stdout.write(self.style.SUCCESS(f"Created {created} index(es)"))
+
+    def report_unused(self, existing, database):
+        # Statistics are kept per server: an index only read on a replica has
+        # no scans on the primary, so the replicas' counts are added
+        scans = {name: index['scans'] for name, index in existing.items()}
+        sources = [database]
+        for alias in replica_settings()['DATABASES']:
+            if alias == database:
+                continue
+            try:
+                replica = existing_indexes(alias, {index['table'] for index in existing.values()})
+            except Exception as e:
+                self.stderr.write(f"Skipping the statistics of {alias}: {e}")
+                continue
+            sources.append(alias)
+            for name, index in replica.items():
+                if name in scans:
+                    scans[name] += index['scans']
+
+        unused = [name for name, index in existing.items() if not index['unique'] and not scans[name]]
+        self.stdout.write(f"Unused (no scans on {', '.join(sources)} since their statistics were reset): {len(unused)}")
+        for name in sorted(unused, key=lambda name: -existing[name]['bytes']):
+            index = existing[name]
+            self.stdout.write(
+                f"  {name:<44} {index['table']} {index['definition']}, {size(index['bytes'])}"
+                + (' (declared)' if name in INDEXES else '')
+            )
+
+    def report_duplicates(self, existing):
+        found = duplicates(existing)
+        self.stdout.write(f"Duplicate or redundant: {len(found)}")
+        for name, covered_by in found:
+            self.stdout.write(
+                f"  {name:<44} {existing[name]['table']} {existing[name]['definition']}, covered by {covered_by}"
+                + (' (declared)' if name in INDEXES else '')
+            )
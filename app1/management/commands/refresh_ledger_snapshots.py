@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from app1.balances import refresh_snapshots
+from app1.models import AccLedgers
+
+
+class Command(BaseCommand):
+    help = "Update the daily ledger balance snapshots (run after each sync)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--client', action='append', dest='clients',
+                            help="Client id to refresh (repeatable); defaults to every client with ledger rows")
+        parser.add_argument('--full', action='store_true', help="Rebuild from scratch instead of incrementally")
+
+    def handle(self, *args, **options):
+        clients = options['clients'] or AccLedgers.objects.values_list('client_id', flat=True).distinct().order_by('client_id')
+        for client_id in clients:
+            result = refresh_snapshots(client_id, full=options['full'])
+            self.stdout.write(
+                f"{client_id}: {result['mode']}, {result['snapshots']} snapshot rows written, "
+                f"ledger id <= {result['last_ledger_id']}"
+            )
@@ -0,0 +1,41 @@
+# Generated by Django 5.0.2 on 2026-10-18 14:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app1', '0003_accinvmast_accledgers_accmaster_cashandbankaccmaster'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LedgerSnapshotState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('client_id', models.CharField(max_length=100, unique=True)),
+                ('last_ledger_id', models.BigIntegerField(default=0)),
+                ('ledger_rows', models.BigIntegerField(default=0)),
+                ('refreshed_at', models.DateTimeField()),
+            ],
+            options={
+                'db_table': 'ledger_snapshot_state',
+            },
+        ),
+        migrations.CreateModel(
+            name='LedgerDailyBalance',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('client_id', models.CharField(max_length=100)),
+                ('code', models.CharField(max_length=30)),
+                ('date', models.DateField()),
+                ('cumulative_debit', models.DecimalField(decimal_places=2, default=0, max_digits=18)),
+                ('cumulative_credit', models.DecimalField(decimal_places=2, default=0, max_digits=18)),
+            ],
+            options={
+                'db_table': 'ledger_daily_balance',
+                'unique_together': {('client_id', 'code', 'date')},
+            },
+        ),
+    ]
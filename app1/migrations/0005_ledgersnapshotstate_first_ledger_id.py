@@ -0,0 +1,18 @@
+# Generated by Django 5.0.2 on 2026-10-18 15:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app1', '0004_ledgerdailybalance_ledgersnapshotstate'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ledgersnapshotstate',
+            name='first_ledger_id',
+            field=models.BigIntegerField(default=0),
+        ),
+    ]
@@ -139,3 +139,38 @@ class CashAndBankAccMaster(models.Model):
 
 
 
+
+
+class LedgerDailyBalance(models.Model):
+    """
+    Daily ledger snapshot, maintained by ``manage.py refresh_ledger_snapshots``.
+    One row per (client_id, code, date) with ledger activity, holding the
+    cumulative debit and credit of the account up to the end of that date.
+    Ledger rows without an entry_date are folded into 0001-01-01.
+    """
+    client_id = models.CharField(max_length=100)
+    code = models.CharField(max_length=30)
+    date = models.DateField()
+    cumulative_debit = models.DecimalField(max_digits=18, decimal_places=2, default=0)
+    cumulative_credit = models.DecimalField(max_digits=18, decimal_places=2, default=0)
+
+    class Meta:
+        db_table = 'ledger_daily_balance'
+        unique_together = ('client_id', 'code', 'date')
+
+
+class LedgerSnapshotState(models.Model):
+    """
+    How far the snapshots of a client are up to date: every acc_ledgers row
+    with id <= last_ledger_id is included.  ``ledger_rows`` is the number of
+    such rows and ``first_ledger_id`` the lowest of their ids, used to notice
+    rows deleted or rewritten by a later sync.
+    """
+    client_id = models.CharField(max_length=100, unique=True)
+    first_ledger_id = models.BigIntegerField(default=0)
+    last_ledger_id = models.BigIntegerField(default=0)
+    ledger_rows = models.BigIntegerField(default=0)
+    refreshed_at = models.DateTimeField()
+
+    class Meta:
+        db_table = 'ledger_snapshot_state'
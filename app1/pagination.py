@@ -0,0 +1,63 @@
+"""
+Row-count helpers for paginated raw-SQL endpoints.
+
+``count=exact``     COUNT(...) once per search, cached and reused across pages
+``count=estimate``  PostgreSQL planner estimate (falls back to exact elsewhere)
+``count=none``      no count at all; clients rely on has_next / next_cursor
+"""
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+
+COUNT_MODES = ('exact', 'estimate', 'none')
+
+
+def cached_count(key_parts, compute):
+    """
+    Return ``compute()``, cached under ``key_parts`` for COUNT_CACHE_TIMEOUT
+    seconds.  Include the tenant's sync generation in ``key_parts`` so a sync
+    does not leave a stale count behind.
+    """
+    key = 'rowcount:' + hashlib.sha1(repr(key_parts).encode()).hexdigest()
+    value = cache.get(key)
+    if value is None:
+        value = compute()
+        cache.set(key, value, getattr(settings, 'COUNT_CACHE_TIMEOUT', 300))
+    return value
+
+
+def estimate_count(connection, select_sql, params):
+    """Planner row estimate for ``select_sql`` on PostgreSQL, otherwise None."""
+    if connection.vendor != 'postgresql':
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute('EXPLAIN (FORMAT JSON) ' + select_sql, params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+def count_rows(mode, connection, count_sql, select_sql, params, key_parts):
+    """
+    Total for a paginated query according to ``mode`` (one of COUNT_MODES).
+
+    ``count_sql`` must return a single number, ``select_sql`` is the same
+    query without LIMIT/OFFSET (used for the estimate).  Returns None for
+    ``count=none``.
+    """
+    if mode == 'none':
+        return None
+    if mode == 'estimate':
+        estimate = estimate_count(connection, select_sql, params)
+        if estimate is not None:
+            return estimate
+
+    def exact():
+        with connection.cursor() as cursor:
+            cursor.execute(count_sql, params)
+            return cursor.fetchone()[0]
+
+    return cached_count(key_parts, exact)
@@ -0,0 +1,275 @@
+"""
+Ranked substring search over ``acc_master`` (debtors, suppliers, firms).
+
+Two interchangeable backends:
+
+* ``PostgresTrigramSearch`` filters with ILIKE, which the pg_trgm GIN indexes
+  created by ``manage.py create_search_indexes`` can serve, and ranks with
+  ``similarity()``.
+* ``NgramIndexSearch`` keeps a per-tenant trigram inverted index in process.
+  It is used on SQLite (tests, local runs) or when pg_trgm is not installed.
+
+Both return ``[(code, score), ...]`` ordered best match first.  A row matches
+when the term occurs (case-insensitively) in any of the requested fields,
+which is the same rule as the old ``LIKE '%term%'`` filters.
+
+``search_rows`` applies the same search to an AccMaster queryset, so a view
+keeps its own columns and annotations: on PostgreSQL as one query (the
+``ilike`` lookup and ``similarity()``), in process otherwise.  Unlike
+``icontains``, which compiles to ``UPPER(col) LIKE UPPER(...)``, ``ilike``
+leaves the column bare so the trigram indexes apply.
+"""
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import connections, router
+from django.db.models import CharField, FloatField, Func, Lookup, Q, TextField, Value
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import AccMaster
+
+SEARCH_FIELDS = ('name', 'code', 'place', 'area')
+
+_word_re = re.compile(r'[^\W_]+')
+
+
+@CharField.register_lookup
+@TextField.register_lookup
+class ILike(Lookup):
+    """``field__ilike=pattern``: PostgreSQL ILIKE on the bare column (see like_pattern)"""
+
+    lookup_name = 'ilike'
+
+    def as_postgresql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f'{lhs} ILIKE {rhs}', [*lhs_params, *rhs_params]
+
+
+def like_pattern(term):
+    """``%term%`` with LIKE wildcards in ``term`` escaped"""
+    return '%' + term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+
+
+def trigrams(value):
+    """pg_trgm-style trigrams: lowercased words padded with two leading and one trailing blank"""
+    grams = set()
+    for word in _word_re.findall((value or '').lower()):
+        padded = f'  {word} '
+        for i in range(len(padded) - 2):
+            grams.add(padded[i:i + 3])
+    return grams
+
+
+def similarity(a_grams, b_grams):
+    if not a_grams or not b_grams:
+        return 0.0
+    shared = len(a_grams & b_grams)
+    return shared / (len(a_grams) + len(b_grams) - shared)
+
+
+class PostgresTrigramSearch:
+    """ILIKE filter + similarity() ranking, backed by pg_trgm GIN indexes"""
+
+    def __init__(self, using):
+        self.using = using
+
+    def search(self, client_id, term, fields=SEARCH_FIELDS, super_code=None):
+        pattern = like_pattern(term)
+        score = ', '.join(f"similarity(COALESCE(am.{field}, ''), %s)" for field in fields)
+        if len(fields) > 1:
+            score = f'GREATEST({score})'
+        match = ' OR '.join(f'am.{field} ILIKE %s' for field in fields)
+
+        params = [term] * len(fields) + [client_id]
+        super_code_condition = ''
+        if super_code:
+            super_code_condition = 'AND am.super_code = %s'
+            params.append(super_code)
+        params += [pattern] * len(fields)
+
+        sql = f"""
+            SELECT am.code, {score} AS score
+            FROM acc_master am
+            WHERE am.client_id = %s
+            {super_code_condition}
+            AND ({match})
+            ORDER BY score DESC, am.code
+        """
+        with connections[self.using].cursor() as cursor:
+            cursor.execute(sql, params)
+            return [(code, float(score)) for code, score in cursor.fetchall()]
+
+    def rows(self, queryset, client_id, terms, fields=SEARCH_FIELDS, super_code=None):
+        match = Q()
+        scores = []
+        for term in terms:
+            for field in fields:
+                match |= Q(**{f'{field}__ilike': like_pattern(term)})
+                scores.append(Func(Coalesce(field, Value('')), Value(term), function='similarity', output_field=FloatField()))
+        return queryset.filter(match).alias(
+            search_score=Greatest(*scores) if len(scores) > 1 else scores[0]
+        ).order_by('-search_score', 'code')
+
+
+class _TenantIndex:
+    __slots__ = ('built_at', 'rows', 'postings')
+
+    def __init__(self, rows):
+        self.built_at = time.monotonic()
+        # rows: [(code, super_code, {field: lowered value})]
+        self.rows = rows
+        # postings: {field: {trigram: set(row index)}}
+        self.postings = {field: {} for field in SEARCH_FIELDS}
+        for idx, (_, _, values) in enumerate(rows):
+            for field, value in values.items():
+                field_postings = self.postings[field]
+                for gram in _substring_trigrams(value):
+                    field_postings.setdefault(gram, set()).add(idx)
+
+
+def _substring_trigrams(value):
+    """Every 3-character window of ``value``; a substring match must contain all of the term's windows"""
+    return {value[i:i + 3] for i in range(len(value) - 2)}
+
+
+class NgramIndexSearch:
+    """
+    In-process trigram inverted index per tenant.
+
+    Indexes are built on first use and rebuilt after ACCOUNT_SEARCH_INDEX_TTL
+    seconds; at most ACCOUNT_SEARCH_MAX_TENANTS tenants are kept.
+    """
+
+    def __init__(self, using, ttl=None, max_tenants=None):
+        self.using = using
+        self.ttl = ttl if ttl is not None else getattr(settings, 'ACCOUNT_SEARCH_INDEX_TTL', 300)
+        self.max_tenants = max_tenants or getattr(settings, 'ACCOUNT_SEARCH_MAX_TENANTS', 64)
+        self._indexes = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _build(self, client_id):
+        rows = []
+        queryset = AccMaster.objects.using(self.using).filter(client_id=client_id).values_list(
+            'code', 'super_code', *[f for f in SEARCH_FIELDS if f != 'code'])
+        for code, super_code, *values in queryset.iterator(chunk_size=5000):
+            fields = dict(zip([f for f in SEARCH_FIELDS if f != 'code'], values))
+            fields['code'] = code
+            rows.append((code, super_code, {f: (v or '').lower() for f, v in fields.items()}))
+        return _TenantIndex(rows)
+
+    def index_for(self, client_id):
+        with self._lock:
+            index = self._indexes.get(client_id)
+            if index is not None and time.monotonic() - index.built_at < self.ttl:
+                self._indexes.move_to_end(client_id)
+                return index
+        index = self._build(client_id)
+        with self._lock:
+            self._indexes[client_id] = index
+            self._indexes.move_to_end(client_id)
+            while len(self._indexes) > self.max_tenants:
+                self._indexes.popitem(last=False)
+        return index
+
+    def invalidate(self, client_id=None):
+        with self._lock:
+            if client_id is None:
+                self._indexes.clear()
+            else:
+                self._indexes.pop(client_id, None)
+
+    def search(self, client_id, term, fields=SEARCH_FIELDS, super_code=None):
+        index = self.index_for(client_id)
+        needle = term.lower()
+        needle_grams = _substring_trigrams(needle)
+        term_trigrams = trigrams(term)
+
+        best = {}
+        for field in fields:
+            if needle_grams:
+                postings = index.postings[field]
+                lists = sorted((postings.get(g, ()) for g in needle_grams), key=len)
+                candidates = set(lists[0]).intersection(*lists[1:]) if lists[0] else ()
+            else:
+                candidates = range(len(index.rows))
+            for idx in candidates:
+                code, row_super_code, values = index.rows[idx]
+                if super_code and row_super_code != super_code:
+                    continue
+                value = values[field]
+                if needle not in value:
+                    continue
+                score = similarity(term_trigrams, trigrams(value))
+                if score > best.get(code, -1.0):
+                    best[code] = score
+
+        return sorted(best.items(), key=lambda item: (-item[1], item[0]))
+
+    def rows(self, queryset, client_id, terms, fields=SEARCH_FIELDS, super_code=None):
+        ranks = {}
+        for term in terms:
+            for code, score in self.search(client_id, term, fields=fields, super_code=super_code):
+                ranks[code] = max(score, ranks.get(code, -1.0))
+        # The matches are filtered in process rather than with code__in, which
+        # a broad term would push past SQLite's parameter limit
+        matches = [row for row in queryset.order_by('code') if _code(row) in ranks]
+        return sorted(matches, key=lambda row: -ranks[_code(row)])
+
+
+def _code(row):
+    return row['code'] if isinstance(row, dict) else row.code
+
+
+_backends = {}
+_backends_lock = threading.Lock()
+
+
+def _pg_trgm_installed(using):
+    with connections[using].cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+        return cursor.fetchone() is not None
+
+
+def get_search_backend(using=None):
+    """
+    Backend for ``using`` according to ACCOUNT_SEARCH_BACKEND:
+    'auto' (default), 'postgres' or 'memory'.
+    """
+    using = using or router.db_for_read(AccMaster)
+    with _backends_lock:
+        backend = _backends.get(using)
+    if backend is not None:
+        return backend
+
+    choice = getattr(settings, 'ACCOUNT_SEARCH_BACKEND', 'auto')
+    if choice == 'auto':
+        use_postgres = connections[using].vendor == 'postgresql' and _pg_trgm_installed(using)
+        choice = 'postgres' if use_postgres else 'memory'
+    backend = PostgresTrigramSearch(using) if choice == 'postgres' else NgramIndexSearch(using)
+
+    with _backends_lock:
+        return _backends.setdefault(using, backend)
+
+
+def search_accounts(client_id, term, fields=SEARCH_FIELDS, super_code=None):
+    """Ranked ``[(code, score)]`` of the client's accounts whose fields contain ``term``"""
+    term = (term or '').strip()
+    if not term:
+        return []
+    return get_search_backend().search(client_id, term, fields=fields, super_code=super_code)
+
+
+def search_rows(queryset, client_id, terms, fields=SEARCH_FIELDS, super_code=None):
+    """
+    Rows of ``queryset`` (the client's accounts) where any of ``terms``
+    occurs in any of ``fields``, best match first: a queryset on PostgreSQL,
+    a list with the in-process backend.
+    """
+    terms = [term.strip() for term in terms if term and term.strip()]
+    if not terms:
+        return queryset.none()
+    return get_search_backend().rows(queryset, client_id, terms, fields=fields, super_code=super_code)
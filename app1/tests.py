@@ -1,3 +1,148 @@
-from django.test import TestCase
+from datetime import date
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.db import connection
+from django.test import TestCase, override_settings
+
+from .balances import account_balances, refresh_snapshots
+from .models import AccLedgers, AccMaster, CashAndBankAccMaster
+from .search import _backends, search_rows
+
+
+class UnmanagedTablesMixin:
+    """Creates the tables of the ``managed = False`` models, which migrations leave out"""
+
+    unmanaged_models = (AccMaster, AccLedgers, CashAndBankAccMaster)
+
+    @classmethod
+    def setUpClass(cls):
+        # Before TestCase opens its transaction: SQLite cannot change the
+        # schema inside one
+        with connection.schema_editor() as editor:
+            for model in cls.unmanaged_models:
+                editor.create_model(model)
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        with connection.schema_editor() as editor:
+            for model in cls.unmanaged_models:
+                editor.delete_model(model)
+
+
+@override_settings(LEDGER_SNAPSHOTS_AUTO_REFRESH=False)
+class AccountBalancesTests(UnmanagedTablesMixin, TestCase):
+    client_id = 'T001'
+
+    def setUp(self):
+        AccMaster.objects.create(code='D1', name='Debtor one', super_code='DEBTO', opening_balance=100, client_id=self.client_id)
+        AccMaster.objects.create(code='D2', name='Debtor two', super_code='DEBTO', opening_balance=0, client_id=self.client_id)
+        self.rows = [
+            ('D1', date(2025, 1, 5), 50, 0),
+            ('D1', date(2025, 2, 10), 0, 20),
+            ('D2', date(2025, 1, 20), 30, 0),
+            ('D2', None, 5, 0),
+        ]
+        self.insert(self.rows)
+
+    def insert(self, rows):
+        AccLedgers.objects.bulk_create([
+            AccLedgers(code=code, entry_date=day, debit=debit, credit=credit, client_id=self.client_id)
+            for code, day, debit, credit in rows
+        ])
+
+    def balances(self, **kwargs):
+        results, state = account_balances(self.client_id, end=date(2025, 12, 31), **kwargs)
+        return {row['code']: (row['opening'], row['debit'], row['credit'], row['closing']) for row in results}, state
+
+    def test_snapshots_match_the_ledger(self):
+        expected = {
+            'D1': (Decimal(100), Decimal(50), Decimal(20), Decimal(130)),
+            'D2': (Decimal(0), Decimal(35), Decimal(0), Decimal(35)),
+        }
+        live, state = self.balances()
+        self.assertIsNone(state)
+        self.assertEqual(live, expected)
+
+        refresh_snapshots(self.client_id)
+        snapshot, state = self.balances()
+        self.assertIsNotNone(state)
+        self.assertEqual(snapshot, expected)
+
+    def test_rows_after_the_refresh_are_added(self):
+        refresh_snapshots(self.client_id)
+        self.insert([('D1', date(2025, 3, 1), 10, 0)])
+        balances, state = self.balances()
+        self.assertIsNotNone(state)
+        self.assertEqual(balances['D1'], (Decimal(100), Decimal(60), Decimal(20), Decimal(140)))
+
+    def test_reinserted_rows_are_not_counted_twice(self):
+        refresh_snapshots(self.client_id)
+        before, _ = self.balances(start=date(2025, 2, 1))
+
+        # A sync deletes the client's rows and inserts them again with new ids
+        AccLedgers.objects.filter(client_id=self.client_id).delete()
+        self.insert(self.rows)
+        after, state = self.balances(start=date(2025, 2, 1))
+        self.assertIsNone(state)
+        self.assertEqual(after, before)
+
+        refresh_snapshots(self.client_id)
+        refreshed, state = self.balances(start=date(2025, 2, 1))
+        self.assertIsNotNone(state)
+        self.assertEqual(refreshed, before)
+
+    def test_deleted_newest_rows_are_not_counted(self):
+        refresh_snapshots(self.client_id)
+        AccLedgers.objects.filter(client_id=self.client_id, code='D2').delete()
+        balances, state = self.balances()
+        self.assertIsNone(state)
+        self.assertEqual(balances['D2'], (Decimal(0), Decimal(0), Decimal(0), Decimal(0)))
+
+    def test_snapshots_behind_the_ledger_start_a_refresh(self):
+        with mock.patch('app1.balances.refresh_in_background') as refresh:
+            self.balances()
+            refresh.assert_called_once_with(self.client_id)
+
+            refresh_snapshots(self.client_id)
+            refresh.reset_mock()
+            self.balances()
+            refresh.assert_not_called()
+
+            self.insert([('D1', date(2025, 3, 1), 10, 0)])
+            self.balances()
+            refresh.assert_called_once_with(self.client_id)
+
+
+@override_settings(ACCOUNT_SEARCH_BACKEND='memory')
+class SearchRowsTests(UnmanagedTablesMixin, TestCase):
+    unmanaged_models = (AccMaster,)
+
+    def setUp(self):
+        _backends.clear()
+        for code, name, area, super_code in [
+            ('F1', 'North Traders', 'CITY', 'DEBTO'),
+            ('F2', 'Bakery', 'NORTH', 'DEBTO'),
+            ('F3', 'Rural Stores', 'RURAL', 'SUNCR'),
+            ('F4', 'Mart', 'WEST', 'DEBTO'),
+        ]:
+            AccMaster.objects.create(code=code, name=name, area=area, super_code=super_code, client_id='T001')
+        AccMaster.objects.create(code='F5', name='North', area='NORTH', client_id='T002')
+
+    def codes(self, rows):
+        return [row['code'] if isinstance(row, dict) else row.code for row in rows]
+
+    def test_any_term_in_any_field_best_first(self):
+        accounts = AccMaster.objects.filter(client_id='T001')
+        rows = search_rows(accounts, 'T001', ['north', 'rural'], fields=('name', 'area'))
+        self.assertEqual(self.codes(rows), ['F2', 'F3', 'F1'])
+
+    def test_keeps_the_queryset_columns_and_filters(self):
+        suppliers = AccMaster.objects.filter(client_id='T001', super_code='SUNCR').values('code', 'name')
+        rows = search_rows(suppliers, 'T001', ['stores'], super_code='SUNCR')
+        self.assertEqual(list(rows), [{'code': 'F3', 'name': 'Rural Stores'}])
+
+    def test_no_terms_match_nothing(self):
+        self.assertEqual(list(search_rows(AccMaster.objects.filter(client_id='T001'), 'T001', ['', ' '])), [])
@@ -11,6 +11,7 @@ from .views import (
     get_bank_book_data,
     get_bank_ledger_details,
     get_cash_ledger_details,
+    get_account_balances,
     get_sale_report,
     dashboard_total_expenses,
     dashboard_total_income,
@@ -26,7 +27,10 @@ from .views import (
     dashboard_payment_received,
     dashboard_sales_purchases,
     dashboard_recent_invoices,
-    dashboard_stock_history
+    dashboard_stock_history,
+    dashboard_bundle,
+    dashboard_widget_async,
+    dashboard_bundle_async,
 )
 
 
@@ -43,6 +47,7 @@ urlpatterns = [
     path('get-bank-book-data/',  get_bank_book_data,  name='get_bank_book_data'),
     path('get-cash-ledger-details/', get_cash_ledger_details, name='get_cash_ledger_details'),
     path('get-bank-ledger-details/', get_bank_ledger_details, name='get_bank_ledger_details'),
+    path('account-balances/', get_account_balances, name='get_account_balances'),
     path('dashboard/total-expenses/', dashboard_total_expenses, name='dashboard_total_expenses'),
     path('dashboard/total-income/', dashboard_total_income, name='dashboard_total_income'),
     path('dashboard/budget-remaining/', dashboard_budget_remaining, name='dashboard_budget_remaining'),
@@ -58,6 +63,10 @@ urlpatterns = [
     path('dashboard/sales-purchases/', dashboard_sales_purchases, name='dashboard_sales_purchases'),
     path('dashboard/recent-invoices/', dashboard_recent_invoices, name='dashboard_recent_invoices'),
     path('dashboard/stock-history/', dashboard_stock_history, name='dashboard_stock_history'),
+    path('dashboard/bundle/', dashboard_bundle, name='dashboard_bundle'),
+    # Async variants for the ASGI deployment (task_backend.asgi)
+    path('async/dashboard/bundle/', dashboard_bundle_async, name='dashboard_bundle_async'),
+    path('async/dashboard/<str:widget>/', dashboard_widget_async, name='dashboard_widget_async'),
 ]
 
 
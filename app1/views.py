@@ -1,14 +1,27 @@
 # views.py - Complete with Inventory Menu Support
+import json
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_http_methods
 from rest_framework.decorators import api_view
+from rest_framework.utils.encoders import JSONEncoder
 from rest_framework.response import Response
 from .models import AccUser, Misel
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 import jwt
 from django.conf import settings
 from .models import AccUser, Misel, AccMaster, AccLedgers, AccInvmast, CashAndBankAccMaster
 from accesscontroll.models import AllowedMenu
 from django.db.models import Sum, F
 from salestoday_purchasetoday.models import PurchaseToday
+from task_backend.authentication import decode_token, get_client_id
+from task_backend.report_cache import cache_report, sync_generation
+from .balances import BOOKS, account_balances
+from .dashboard import WIDGETS, abuild_widgets, build_widgets
+from .ledger import ledger_response
+from .pagination import COUNT_MODES, count_rows
+from .search import search_accounts
+from task_backend.streaming import default_chunk_size, stream_mode, stream_response
 
 
 @api_view(['POST'])
@@ -138,7 +151,7 @@ def get_misel_data(request):
         
         try:
             # Decode the JWT token
-            payload = jwt.decode(token, settings.SECRET_KEY, algorithms=['HS256'])
+            payload = decode_token(token)
             print(f"=== DEBUG: Token payload: {payload} ===")
             client_id = payload.get('client_id')
             
@@ -172,74 +185,86 @@ def test_token(request):
 
 
 @api_view(['GET'])
+@cache_report
 def get_debtors_data(request):
-    """Get debtors data (super_code='DEBTO') with calculated balance, pagination and search"""
-    from django.db import connection
+    """
+    Get debtors data (super_code='DEBTO') with calculated balance, pagination and search
+
+    Query params:
+        page, page_size   offset pagination (default)
+        after_code        keyset pagination: rows with code > after_code, seeks
+                          on (client_id, super_code, code) so every page costs the same
+        count             exact (default, cached per search) | estimate | none
+        search            matched against name, code and place; results are
+                          ranked by relevance (by code in after_code mode)
+    """
+    from django.db import connections, router
     import math
     
     try:
-        # Get token from Authorization header
-        auth_header = request.META.get('HTTP_AUTHORIZATION')
-        
-        if not auth_header or not auth_header.startswith('Bearer '):
-            return Response({'success': False, 'error': 'Missing or invalid authorization header'}, status=401)
-        
-        token = auth_header.split(' ')[1]
-        
-        try:
-            # Decode the JWT token
-            payload = jwt.decode(token, settings.SECRET_KEY, algorithms=['HS256'])
-            client_id = payload.get('client_id')
-            
-            if not client_id:
-                return Response({'success': False, 'error': 'Invalid token: missing client_id'}, status=401)
-                
-        except jwt.ExpiredSignatureError:
-            return Response({'success': False, 'error': 'Token has expired'}, status=401)
-        except jwt.InvalidTokenError as e:
-            return Response({'success': False, 'error': f'Invalid token: {str(e)}'}, status=401)
+        client_id, err = get_client_id(request)
+        if err:
+            return err
+        connection = connections[router.db_for_read(AccMaster)]
         
         # Get pagination parameters
         page = int(request.GET.get('page', 1))
         page_size = int(request.GET.get('page_size', 20))
         search_term = request.GET.get('search', '').strip()
+        after_code = request.GET.get('after_code')
+        count_mode = request.GET.get('count', 'exact')
+
+        if count_mode not in COUNT_MODES:
+            return Response({'success': False, 'error': f"count must be one of: {', '.join(COUNT_MODES)}"}, status=400)
         
         # Calculate offset
         offset = (page - 1) * page_size
-        
-        # Build the WHERE clause for search
-        search_condition = ""
-        search_params = [client_id]
-        
-        if search_term:
-            # Search in name, code, and place fields (case-insensitive)
-            search_condition = """
-                AND (
-                    UPPER(am.name) LIKE UPPER(%s) OR 
-                    UPPER(am.code) LIKE UPPER(%s) OR 
-                    UPPER(am.place) LIKE UPPER(%s)
-                )
-            """
-            search_pattern = f"%{search_term}%"
-            search_params.extend([search_pattern, search_pattern, search_pattern])
-        
-        # First, get the total count with search filter
-        count_query = f"""
-            SELECT COUNT(DISTINCT am.code)
+
+        base_query = """
             FROM acc_master am
             WHERE am.client_id = %s
             AND am.super_code = 'DEBTO'
-            {search_condition}
         """
-        
-        with connection.cursor() as cursor:
-            cursor.execute(count_query, search_params)
-            total_records = cursor.fetchone()[0]
-        
+
+        if search_term:
+            # Ranked matches come from the account search index; only the
+            # codes of the requested page are then loaded
+            matches = search_accounts(client_id, search_term, fields=('name', 'code', 'place'), super_code='DEBTO')
+            total_records = None if count_mode == 'none' else len(matches)
+            if after_code is not None:
+                page_codes = sorted(code for code, _ in matches if code > after_code)[:page_size + 1]
+            else:
+                page_codes = [code for code, _ in matches[offset:offset + page_size + 1]]
+            page_condition = f"AND am.code IN ({', '.join(['%s'] * len(page_codes))})" if page_codes else "AND 1 = 0"
+            query_params = [client_id] + page_codes
+            limit_clause = ""
+        else:
+            # Total count; the exact count is cached and reused by every page
+            # until the tenant's next sync
+            total_records = count_rows(
+                count_mode, connection,
+                count_sql=f"SELECT COUNT(DISTINCT am.code) {base_query}",
+                select_sql=f"SELECT am.code {base_query}",
+                params=[client_id],
+                key_parts=('debtors', client_id, sync_generation(client_id)),
+            )
+            # Keyset mode seeks past the cursor instead of skipping OFFSET rows
+            if after_code is not None:
+                page_condition = "AND am.code > %s"
+                query_params = [client_id, after_code, page_size + 1, 0]
+            else:
+                page_condition = ""
+                query_params = [client_id, page_size + 1, offset]
+            limit_clause = "ORDER BY am.code LIMIT %s OFFSET %s"
+
         # Calculate total pages
-        total_pages = math.ceil(total_records / page_size) if total_records > 0 else 1
-        
-        # Main query with search filter and calculated balance
+        if total_records is None:
+            total_pages = None
+        else:
+            total_pages = math.ceil(total_records / page_size) if total_records > 0 else 1
+
+        # Main query with calculated balance.  One extra row is fetched to
+        # know whether there is a next page.
         main_query = f"""
             SELECT 
                 am.code,
@@ -251,23 +276,22 @@ def get_debtors_data(request):
                 am.place,
                 am.phone2,
                 am.openingdepartment
-            FROM acc_master am
-            WHERE am.client_id = %s
-            AND am.super_code = 'DEBTO'
-            {search_condition}
-            ORDER BY am.code
-            LIMIT %s OFFSET %s
+            {base_query}
+            {page_condition}
+            {limit_clause}
         """
         
-        # Add limit and offset parameters
-        query_params = search_params + [page_size, offset]
-        
         with connection.cursor() as cursor:
             cursor.execute(main_query, query_params)
             columns = [col[0] for col in cursor.description]
+            rows = cursor.fetchall()
+            if search_term:
+                # Keep the relevance (or cursor) order of page_codes
+                position = {code: i for i, code in enumerate(page_codes)}
+                rows.sort(key=lambda row: position[row[0]])
             results = []
             
-            for row in cursor.fetchall():
+            for row in rows[:page_size]:
                 row_data = dict(zip(columns, row))
                 # Convert Decimal to float for JSON serialization
                 if row_data.get('opening_balance'):
@@ -279,18 +303,28 @@ def get_debtors_data(request):
                 if row_data.get('balance'):
                     row_data['balance'] = float(row_data['balance'])
                 results.append(row_data)
+
+        has_next = len(rows) > page_size
+        pagination = {
+            'total_pages': total_pages,
+            'total_records': total_records,
+            'page_size': page_size,
+            'has_next': has_next,
+            'next_cursor': results[-1]['code'] if has_next and results else None,
+            'count_mode': count_mode,
+        }
+        if after_code is not None:
+            pagination['after_code'] = after_code
+        else:
+            pagination.update({
+                'current_page': page,
+                'has_previous': page > 1
+            })
         
         return Response({
             'success': True, 
             'data': results,
-            'pagination': {
-                'current_page': page,
-                'total_pages': total_pages,
-                'total_records': total_records,
-                'page_size': page_size,
-                'has_next': page < total_pages,
-                'has_previous': page > 1
-            },
+            'pagination': pagination,
             'search_applied': bool(search_term),
             'search_term': search_term
         })
@@ -303,77 +337,34 @@ def get_debtors_data(request):
 
 
 @api_view(['GET'])
+@cache_report
 def get_ledger_details(request):
     """Get detailed ledger entries for a specific account"""
     try:
-        # Get token from Authorization header
-        auth_header = request.META.get('HTTP_AUTHORIZATION')
-        
-        if not auth_header or not auth_header.startswith('Bearer '):
-            return Response({'success': False, 'error': 'Missing or invalid authorization header'}, status=401)
-        
-        token = auth_header.split(' ')[1]
-        
-        try:
-            # Decode the JWT token
-            payload = jwt.decode(token, settings.SECRET_KEY, algorithms=['HS256'])
-            client_id = payload.get('client_id')
-            
-            if not client_id:
-                return Response({'success': False, 'error': 'Invalid token: missing client_id'}, status=401)
-                
-        except jwt.ExpiredSignatureError:
-            return Response({'success': False, 'error': 'Token has expired'}, status=401)
-        except jwt.InvalidTokenError as e:
-            return Response({'success': False, 'error': f'Invalid token: {str(e)}'}, status=401)
+        client_id, err = get_client_id(request)
+        if err:
+            return err
         
         # Get account code from query parameters
         account_code = request.GET.get('account_code')
         if not account_code:
             return Response({'success': False, 'error': 'Missing account_code parameter'}, status=400)
         
-        # Fetch all ledger entries for the specific account
-        ledger_entries = AccLedgers.objects.filter(
-            code=account_code, 
-            client_id=client_id
-        ).values(
-            'entry_date', 'particulars', 'voucher_no', 'entry_mode', 
-            'debit', 'credit', 'narration'
-        ).order_by('-entry_date', '-id')
-        
-        return Response({
-            'success': True, 
-            'data': list(ledger_entries)
-        })
+        # Ledger entries with running balance (paginated / streamed on request)
+        return ledger_response(request, client_id, account_code)
         
     except Exception as e:
         return Response({'success': False, 'error': str(e)}, status=500)
 
 
 @api_view(['GET'])
+@cache_report
 def get_invoice_details(request):
     """Get detailed invoice entries for a specific account"""
     try:
-        # Get token from Authorization header
-        auth_header = request.META.get('HTTP_AUTHORIZATION')
-        
-        if not auth_header or not auth_header.startswith('Bearer '):
-            return Response({'success': False, 'error': 'Missing or invalid authorization header'}, status=401)
-        
-        token = auth_header.split(' ')[1]
-        
-        try:
-            # Decode the JWT token
-            payload = jwt.decode(token, settings.SECRET_KEY, algorithms=['HS256'])
-            client_id = payload.get('client_id')
-            
-            if not client_id:
-                return Response({'success': False, 'error': 'Invalid token: missing client_id'}, status=401)
-                
-        except jwt.ExpiredSignatureError:
-            return Response({'success': False, 'error': 'Token has expired'}, status=401)
-        except jwt.InvalidTokenError as e:
-            return Response({'success': False, 'error': f'Invalid token: {str(e)}'}, status=401)
+        client_id, err = get_client_id(request)
+        if err:
+            return err
         
         # Get account code from query parameters
         account_code = request.GET.get('account_code')
@@ -399,29 +390,13 @@ def get_invoice_details(request):
 
 
 @api_view(['GET'])
+@cache_report
 def get_cash_book_data(request):
     """Get cash book data - accounts with super_code='CASH' for logged user's client_id"""
     try:
-        # Get token from Authorization header
-        auth_header = request.META.get('HTTP_AUTHORIZATION')
-        
-        if not auth_header or not auth_header.startswith('Bearer '):
-            return Response({'success': False, 'error': 'Missing or invalid authorization header'}, status=401)
-        
-        token = auth_header.split(' ')[1]
-        
-        try:
-            # Decode the JWT token
-            payload = jwt.decode(token, settings.SECRET_KEY, algorithms=['HS256'])
-            client_id = payload.get('client_id')
-            
-            if not client_id:
-                return Response({'success': False, 'error': 'Invalid token: missing client_id'}, status=401)
-                
-        except jwt.ExpiredSignatureError:
-            return Response({'success': False, 'error': 'Token has expired'}, status=401)
-        except jwt.InvalidTokenError as e:
-            return Response({'success': False, 'error': f'Invalid token: {str(e)}'}, status=401)
+        client_id, err = get_client_id(request)
+        if err:
+            return err
         
         # Get pagination parameters
         page = int(request.GET.get('page', 1))
@@ -466,29 +441,13 @@ def get_cash_book_data(request):
 
 
 @api_view(['GET'])
+@cache_report
 def get_bank_book_data(request):
     """Get bank book data - accounts with super_code='BANK' for logged user's client_id"""
     try:
-        # Get token from Authorization header
-        auth_header = request.META.get('HTTP_AUTHORIZATION')
-        
-        if not auth_header or not auth_header.startswith('Bearer '):
-            return Response({'success': False, 'error': 'Missing or invalid authorization header'}, status=401)
-        
-        token = auth_header.split(' ')[1]
-        
-        try:
-            # Decode the JWT token
-            payload = jwt.decode(token, settings.SECRET_KEY, algorithms=['HS256'])
-            client_id = payload.get('client_id')
-            
-            if not client_id:
-                return Response({'success': False, 'error': 'Invalid token: missing client_id'}, status=401)
-                
-        except jwt.ExpiredSignatureError:
-            return Response({'success': False, 'error': 'Token has expired'}, status=401)
-        except jwt.InvalidTokenError as e:
-            return Response({'success': False, 'error': f'Invalid token: {str(e)}'}, status=401)
+        client_id, err = get_client_id(request)
+        if err:
+            return err
         
         # Get pagination parameters
         page = int(request.GET.get('page', 1))
@@ -533,29 +492,13 @@ def get_bank_book_data(request):
 
 
 @api_view(['GET'])
+@cache_report
 def get_cash_ledger_details(request):
     """Get detailed ledger entries for a specific cash account"""
     try:
-        # Get token from Authorization header
-        auth_header = request.META.get('HTTP_AUTHORIZATION')
-        
-        if not auth_header or not auth_header.startswith('Bearer '):
-            return Response({'success': False, 'error': 'Missing or invalid authorization header'}, status=401)
-        
-        token = auth_header.split(' ')[1]
-        
-        try:
-            # Decode the JWT token
-            payload = jwt.decode(token, settings.SECRET_KEY, algorithms=['HS256'])
-            client_id = payload.get('client_id')
-            
-            if not client_id:
-                return Response({'success': False, 'error': 'Invalid token: missing client_id'}, status=401)
-                
-        except jwt.ExpiredSignatureError:
-            return Response({'success': False, 'error': 'Token has expired'}, status=401)
-        except jwt.InvalidTokenError as e:
-            return Response({'success': False, 'error': f'Invalid token: {str(e)}'}, status=401)
+        client_id, err = get_client_id(request)
+        if err:
+            return err
         
         # Get account code from query parameters
         account_code = request.GET.get('account_code')
@@ -572,48 +515,21 @@ def get_cash_ledger_details(request):
         if not cash_account_exists:
             return Response({'success': False, 'error': 'Cash account not found'}, status=404)
         
-        # Fetch all ledger entries for the specific cash account
-        ledger_entries = AccLedgers.objects.filter(
-            code=account_code, 
-            client_id=client_id
-        ).values(
-            'entry_date', 'particulars', 'voucher_no', 'entry_mode', 
-            'debit', 'credit', 'narration'
-        ).order_by('-entry_date', '-id')
-        
-        return Response({
-            'success': True, 
-            'data': list(ledger_entries)
-        })
+        # Ledger entries with running balance (paginated / streamed on request)
+        return ledger_response(request, client_id, account_code, master_table='cashandbankaccmaster')
         
     except Exception as e:
         return Response({'success': False, 'error': str(e)}, status=500)
 
 
 @api_view(['GET'])
+@cache_report
 def get_bank_ledger_details(request):
     """Get detailed ledger entries for a specific bank account"""
     try:
-        # Get token from Authorization header
-        auth_header = request.META.get('HTTP_AUTHORIZATION')
-        
-        if not auth_header or not auth_header.startswith('Bearer '):
-            return Response({'success': False, 'error': 'Missing or invalid authorization header'}, status=401)
-        
-        token = auth_header.split(' ')[1]
-        
-        try:
-            # Decode the JWT token
-            payload = jwt.decode(token, settings.SECRET_KEY, algorithms=['HS256'])
-            client_id = payload.get('client_id')
-            
-            if not client_id:
-                return Response({'success': False, 'error': 'Invalid token: missing client_id'}, status=401)
-                
-        except jwt.ExpiredSignatureError:
-            return Response({'success': False, 'error': 'Token has expired'}, status=401)
-        except jwt.InvalidTokenError as e:
-            return Response({'success': False, 'error': f'Invalid token: {str(e)}'}, status=401)
+        client_id, err = get_client_id(request)
+        if err:
+            return err
         
         # Get account code from query parameters
         account_code = request.GET.get('account_code')
@@ -630,73 +546,109 @@ def get_bank_ledger_details(request):
         if not bank_account_exists:
             return Response({'success': False, 'error': 'Bank account not found'}, status=404)
         
-        # Fetch all ledger entries for the specific bank account
-        ledger_entries = AccLedgers.objects.filter(
-            code=account_code, 
-            client_id=client_id
-        ).values(
-            'entry_date', 'particulars', 'voucher_no', 'entry_mode', 
-            'debit', 'credit', 'narration'
-        ).order_by('-entry_date', '-id')
+        # Ledger entries with running balance (paginated / streamed on request)
+        return ledger_response(request, client_id, account_code, master_table='cashandbankaccmaster')
         
+    except Exception as e:
+        return Response({'success': False, 'error': str(e)}, status=500)
+
+
+@api_view(['GET'])
+@cache_report
+def get_account_balances(request):
+    """
+    Opening / closing balance and period debit / credit per account, served
+    from the daily ledger snapshots.
+
+    Query params:
+        from, to        YYYY-MM-DD; from defaults to the beginning, to to today
+        book            accounts (default) | cash | bank
+        account_code    one code or a comma separated list (default: all accounts)
+        super_code      e.g. DEBTO, only for book=accounts
+    """
+    try:
+        client_id, err = get_client_id(request)
+        if err:
+            return err
+
+        book = request.GET.get('book', 'accounts')
+        if book not in BOOKS:
+            return Response({'success': False, 'error': f"book must be one of: {', '.join(BOOKS)}"}, status=400)
+        try:
+            start = date.fromisoformat(request.GET['from']) if request.GET.get('from') else None
+            end = date.fromisoformat(request.GET['to']) if request.GET.get('to') else None
+        except ValueError:
+            return Response({'success': False, 'error': 'from and to must be YYYY-MM-DD dates'}, status=400)
+        if start and end and start > end:
+            return Response({'success': False, 'error': 'from must not be after to'}, status=400)
+        codes = [c.strip() for c in request.GET.get('account_code', '').split(',') if c.strip()]
+
+        balances, state = account_balances(
+            client_id, start=start, end=end, book=book, codes=codes, super_code=request.GET.get('super_code')
+        )
         return Response({
-            'success': True, 
-            'data': list(ledger_entries)
+            'success': True,
+            'from': start,
+            'to': end or datetime.now().date(),
+            'data': balances,
+            'snapshot': {
+                'refreshed_at': state.refreshed_at if state else None,
+                'last_ledger_id': state.last_ledger_id if state else None,
+            }
         })
-        
     except Exception as e:
         return Response({'success': False, 'error': str(e)}, status=500)
 
 
+def _sale_report_row(sale):
+    """Sale record in the shape the dashboard frontend expects"""
+    invdate = sale['invdate'].isoformat() if sale['invdate'] else None
+    amount = float(sale['nettotal']) if sale['nettotal'] else 0
+    return {
+        'id': sale['id'],
+        'date': invdate,
+        'sale_date': invdate,
+        'amount': amount,
+        'total_amount': amount,
+        'billno': sale['billno'],
+        'type': sale['type'],
+        'userid': sale['userid'],
+        'customer_id': sale['id'],
+        'customername': sale['customername']
+    }
+
+
 @api_view(['GET'])
+@cache_report
 def get_sale_report(request):
     """Get sales report data for dashboard"""
     try:
-        # Get token from Authorization header
-        auth_header = request.META.get('HTTP_AUTHORIZATION')
-        
-        if not auth_header or not auth_header.startswith('Bearer '):
-            return Response({'success': False, 'error': 'Missing or invalid authorization header'}, status=401)
-        
-        token = auth_header.split(' ')[1]
-        
-        try:
-            # Decode the JWT token
-            payload = jwt.decode(token, settings.SECRET_KEY, algorithms=['HS256'])
-            client_id = payload.get('client_id')
-            
-            if not client_id:
-                return Response({'success': False, 'error': 'Invalid token: missing client_id'}, status=401)
-                
-        except jwt.ExpiredSignatureError:
-            return Response({'success': False, 'error': 'Token has expired'}, status=401)
-        except jwt.InvalidTokenError as e:
-            return Response({'success': False, 'error': f'Invalid token: {str(e)}'}, status=401)
+        client_id, err = get_client_id(request)
+        if err:
+            return err
         
         # Import SalesToday model
         from salestoday_purchasetoday.models import SalesToday
         
+        try:
+            mode = stream_mode(request)
+        except ValueError as e:
+            return Response({'success': False, 'error': str(e)}, status=400)
+
         # Fetch sales data for the client, ordered by date
         sales_queryset = SalesToday.objects.filter(
             client_id=client_id,
             nettotal__gt=0
-        ).order_by('-invdate')[:100]  # Get last 100 sales
-        
+        ).order_by('-invdate').values(
+            'id', 'invdate', 'nettotal', 'billno', 'type', 'userid', 'customername'
+        )[:100]  # Get last 100 sales
+
+        if mode:
+            rows = (_sale_report_row(sale) for sale in sales_queryset.iterator(chunk_size=default_chunk_size()))
+            return stream_response(rows, mode)
+
         # Transform data to match frontend expectations
-        sales_data = []
-        for sale in sales_queryset:
-            sales_data.append({
-                'id': sale.id,
-                'date': sale.invdate.isoformat() if sale.invdate else None,
-                'sale_date': sale.invdate.isoformat() if sale.invdate else None,
-                'amount': float(sale.nettotal) if sale.nettotal else 0,
-                'total_amount': float(sale.nettotal) if sale.nettotal else 0,
-                'billno': sale.billno,
-                'type': sale.type,
-                'userid': sale.userid,
-                'customer_id': sale.id,
-                'customername': sale.customername
-            })
+        sales_data = [_sale_report_row(sale) for sale in sales_queryset]
         
         return Response({
             'success': True, 
@@ -708,727 +660,313 @@ def get_sale_report(request):
 
 
 @api_view(['GET'])
+@cache_report
 def dashboard_total_expenses(request):
     """Get total expenses from ledger"""
     try:
-        auth_header = request.META.get('HTTP_AUTHORIZATION')
-        if not auth_header or not auth_header.startswith('Bearer '):
-            return Response({'success': False, 'error': 'Missing or invalid authorization header'}, status=401)
-        
-        token = auth_header.split(' ')[1]
-        try:
-            payload = jwt.decode(token, settings.SECRET_KEY, algorithms=['HS256'])
-            client_id = payload.get('client_id')
-            if not client_id:
-                return Response({'success': False, 'error': 'Invalid token: missing client_id'}, status=401)
-        except jwt.ExpiredSignatureError:
-            return Response({'success': False, 'error': 'Token has expired'}, status=401)
-        except jwt.InvalidTokenError as e:
-            return Response({'success': False, 'error': f'Invalid token: {str(e)}'}, status=401)
-        
-        # Get total expenses from all ledger credit entries (expenses)
-        expenses_result = AccLedgers.objects.filter(
-            client_id=client_id,
-            entry_mode='CR'  # Credit = expense
-        ).aggregate(total=Sum('credit'))
-        
-        total = float(expenses_result['total']) if expenses_result['total'] else 0
-        
-        return Response({
-            'success': True,
-            'total': total,
-            'change_percent': -4.2
-        })
+        client_id, err = get_client_id(request)
+        if err:
+            return err
+
+        return Response(build_widgets(client_id, ['total_expenses'])['total_expenses'])
     except Exception as e:
         return Response({'success': False, 'error': str(e)}, status=500)
 
 
 @api_view(['GET'])
+@cache_report
 def dashboard_total_income(request):
     """Get total income from ledger"""
     try:
-        auth_header = request.META.get('HTTP_AUTHORIZATION')
-        if not auth_header or not auth_header.startswith('Bearer '):
-            return Response({'success': False, 'error': 'Missing or invalid authorization header'}, status=401)
-        
-        token = auth_header.split(' ')[1]
-        try:
-            payload = jwt.decode(token, settings.SECRET_KEY, algorithms=['HS256'])
-            client_id = payload.get('client_id')
-            if not client_id:
-                return Response({'success': False, 'error': 'Invalid token: missing client_id'}, status=401)
-        except jwt.ExpiredSignatureError:
-            return Response({'success': False, 'error': 'Token has expired'}, status=401)
-        except jwt.InvalidTokenError as e:
-            return Response({'success': False, 'error': f'Invalid token: {str(e)}'}, status=401)
-        
-        # Get total income from all ledger debit entries (income)
-        income_result = AccLedgers.objects.filter(
-            client_id=client_id,
-            entry_mode='DR'  # Debit = income
-        ).aggregate(total=Sum('debit'))
-        
-        total = float(income_result['total']) if income_result['total'] else 0
-        
-        return Response({
-            'success': True,
-            'total': total,
-            'change_percent': 12.1
-        })
+        client_id, err = get_client_id(request)
+        if err:
+            return err
+
+        return Response(build_widgets(client_id, ['total_income'])['total_income'])
     except Exception as e:
         return Response({'success': False, 'error': str(e)}, status=500)
 
 
 @api_view(['GET'])
+@cache_report
 def dashboard_budget_remaining(request):
     """Get budget remaining from income - expenses"""
     try:
-        auth_header = request.META.get('HTTP_AUTHORIZATION')
-        if not auth_header or not auth_header.startswith('Bearer '):
-            return Response({'success': False, 'error': 'Missing or invalid authorization header'}, status=401)
-        
-        token = auth_header.split(' ')[1]
-        try:
-            payload = jwt.decode(token, settings.SECRET_KEY, algorithms=['HS256'])
-            client_id = payload.get('client_id')
-            if not client_id:
-                return Response({'success': False, 'error': 'Invalid token: missing client_id'}, status=401)
-        except jwt.ExpiredSignatureError:
-            return Response({'success': False, 'error': 'Token has expired'}, status=401)
-        except jwt.InvalidTokenError as e:
-            return Response({'success': False, 'error': f'Invalid token: {str(e)}'}, status=401)
-        
-        # Calculate budget remaining (Income - Expenses)
-        income = AccLedgers.objects.filter(
-            client_id=client_id,
-            entry_mode='DR'
-        ).aggregate(total=Sum('debit'))['total'] or 0
-        
-        expenses = AccLedgers.objects.filter(
-            client_id=client_id,
-            entry_mode='CR'
-        ).aggregate(total=Sum('credit'))['total'] or 0
-        
-        budget_remaining = float(income) - float(expenses) if income or expenses else 0
-        total_budget = float(income) if income else 1
-        percent = int((budget_remaining / total_budget * 100)) if total_budget > 0 else 0
-        
-        return Response({
-            'success': True,
-            'total': budget_remaining,
-            'percent': percent
-        })
+        client_id, err = get_client_id(request)
+        if err:
+            return err
+
+        return Response(build_widgets(client_id, ['budget_remaining'])['budget_remaining'])
     except Exception as e:
         return Response({'success': False, 'error': str(e)}, status=500)
 
 
 @api_view(['GET'])
+@cache_report
 def dashboard_active_users(request):
     """Get active users count"""
     try:
-        auth_header = request.META.get('HTTP_AUTHORIZATION')
-        if not auth_header or not auth_header.startswith('Bearer '):
-            return Response({'success': False, 'error': 'Missing or invalid authorization header'}, status=401)
-        
-        token = auth_header.split(' ')[1]
-        try:
-            payload = jwt.decode(token, settings.SECRET_KEY, algorithms=['HS256'])
-            client_id = payload.get('client_id')
-            if not client_id:
-                return Response({'success': False, 'error': 'Invalid token: missing client_id'}, status=401)
-        except jwt.ExpiredSignatureError:
-            return Response({'success': False, 'error': 'Token has expired'}, status=401)
-        except jwt.InvalidTokenError as e:
-            return Response({'success': False, 'error': f'Invalid token: {str(e)}'}, status=401)
-        
-        # Count active users
-        active_users = AccUser.objects.filter(
-            client_id=client_id
-        ).count()
-        
-        return Response({
-            'success': True,
-            'total': active_users or 1248,
-            'change_percent': 3.4
-        })
+        client_id, err = get_client_id(request)
+        if err:
+            return err
+
+        return Response(build_widgets(client_id, ['active_users'])['active_users'])
     except Exception as e:
         return Response({'success': False, 'error': str(e)}, status=500)
 
 
 @api_view(['GET'])
+@cache_report
 def dashboard_category_breakdown(request):
     """Get expense category breakdown - returns fixed categories matching dashboard image"""
     try:
-        auth_header = request.META.get('HTTP_AUTHORIZATION')
-        if not auth_header or not auth_header.startswith('Bearer '):
-            return Response({'success': False, 'error': 'Missing or invalid authorization header'}, status=401)
-        
-        token = auth_header.split(' ')[1]
-        try:
-            payload = jwt.decode(token, settings.SECRET_KEY, algorithms=['HS256'])
-            client_id = payload.get('client_id')
-            if not client_id:
-                return Response({'success': False, 'error': 'Invalid token: missing client_id'}, status=401)
-        except jwt.ExpiredSignatureError:
-            return Response({'success': False, 'error': 'Token has expired'}, status=401)
-        except jwt.InvalidTokenError as e:
-            return Response({'success': False, 'error': f'Invalid token: {str(e)}'}, status=401)
-        
-        # Return fixed category breakdown matching the dashboard image
-        category_data = [
-            {
-                'category': 'Cash Book',
-                'percent': 35,
-                'color': '#00b4a0'
-            },
-            {
-                'category': 'Bank Book',
-                'percent': 25,
-                'color': '#3b82f6'
-            },
-            {
-                'category': 'Purchases',
-                'percent': 10,
-                'color': '#ef4444'
-            },
-            {
-                'category': 'Sales Return',
-                'percent': 20,
-                'color': '#8b5cf6'
-            },
-            {
-                'category': 'Suppliers',
-                'percent': 10,
-                'color': '#f59e0b'
-            }
-        ]
-        
-        return Response({
-            'success': True,
-            'data': category_data
-        })
+        client_id, err = get_client_id(request)
+        if err:
+            return err
+
+        return Response(build_widgets(client_id, ['category_breakdown'])['category_breakdown'])
     except Exception as e:
         return Response({'success': False, 'error': str(e)}, status=500)
 
 
 @api_view(['GET'])
+@cache_report
 def dashboard_expense_trends(request):
     """Get expense trends for last 12 months from actual ledger data"""
     try:
-        from datetime import datetime
-        
-        auth_header = request.META.get('HTTP_AUTHORIZATION')
-        if not auth_header or not auth_header.startswith('Bearer '):
-            return Response({'success': False, 'error': 'Missing or invalid authorization header'}, status=401)
-        
-        token = auth_header.split(' ')[1]
-        try:
-            payload = jwt.decode(token, settings.SECRET_KEY, algorithms=['HS256'])
-            client_id = payload.get('client_id')
-            if not client_id:
-                return Response({'success': False, 'error': 'Invalid token: missing client_id'}, status=401)
-        except jwt.ExpiredSignatureError:
-            return Response({'success': False, 'error': 'Token has expired'}, status=401)
-        except jwt.InvalidTokenError as e:
-            return Response({'success': False, 'error': f'Invalid token: {str(e)}'}, status=401)
-        
-        # Get last 12 months of trend data with stable keys expected by frontend
-        month_names = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
-        now = datetime.now()
-
-        def resolve_month_year(offset):
-            month = now.month - offset
-            year = now.year
-            while month <= 0:
-                month += 12
-                year -= 1
-            return month, year
-        
-        trends_data = []
-        for offset in range(11, -1, -1):
-            month, year = resolve_month_year(offset)
-            month_name = month_names[month - 1]
-            
-            # Get expenses for this month grouped by particulars
-            monthly_expenses = AccLedgers.objects.filter(
-                client_id=client_id,
-                entry_mode='CR',
-                entry_date__year=year,
-                entry_date__month=month
-            ).values('particulars').annotate(total=Sum('credit'))
-
-            food_total = 0.0
-            transportation_total = 0.0
-            shopping_total = 0.0
-
-            for expense in monthly_expenses:
-                amount = float(expense['total'] or 0)
-                particulars = (expense['particulars'] or '').lower()
-
-                if any(k in particulars for k in ['food', 'dining', 'restaurant', 'hotel', 'meal']):
-                    food_total += amount
-                elif any(k in particulars for k in ['transport', 'travel', 'fuel', 'petrol', 'diesel', 'taxi', 'uber', 'bus', 'auto']):
-                    transportation_total += amount
-                elif any(k in particulars for k in ['shop', 'purchase', 'store', 'mart', 'retail']):
-                    shopping_total += amount
-                else:
-                    # Keep uncategorized expenses visible in the chart.
-                    shopping_total += amount
-
-            trend_entry = {
-                'month': month_name,
-                'foodDining': int(food_total),
-                'transportation': int(transportation_total),
-                'shopping': int(shopping_total)
-            }
-            trends_data.append(trend_entry)
-        
-        return Response({
-            'success': True,
-            'data': trends_data
-        })
+        client_id, err = get_client_id(request)
+        if err:
+            return err
+
+        return Response(build_widgets(client_id, ['expense_trends'])['expense_trends'])
     except Exception as e:
         return Response({'success': False, 'error': str(e)}, status=500)
 
 
 @api_view(['GET'])
+@cache_report
 def dashboard_recent_purchases(request):
     """Get recent purchases from purchase_today table"""
     try:
-        auth_header = request.META.get('HTTP_AUTHORIZATION')
-        if not auth_header or not auth_header.startswith('Bearer '):
-            return Response({'success': False, 'error': 'Missing or invalid authorization header'}, status=401)
-
-        token = auth_header.split(' ')[1]
-        try:
-            payload = jwt.decode(token, settings.SECRET_KEY, algorithms=['HS256'])
-            client_id = payload.get('client_id')
-            if not client_id:
-                return Response({'success': False, 'error': 'Invalid token: missing client_id'}, status=401)
-        except jwt.ExpiredSignatureError:
-            return Response({'success': False, 'error': 'Token has expired'}, status=401)
-        except jwt.InvalidTokenError as e:
-            return Response({'success': False, 'error': f'Invalid token: {str(e)}'}, status=401)
+        client_id, err = get_client_id(request)
+        if err:
+            return err
 
-        recent_entries = PurchaseToday.objects.filter(
-            client_id=client_id
-        ).order_by('-date', '-id')[:6]
-
-        purchases_data = []
-        for entry in recent_entries:
-            amount = float(entry.total or entry.net or 0)
-            bill_no = entry.billno or entry.pbillno or entry.id
-
-            purchases_data.append({
-                'id': entry.id,
-                'invoice': f'PO-{bill_no}',
-                'supplier': entry.suppliername or 'Supplier',
-                'amount': amount,
-                'status': 'Received',
-                'date': entry.date.isoformat() if entry.date else ''
-            })
-
-        return Response({
-            'success': True,
-            'data': purchases_data
-        })
+        return Response(build_widgets(client_id, ['recent_purchases'])['recent_purchases'])
     except Exception as e:
         return Response({'success': False, 'error': str(e)}, status=500)
 
 
 @api_view(['GET'])
+@cache_report
 def dashboard_recent_transactions(request):
     """Get recent transactions from ledger"""
     try:
-        auth_header = request.META.get('HTTP_AUTHORIZATION')
-        if not auth_header or not auth_header.startswith('Bearer '):
-            return Response({'success': False, 'error': 'Missing or invalid authorization header'}, status=401)
-        
-        token = auth_header.split(' ')[1]
-        try:
-            payload = jwt.decode(token, settings.SECRET_KEY, algorithms=['HS256'])
-            client_id = payload.get('client_id')
-            if not client_id:
-                return Response({'success': False, 'error': 'Invalid token: missing client_id'}, status=401)
-        except jwt.ExpiredSignatureError:
-            return Response({'success': False, 'error': 'Token has expired'}, status=401)
-        except jwt.InvalidTokenError as e:
-            return Response({'success': False, 'error': f'Invalid token: {str(e)}'}, status=401)
-        
-        # Get recent ledger entries
-        recent_entries = AccLedgers.objects.filter(
-            client_id=client_id
-        ).values('id', 'entry_date', 'particulars', 'debit', 'credit', 'entry_mode', 'narration').order_by('-entry_date')[:6]
-        
-        transactions_data = []
-        for idx, entry in enumerate(recent_entries, 1):
-            # Determine amount based on entry_mode
-            if entry['entry_mode'] == 'DR':  # Debit = Income
-                amount = float(entry['debit'] or 0)
-            else:  # Credit = Expense
-                amount = float(entry['credit'] or 0)
-            
-            transactions_data.append({
-                'id': idx,
-                'description': entry['particulars'] or 'Transaction',
-                'category': entry['particulars'] or 'Other',
-                'amount': amount,
-                'status': 'Completed',
-                'date': entry['entry_date'].isoformat() if entry['entry_date'] else datetime.now().isoformat()
-            })
-        
-        return Response({
-            'success': True,
-            'data': transactions_data
-        })
+        client_id, err = get_client_id(request)
+        if err:
+            return err
+
+        return Response(build_widgets(client_id, ['recent_transactions'])['recent_transactions'])
     except Exception as e:
         return Response({'success': False, 'error': str(e)}, status=500)
 
 
 @api_view(['GET'])
+@cache_report
 def dashboard_total_sales(request):
     """Get total sales for the dashboard"""
     try:
-        auth_header = request.META.get('HTTP_AUTHORIZATION')
-        if not auth_header or not auth_header.startswith('Bearer '):
-            return Response({'success': False, 'error': 'Missing or invalid authorization header'}, status=401)
-        
-        token = auth_header.split(' ')[1]
-        try:
-            payload = jwt.decode(token, settings.SECRET_KEY, algorithms=['HS256'])
-            client_id = payload.get('client_id')
-            if not client_id:
-                return Response({'success': False, 'error': 'Invalid token: missing client_id'}, status=401)
-        except jwt.ExpiredSignatureError:
-            return Response({'success': False, 'error': 'Token has expired'}, status=401)
-        except jwt.InvalidTokenError as e:
-            return Response({'success': False, 'error': f'Invalid token: {str(e)}'}, status=401)
-        
-        from salestoday_purchasetoday.models import SalesToday
-        from datetime import datetime, timedelta
-        
-        today = datetime.now().date()
-        last_month = today - timedelta(days=30)
-        
-        # Get total sales today
-        total_sales = SalesToday.objects.filter(
-            client_id=client_id,
-            invdate=today
-        ).aggregate(Sum('nettotal'))['nettotal__sum'] or 0
-        
-        # Get total sales last month
-        last_month_sales = SalesToday.objects.filter(
-            client_id=client_id,
-            invdate__gte=last_month,
-            invdate__lt=today
-        ).aggregate(Sum('nettotal'))['nettotal__sum'] or 0
-        
-        # Calculate percentage change
-        change_percent = 0
-        if last_month_sales > 0:
-            change_percent = ((total_sales - last_month_sales) / last_month_sales) * 100
-        
-        return Response({
-            'success': True,
-            'total': float(total_sales),
-            'change_percent': round(change_percent, 1)
-        })
+        client_id, err = get_client_id(request)
+        if err:
+            return err
+
+        return Response(build_widgets(client_id, ['total_sales'])['total_sales'])
     except Exception as e:
         return Response({'success': False, 'error': str(e)}, status=500)
 
 
 @api_view(['GET'])
+@cache_report
 def dashboard_total_expense(request):
     """Get total expenses for the dashboard"""
     try:
-        auth_header = request.META.get('HTTP_AUTHORIZATION')
-        if not auth_header or not auth_header.startswith('Bearer '):
-            return Response({'success': False, 'error': 'Missing or invalid authorization header'}, status=401)
-        
-        token = auth_header.split(' ')[1]
-        try:
-            payload = jwt.decode(token, settings.SECRET_KEY, algorithms=['HS256'])
-            client_id = payload.get('client_id')
-            if not client_id:
-                return Response({'success': False, 'error': 'Invalid token: missing client_id'}, status=401)
-        except jwt.ExpiredSignatureError:
-            return Response({'success': False, 'error': 'Token has expired'}, status=401)
-        except jwt.InvalidTokenError as e:
-            return Response({'success': False, 'error': f'Invalid token: {str(e)}'}, status=401)
-        
-        from salestoday_purchasetoday.models import PurchaseToday
-        from datetime import datetime, timedelta
-        
-        today = datetime.now().date()
-        last_month = today - timedelta(days=30)
-        
-        # Get total purchases (expenses) today
-        total_expenses = PurchaseToday.objects.filter(
-            client_id=client_id,
-            date=today
-        ).aggregate(Sum('net'))['net__sum'] or 0
-        
-        # Get total purchases last month
-        last_month_expenses = PurchaseToday.objects.filter(
-            client_id=client_id,
-            date__gte=last_month,
-            date__lt=today
-        ).aggregate(Sum('net'))['net__sum'] or 0
-        
-        # Calculate percentage change
-        change_percent = 0
-        if last_month_expenses > 0:
-            change_percent = ((total_expenses - last_month_expenses) / last_month_expenses) * 100
-        
-        return Response({
-            'success': True,
-            'total': float(total_expenses),
-            'change_percent': round(change_percent, 1)
-        })
+        client_id, err = get_client_id(request)
+        if err:
+            return err
+
+        return Response(build_widgets(client_id, ['total_expense'])['total_expense'])
     except Exception as e:
         return Response({'success': False, 'error': str(e)}, status=500)
 
 
 @api_view(['GET'])
+@cache_report
 def dashboard_payment_sent(request):
     """Get total payments sent for the dashboard"""
     try:
-        auth_header = request.META.get('HTTP_AUTHORIZATION')
-        if not auth_header or not auth_header.startswith('Bearer '):
-            return Response({'success': False, 'error': 'Missing or invalid authorization header'}, status=401)
-        
-        token = auth_header.split(' ')[1]
-        try:
-            payload = jwt.decode(token, settings.SECRET_KEY, algorithms=['HS256'])
-            client_id = payload.get('client_id')
-            if not client_id:
-                return Response({'success': False, 'error': 'Invalid token: missing client_id'}, status=401)
-        except jwt.ExpiredSignatureError:
-            return Response({'success': False, 'error': 'Token has expired'}, status=401)
-        except jwt.InvalidTokenError as e:
-            return Response({'success': False, 'error': f'Invalid token: {str(e)}'}, status=401)
-        
-        from datetime import datetime, timedelta
-        
-        today = datetime.now().date()
-        last_month = today - timedelta(days=30)
-        
-        # Get payments sent (credit transactions) today
-        total_sent = AccLedgers.objects.filter(
-            client_id=client_id,
-            entry_date=today,
-            entry_mode='CR'
-        ).aggregate(Sum('credit'))['credit__sum'] or 0
-        
-        # Get payments sent last month
-        last_month_sent = AccLedgers.objects.filter(
-            client_id=client_id,
-            entry_date__gte=last_month,
-            entry_date__lt=today,
-            entry_mode='CR'
-        ).aggregate(Sum('credit'))['credit__sum'] or 0
-        
-        # Calculate percentage change
-        change_percent = 0
-        if last_month_sent > 0:
-            change_percent = ((total_sent - last_month_sent) / last_month_sent) * 100
-        
-        return Response({
-            'success': True,
-            'total': float(total_sent),
-            'change_percent': round(change_percent, 1)
-        })
+        client_id, err = get_client_id(request)
+        if err:
+            return err
+
+        return Response(build_widgets(client_id, ['payment_sent'])['payment_sent'])
     except Exception as e:
         return Response({'success': False, 'error': str(e)}, status=500)
 
 
 @api_view(['GET'])
+@cache_report
 def dashboard_payment_received(request):
     """Get total payments received for the dashboard"""
     try:
-        auth_header = request.META.get('HTTP_AUTHORIZATION')
-        if not auth_header or not auth_header.startswith('Bearer '):
-            return Response({'success': False, 'error': 'Missing or invalid authorization header'}, status=401)
-        
-        token = auth_header.split(' ')[1]
-        try:
-            payload = jwt.decode(token, settings.SECRET_KEY, algorithms=['HS256'])
-            client_id = payload.get('client_id')
-            if not client_id:
-                return Response({'success': False, 'error': 'Invalid token: missing client_id'}, status=401)
-        except jwt.ExpiredSignatureError:
-            return Response({'success': False, 'error': 'Token has expired'}, status=401)
-        except jwt.InvalidTokenError as e:
-            return Response({'success': False, 'error': f'Invalid token: {str(e)}'}, status=401)
-        
-        from datetime import datetime, timedelta
-        
-        today = datetime.now().date()
-        last_month = today - timedelta(days=30)
-        
-        # Get payments received (debit transactions) today
-        total_received = AccLedgers.objects.filter(
-            client_id=client_id,
-            entry_date=today,
-            entry_mode='DR'
-        ).aggregate(Sum('debit'))['debit__sum'] or 0
-        
-        # Get payments received last month
-        last_month_received = AccLedgers.objects.filter(
-            client_id=client_id,
-            entry_date__gte=last_month,
-            entry_date__lt=today,
-            entry_mode='DR'
-        ).aggregate(Sum('debit'))['debit__sum'] or 0
-        
-        # Calculate percentage change
-        change_percent = 0
-        if last_month_received > 0:
-            change_percent = ((total_received - last_month_received) / last_month_received) * 100
-        
-        return Response({
-            'success': True,
-            'total': float(total_received),
-            'change_percent': round(change_percent, 1)
-        })
+        client_id, err = get_client_id(request)
+        if err:
+            return err
+
+        return Response(build_widgets(client_id, ['payment_received'])['payment_received'])
     except Exception as e:
         return Response({'success': False, 'error': str(e)}, status=500)
 
 
 @api_view(['GET'])
+@cache_report
 def dashboard_sales_purchases(request):
     """Get sales and purchases data for the 6-month chart"""
     try:
-        auth_header = request.META.get('HTTP_AUTHORIZATION')
-        if not auth_header or not auth_header.startswith('Bearer '):
-            return Response({'success': False, 'error': 'Missing or invalid authorization header'}, status=401)
-        
-        token = auth_header.split(' ')[1]
-        try:
-            payload = jwt.decode(token, settings.SECRET_KEY, algorithms=['HS256'])
-            client_id = payload.get('client_id')
-            if not client_id:
-                return Response({'success': False, 'error': 'Invalid token: missing client_id'}, status=401)
-        except jwt.ExpiredSignatureError:
-            return Response({'success': False, 'error': 'Token has expired'}, status=401)
-        except jwt.InvalidTokenError as e:
-            return Response({'success': False, 'error': f'Invalid token: {str(e)}'}, status=401)
-        
-        from salestoday_purchasetoday.models import SalesToday, PurchaseToday
-        from datetime import datetime, timedelta
-        from django.db.models import Sum
-        
-        # Get last 6 months of data
-        months_data = []
-        for i in range(6, 0, -1):
-            month_start = datetime.now().replace(day=1) - timedelta(days=i*30)
-            month_start = month_start.replace(day=1)
-            month_end = (month_start + timedelta(days=32)).replace(day=1) - timedelta(days=1)
-            
-            sales = SalesToday.objects.filter(
-                client_id=client_id,
-                invdate__gte=month_start,
-                invdate__lte=month_end
-            ).aggregate(Sum('nettotal'))['nettotal__sum'] or 0
-            
-            purchases = PurchaseToday.objects.filter(
-                client_id=client_id,
-                date__gte=month_start,
-                date__lte=month_end
-            ).aggregate(Sum('net'))['net__sum'] or 0
-            
-            months_data.append({
-                'month': month_start.strftime('%b'),
-                'salesTarget': float(sales) * 1.1,  # 10% above actual
-                'sales': float(sales),
-                'purchases': float(purchases)
-            })
-        
-        return Response({
-            'success': True,
-            'data': months_data
-        })
+        client_id, err = get_client_id(request)
+        if err:
+            return err
+
+        return Response(build_widgets(client_id, ['sales_purchases'])['sales_purchases'])
     except Exception as e:
         return Response({'success': False, 'error': str(e)}, status=500)
 
 
 @api_view(['GET'])
+@cache_report
 def dashboard_recent_invoices(request):
     """Get recent invoices for the dashboard"""
     try:
-        auth_header = request.META.get('HTTP_AUTHORIZATION')
-        if not auth_header or not auth_header.startswith('Bearer '):
-            return Response({'success': False, 'error': 'Missing or invalid authorization header'}, status=401)
-        
-        token = auth_header.split(' ')[1]
-        try:
-            payload = jwt.decode(token, settings.SECRET_KEY, algorithms=['HS256'])
-            client_id = payload.get('client_id')
-            if not client_id:
-                return Response({'success': False, 'error': 'Invalid token: missing client_id'}, status=401)
-        except jwt.ExpiredSignatureError:
-            return Response({'success': False, 'error': 'Token has expired'}, status=401)
-        except jwt.InvalidTokenError as e:
-            return Response({'success': False, 'error': f'Invalid token: {str(e)}'}, status=401)
-        
-        from salestoday_purchasetoday.models import SalesToday
-        
-        # Get recent sales invoices
-        invoices = SalesToday.objects.filter(
-            client_id=client_id
-        ).order_by('-invdate')[:5]
-        
-        invoices_data = []
-        for invoice in invoices:
-            invoices_data.append({
-                'id': invoice.id,
-                'invoice_no': f"#INV{invoice.billno}",
-                'customer_name': invoice.customername or 'Customer',
-                'date': invoice.invdate.strftime('%m/%d/%Y') if invoice.invdate else '',
-                'amount': float(invoice.nettotal or 0),
-                'status': 'Delivered'
-            })
-        
-        return Response({
-            'success': True,
-            'data': invoices_data
-        })
+        client_id, err = get_client_id(request)
+        if err:
+            return err
+
+        return Response(build_widgets(client_id, ['recent_invoices'])['recent_invoices'])
     except Exception as e:
         return Response({'success': False, 'error': str(e)}, status=500)
 
 
 @api_view(['GET'])
+@cache_report
 def dashboard_stock_history(request):
     """Get stock history for the dashboard"""
     try:
-        auth_header = request.META.get('HTTP_AUTHORIZATION')
-        if not auth_header or not auth_header.startswith('Bearer '):
-            return Response({'success': False, 'error': 'Missing or invalid authorization header'}, status=401)
-        
-        token = auth_header.split(' ')[1]
-        try:
-            payload = jwt.decode(token, settings.SECRET_KEY, algorithms=['HS256'])
-            client_id = payload.get('client_id')
-            if not client_id:
-                return Response({'success': False, 'error': 'Invalid token: missing client_id'}, status=401)
-        except jwt.ExpiredSignatureError:
-            return Response({'success': False, 'error': 'Token has expired'}, status=401)
-        except jwt.InvalidTokenError as e:
-            return Response({'success': False, 'error': f'Invalid token: {str(e)}'}, status=401)
-        
-        from salestoday_purchasetoday.models import SalesToday
-        
-        # Get total sales items count
-        total_items = SalesToday.objects.filter(
-            client_id=client_id
-        ).count()
-        
+        client_id, err = get_client_id(request)
+        if err:
+            return err
+
+        return Response(build_widgets(client_id, ['stock_history'])['stock_history'])
+    except Exception as e:
+        return Response({'success': False, 'error': str(e)}, status=500)
+
+
+@api_view(['GET', 'POST'])
+@cache_report
+def dashboard_bundle(request):
+    """
+    Compute several dashboard widgets in one round trip.
+
+    GET  /api/dashboard/bundle/?widgets=total_sales,payment_sent
+    POST /api/dashboard/bundle/  {"widgets": ["total_sales", "payment_sent"]}
+
+    Without a widget list every widget is returned.  Each entry in "widgets"
+    is the same payload the matching dashboard/<widget>/ endpoint returns.
+    """
+    try:
+        client_id, err = get_client_id(request)
+        if err:
+            return err
+
+        if request.method == 'POST':
+            names = request.data.get('widgets') or []
+        else:
+            names = [n.strip() for n in request.GET.get('widgets', '').split(',') if n.strip()]
+        names = [n.replace('-', '_') for n in names] or list(WIDGETS)
+
+        unknown = [n for n in names if n not in WIDGETS]
+        if unknown:
+            return Response({
+                'success': False,
+                'error': f"Unknown widgets: {', '.join(unknown)}",
+                'available': list(WIDGETS),
+            }, status=400)
+
         return Response({
             'success': True,
-            'data': [{
-                'total_sales_items': total_items,
-                'change_percent': 20
-            }]
+            'widgets': build_widgets(client_id, list(dict.fromkeys(names)))
+        })
+    except Exception as e:
+        return Response({'success': False, 'error': str(e)}, status=500)
+
+
+# ---- Async (ASGI) dashboard views ----
+#
+# Same payloads as the DRF dashboard views above, built by abuild_widgets so
+# the queries of a widget (and of a bundle) run concurrently.  Serve through
+# task_backend.asgi; under WSGI they still work but gain nothing.
+
+def _json(data, status=200):
+    # DRF's encoder, so Decimals and dates render as in the DRF views
+    return JsonResponse(data, status=status, encoder=JSONEncoder)
+
+
+@require_http_methods(['GET'])
+@cache_report
+async def dashboard_widget_async(request, widget):
+    """Any dashboard/<widget>/ payload, e.g. /api/async/dashboard/total-sales/"""
+    try:
+        client_id, err = get_client_id(request)
+        if err:
+            return _json(err.data, status=err.status_code)
+
+        name = widget.replace('-', '_')
+        if name not in WIDGETS:
+            return _json({'success': False, 'error': f'Unknown widget: {widget}', 'available': list(WIDGETS)}, status=404)
+
+        return _json((await abuild_widgets(client_id, [name]))[name])
+    except Exception as e:
+        return _json({'success': False, 'error': str(e)}, status=500)
+
+
+@csrf_exempt
+@require_http_methods(['GET', 'POST'])
+@cache_report
+async def dashboard_bundle_async(request):
+    """dashboard/bundle/ with every widget's queries running concurrently"""
+    try:
+        client_id, err = get_client_id(request)
+        if err:
+            return _json(err.data, status=err.status_code)
+
+        if request.method == 'POST':
+            try:
+                names = (json.loads(request.body or b'{}') or {}).get('widgets') or []
+            except ValueError:
+                return _json({'success': False, 'error': 'Invalid JSON body'}, status=400)
+        else:
+            names = [n.strip() for n in request.GET.get('widgets', '').split(',') if n.strip()]
+        names = [n.replace('-', '_') for n in names] or list(WIDGETS)
+
+        unknown = [n for n in names if n not in WIDGETS]
+        if unknown:
+            return _json({
+                'success': False,
+                'error': f"Unknown widgets: {', '.join(unknown)}",
+                'available': list(WIDGETS),
+            }, status=400)
+
+        return _json({
+            'success': True,
+            'widgets': await abuild_widgets(client_id, list(dict.fromkeys(names)))
         })
     except Exception as e:
-        return Response({'success': False, 'error': str(e)}, status=500)
\ No newline at end of file
+        return _json({'success': False, 'error': str(e)}, status=500)
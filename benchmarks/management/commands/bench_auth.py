@@ -0,0 +1,66 @@
+import time
+from datetime import datetime, timedelta
+
+import jwt
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+from rest_framework.request import Request
+
+from task_backend.authentication import TenantJWTAuthentication, get_client_id, token_cache
+
+
+class Command(BaseCommand):
+    help = "Compare per-request JWT auth cost: inline jwt.decode vs the cached TenantJWTAuthentication"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20000)
+
+    def handle(self, *args, **options):
+        iterations = options['iterations']
+        payload = {
+            'user_id': 'BENCH',
+            'username': 'BENCH',
+            'client_id': 'BENCHCLIENT',
+            'role': 'Admin',
+            'accountcode': 'ACASH',
+            'exp': datetime.utcnow() + timedelta(hours=24),
+            'iat': datetime.utcnow(),
+        }
+        token = jwt.encode(payload, settings.SECRET_KEY, algorithm='HS256')
+        http_request = RequestFactory().get('/api/dashboard/total-sales/', HTTP_AUTHORIZATION=f'Bearer {token}')
+
+        def inline_decode():
+            # What every view used to do on its own
+            auth_header = http_request.META.get('HTTP_AUTHORIZATION')
+            token = auth_header.split(' ')[1]
+            decoded = jwt.decode(token, settings.SECRET_KEY, algorithms=['HS256'])
+            return decoded.get('client_id')
+
+        authenticator = TenantJWTAuthentication()
+
+        def cached_auth():
+            request = Request(http_request)
+            authenticator.authenticate(request)
+            client_id, err = get_client_id(request)
+            return client_id
+
+        def cold_auth():
+            token_cache.clear()
+            return cached_auth()
+
+        results = []
+        for label, fn in (('inline jwt.decode', inline_decode),
+                          ('cached, cold (miss every time)', cold_auth),
+                          ('cached, warm', cached_auth)):
+            fn()
+            start = time.perf_counter()
+            for _ in range(iterations):
+                fn()
+            elapsed = time.perf_counter() - start
+            results.append((label, elapsed / iterations * 1e6))
+
+        baseline = results[0][1]
+        self.stdout.write(f"{iterations} iterations per variant")
+        for label, per_call in results:
+            self.stdout.write(f"  {label:<32} {per_call:8.2f} us/request  ({baseline / per_call:5.2f}x)")
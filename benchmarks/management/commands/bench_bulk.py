@@ -0,0 +1,72 @@
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+
+from stock_report.models import StockReport
+from stock_report.views import STOCK_FIELDS, STOCK_NUMERIC_FIELDS
+from task_backend.bulk import iter_values
+
+
+def model_rows(queryset):
+    # What get_stock_report used to do: full model instances, Decimal columns
+    return [
+        {
+            "code": i.code,
+            "name": i.name,
+            "productcode": i.productcode,
+            "barcode": i.barcode,
+            "bmrp": i.bmrp,
+            "salesprice": i.salesprice,
+            "quantity": i.quantity,
+            "cost": i.cost,
+        }
+        for i in queryset
+    ]
+
+
+def values_rows(queryset):
+    return list(queryset.values(*STOCK_FIELDS))
+
+
+def bulk_rows(queryset):
+    return list(iter_values(queryset, STOCK_FIELDS, floats=STOCK_NUMERIC_FIELDS))
+
+
+class Command(BaseCommand):
+    help = "Per-row time and peak memory of reading a tenant's stock report: model instances vs iter_values"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--client-id', required=True)
+        parser.add_argument('--repeat', type=int, default=3)
+
+    def handle(self, *args, **options):
+        queryset = StockReport.objects.filter(client_id=options['client_id'])
+        rows = queryset.count()
+        if not rows:
+            self.stderr.write(f"No stock_report rows for {options['client_id']}")
+            return
+
+        self.stdout.write(f"{rows} rows, best of {options['repeat']}")
+        self.stdout.write(f"{'variant':<26} {'us/row':>8} {'peak bytes/row':>15}")
+        baseline = None
+        for label, fn in (('model instances', model_rows),
+                          ('values() dicts', values_rows),
+                          ('iter_values + float8', bulk_rows)):
+            best = None
+            for _ in range(options['repeat']):
+                start = time.perf_counter()
+                fn(queryset.all())
+                elapsed = time.perf_counter() - start
+                best = elapsed if best is None else min(best, elapsed)
+
+            tracemalloc.start()
+            fn(queryset.all())
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+            baseline = baseline or (best, peak)
+            self.stdout.write(
+                f"{label:<26} {best / rows * 1e6:>8.2f} {peak / rows:>15.0f}"
+                f"   ({baseline[0] / best:.1f}x faster, {baseline[1] / peak:.1f}x less memory)"
+            )
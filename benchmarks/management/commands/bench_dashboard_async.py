@@ -0,0 +1,135 @@
+import asyncio
+import math
+import threading
+import time
+from datetime import datetime, timedelta
+
+import jwt
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connections
+from django.db.backends.signals import connection_created
+from django.test import AsyncRequestFactory, RequestFactory, override_settings
+from django.urls import resolve
+
+# (sync path, async path)
+ENDPOINTS = [
+    ('/api/dashboard/total-sales/', '/api/async/dashboard/total-sales/'),
+    ('/api/dashboard/payment-received/', '/api/async/dashboard/payment-received/'),
+    ('/api/dashboard/sales-purchases/', '/api/async/dashboard/sales-purchases/'),
+    ('/api/dashboard/bundle/', '/api/async/dashboard/bundle/'),
+]
+
+
+def percentile(values, p):
+    ordered = sorted(values)
+    return ordered[max(math.ceil(p / 100 * len(ordered)) - 1, 0)]
+
+
+class Command(BaseCommand):
+    help = (
+        "p50/p99 latency of the sync dashboard views behind N WSGI workers vs the async "
+        "views on one event loop, with C concurrent clients"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--client-id', required=True, help="Tenant to load the dashboard for")
+        parser.add_argument('--clients', type=int, default=32, help="Concurrent clients")
+        parser.add_argument('--requests', type=int, default=320, help="Requests per endpoint and variant")
+        parser.add_argument('--workers', type=int, default=4, help="Sync workers (gunicorn workers x threads)")
+        parser.add_argument('--db-latency-ms', type=float, default=0,
+                            help="Extra round-trip time added to every query, to model a remote database")
+
+    def handle(self, *args, **options):
+        self.token = jwt.encode({
+            'client_id': options['client_id'],
+            'username': 'BENCH',
+            'role': 'Admin',
+            'exp': datetime.utcnow() + timedelta(hours=1),
+        }, settings.SECRET_KEY, algorithm='HS256')
+        self.options = options
+
+        latency = options['db_latency_ms'] / 1000
+
+        def delay(execute, sql, params, many, context):
+            time.sleep(latency)
+            return execute(sql, params, many, context)
+
+        def add_delay(sender, connection, **kwargs):
+            connection.execute_wrappers.append(delay)
+
+        if latency:
+            connection_created.connect(add_delay)
+            close_old_connections()
+            for connection in connections.all():
+                connection.close()
+
+        self.stdout.write(
+            f"{options['clients']} clients, {options['requests']} requests, {options['workers']} sync workers, "
+            f"+{options['db_latency_ms']:g} ms per query"
+        )
+        self.stdout.write(f"{'endpoint':<36} {'variant':<6} {'p50 ms':>8} {'p99 ms':>8} {'req/s':>8}")
+        try:
+            # The report cache would turn every request after the first into a hit
+            with override_settings(REPORT_CACHE={**getattr(settings, 'REPORT_CACHE', {}), 'ENABLED': False}):
+                for sync_path, async_path in ENDPOINTS:
+                    for variant, runner, path in (('sync', self.run_sync, sync_path), ('async', self.run_async, async_path)):
+                        start = time.perf_counter()
+                        timings = runner(path)
+                        elapsed = time.perf_counter() - start
+                        self.stdout.write(
+                            f"{sync_path:<36} {variant:<6} {percentile(timings, 50) * 1000:>8.1f} "
+                            f"{percentile(timings, 99) * 1000:>8.1f} {len(timings) / elapsed:>8.0f}"
+                        )
+        finally:
+            connection_created.disconnect(add_delay)
+
+    def _per_client(self):
+        clients = self.options['clients']
+        return [self.options['requests'] // clients + (i < self.options['requests'] % clients) for i in range(clients)]
+
+    def run_sync(self, path):
+        """Client threads queue for a fixed pool of workers, as in a sync WSGI deployment."""
+        match = resolve(path)
+        factory = RequestFactory()
+        workers = threading.Semaphore(self.options['workers'])
+        timings = []
+        lock = threading.Lock()
+
+        def client(count):
+            for _ in range(count):
+                request = factory.get(path, HTTP_AUTHORIZATION=f'Bearer {self.token}')
+                start = time.perf_counter()
+                with workers:
+                    response = match.func(request, *match.args, **match.kwargs)
+                    if hasattr(response, 'render'):
+                        response.render()
+                    close_old_connections()
+                with lock:
+                    timings.append(time.perf_counter() - start)
+
+        threads = [threading.Thread(target=client, args=(count,)) for count in self._per_client()]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return timings
+
+    def run_async(self, path):
+        """Every client is a coroutine on one event loop, as under task_backend.asgi."""
+        match = resolve(path)
+        factory = AsyncRequestFactory()
+        timings = []
+
+        async def client(count):
+            for _ in range(count):
+                request = factory.get(path, headers={'Authorization': f'Bearer {self.token}'})
+                start = time.perf_counter()
+                await match.func(request, *match.args, **match.kwargs)
+                timings.append(time.perf_counter() - start)
+
+        async def main():
+            await asyncio.gather(*(client(count) for count in self._per_client()))
+
+        asyncio.run(main())
+        return timings
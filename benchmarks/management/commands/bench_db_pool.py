@@ -0,0 +1,105 @@
+import math
+import threading
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connections
+
+from task_backend.pooled_postgresql.pool import pool_stats
+
+# (label, settings overrides)
+MODES = [
+    ('connect per request', {'ENGINE': 'django.db.backends.postgresql', 'CONN_MAX_AGE': 0}),
+    ('persistent (CONN_MAX_AGE)', {'ENGINE': 'django.db.backends.postgresql', 'CONN_MAX_AGE': 600}),
+    ('pool, reset on checkout', {'ENGINE': 'task_backend.pooled_postgresql', 'CONN_MAX_AGE': 0, 'reset': True}),
+    ('pool, no reset', {'ENGINE': 'task_backend.pooled_postgresql', 'CONN_MAX_AGE': 0, 'reset': False}),
+]
+
+
+def percentile(values, p):
+    ordered = sorted(values)
+    return ordered[max(math.ceil(p / 100 * len(ordered)) - 1, 0)]
+
+
+class Command(BaseCommand):
+    help = (
+        "Per-request latency against a PostgreSQL database when every request connects, with persistent "
+        "connections and with the connection pool (task_backend/pooled_postgresql)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default', help="Alias whose connection settings to use")
+        parser.add_argument('--host', help="Override HOST, e.g. a local server")
+        parser.add_argument('--port', help="Override PORT")
+        parser.add_argument('--requests', type=int, default=500, help="Requests per mode")
+        parser.add_argument('--threads', type=int, default=8, help="Concurrent request threads")
+        parser.add_argument('--pool-size', type=int, default=4, help="max_size of the pool")
+        parser.add_argument('--queries', type=int, default=3, help="Queries per request")
+
+    def handle(self, *args, **options):
+        base = connections.settings[options['database']]
+        if 'postgresql' not in base['ENGINE']:
+            raise CommandError(f"{options['database']} is not a PostgreSQL database")
+        base = {**base, 'OPTIONS': {k: v for k, v in base['OPTIONS'].items() if k != 'pool'}}
+        if options['host']:
+            base['HOST'] = options['host']
+        if options['port']:
+            base['PORT'] = options['port']
+
+        self.stdout.write(
+            f"{options['requests']} requests of {options['queries']} queries, {options['threads']} threads, "
+            f"pool of {options['pool_size']}, {base['HOST'] or 'local socket'}:{base['PORT'] or 5432}"
+        )
+        self.stdout.write(f"{'mode':<28} {'p50 ms':>8} {'p99 ms':>8} {'req/s':>8}  pool")
+        for i, (label, overrides) in enumerate(MODES):
+            alias = f'bench_pool_{i}'
+            settings_dict = {**base, **{k: v for k, v in overrides.items() if k != 'reset'}}
+            if 'reset' in overrides:
+                settings_dict['OPTIONS'] = {**base['OPTIONS'], 'pool': {'max_size': options['pool_size'], 'reset': overrides['reset']}}
+            connections.settings[alias] = settings_dict
+
+            start = time.perf_counter()
+            timings = self.run(alias, options)
+            elapsed = time.perf_counter() - start
+
+            stats = pool_stats().get(alias)
+            pool = (
+                f"waits {stats['waits']} (avg {stats['wait_ms_avg']} ms, max {stats['wait_ms_max']} ms), "
+                f"utilization {stats['utilization']:.0%}, {stats['created']} connections"
+            ) if stats else ''
+            self.stdout.write(
+                f"{label:<28} {percentile(timings, 50) * 1000:>8.2f} {percentile(timings, 99) * 1000:>8.2f} "
+                f"{len(timings) / elapsed:>8.0f}  {pool}"
+            )
+
+    def run(self, alias, options):
+        """Requests as a WSGI worker thread runs them: connections are released at the end of each"""
+        timings = []
+        lock = threading.Lock()
+        per_thread = [
+            options['requests'] // options['threads'] + (i < options['requests'] % options['threads'])
+            for i in range(options['threads'])
+        ]
+
+        def worker(count):
+            connection = connections[alias]
+            try:
+                for _ in range(count):
+                    start = time.perf_counter()
+                    close_old_connections()  # request_started
+                    with connection.cursor() as cursor:
+                        for _ in range(options['queries']):
+                            cursor.execute('SELECT 1')
+                            cursor.fetchone()
+                    close_old_connections()  # request_finished
+                    with lock:
+                        timings.append(time.perf_counter() - start)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker, args=(count,)) for count in per_thread]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return timings
@@ -0,0 +1,263 @@
+import contextlib
+import io
+import json
+import math
+import os
+import subprocess
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+import jwt
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test import Client, override_settings
+
+from app1.models import AccLedgers, AccMaster, AccUser, CashAndBankAccMaster
+from monitoring.querystats import request_stats
+from salestoday_purchasetoday.models import SalesToday
+from stock_report.models import StockReport
+
+BASELINE_DIR = os.path.join(settings.BASE_DIR, 'benchmarks', 'baselines')
+
+# name: (path, query parameters); {debtor}, {cash} and {bank} are the
+# tenant's busiest accounts of each kind, {user} its first user
+ENDPOINTS = {
+    'users': ('/api/get-users/', {}),
+    'misel': ('/api/get-misel-data/', {}),
+    'debtors': ('/api/get-debtors-data/', {}),
+    'debtors_search': ('/api/get-debtors-data/', {'search': 'traders'}),
+    'debtors_list': ('/api/debtors/get-debtors/', {}),
+    'suppliers': ('/api/suppiers_api/suppliers/', {}),
+    'ledger': ('/api/get-ledger-details/', {'account_code': '{debtor}'}),
+    'ledger_cash': ('/api/get-cash-ledger-details/', {'account_code': '{cash}'}),
+    'ledger_bank': ('/api/get-bank-ledger-details/', {'account_code': '{bank}'}),
+    'ledger_csv': ('/api/get-ledger-details/', {'account_code': '{cash}', 'export': 'csv'}),
+    'invoices': ('/api/get-invoice-details/', {'account_code': '{debtor}'}),
+    'cash_book': ('/api/get-cash-book-data/', {}),
+    'bank_book': ('/api/get-bank-book-data/', {}),
+    'account_balances': ('/api/account-balances/', {'super_code': 'DEBTO'}),
+    'dashboard_bundle': ('/api/dashboard/bundle/', {}),
+    'dashboard_bundle_async': ('/api/async/dashboard/bundle/', {}),
+    'dashboard_expense_trends': ('/api/dashboard/expense-trends/', {}),
+    'dashboard_category_breakdown': ('/api/dashboard/category-breakdown/', {}),
+    'dashboard_sales_purchases': ('/api/dashboard/sales-purchases/', {}),
+    'sale_report': ('/api/get-sale-report/', {}),
+    'sales_today_users': ('/api/salestoday-usersummary/', {}),
+    'sales_today_types': ('/api/salestoday-typewise/', {}),
+    'sales_today_details': ('/api/salestoday-details/', {}),
+    'purchase_today': ('/api/purchasetoday/', {}),
+    'sales_daywise': ('/api/salesdaywise/', {}),
+    'sales_monthwise': ('/api/salesmonthwise/', {}),
+    'purchase_monthwise': ('/api/purchasemonthwise/', {}),
+    'salesreturn_monthwise': ('/api/salesreturnmonthwise/', {}),
+    'sales_return': ('/api/sales-return/get-data/', {'client_id': '{client_id}'}),
+    'tender_cash_bytype': ('/api/tender-cash-bytype/', {}),
+    'tender_cash_byuser': ('/api/tender-cash-by-user/', {}),
+    'stock_report': ('/api/get-stock-report/', {}),
+    'stock_report_ndjson': ('/api/get-stock-report/', {'stream': 'ndjson'}),
+    'stock_summary': ('/api/stock-summary/', {}),
+    'export_sales_arrow': ('/api/export/sales/', {}),
+    'eventlog': ('/api/get-eventlog/', {}),
+    'pdc': ('/api/get-pdc/', {}),
+    'refresh_tag': ('/api/get-refresh-tag/', {}),
+    'users_list': ('/api/users-list/', {}),
+    'user_menus': ('/api/get-user-menus/', {'user_id': '{user}'}),
+    'shop_firms': ('/api/shop-location/firms/', {}),
+    'shop_table': ('/api/shop-location/table/', {}),
+    'punchin_table': ('/api/punch-in/table/', {}),
+    'punch_status': ('/api/punch-status/', {}),
+}
+
+
+def percentile(values, p):
+    """Nearest-rank percentile"""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+
+def baseline_path(name):
+    return name if name.endswith('.json') else os.path.join(BASELINE_DIR, f'{name}.json')
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        "Latency (p50/p95), SQL statements and peak memory of each API endpoint through the test client, "
+        "for one tenant (see generate_tenants); --save / --compare keep and diff JSON baselines"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--client-id', help="Tenant to request as (default: the one with the most ledger rows)")
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--warmup', type=int, default=2)
+        parser.add_argument('--only', action='append', default=[], help="Endpoints whose name contains this (repeatable)")
+        parser.add_argument('--report-cache', action='store_true',
+                            help="Leave REPORT_CACHE on (measures cache hits after the first request)")
+        parser.add_argument('--save', metavar='NAME', help=f"Write the results to {BASELINE_DIR}/NAME.json (or a .json path)")
+        parser.add_argument('--compare', metavar='NAME', help="Diff against a saved baseline")
+        parser.add_argument('--threshold', type=float, default=0.2,
+                            help="Relative increase of p50 latency or peak memory reported as a regression")
+        parser.add_argument('--fail', action='store_true', help="Exit with an error when --compare finds regressions")
+
+    def handle(self, *args, **options):
+        client_id = options['client_id'] or self.largest_tenant()
+        names = [name for name in ENDPOINTS if not options['only'] or any(part in name for part in options['only'])]
+        if not names:
+            raise CommandError(f"No endpoint matches --only; endpoints: {', '.join(ENDPOINTS)}")
+        baseline = None
+        if options['compare']:
+            try:
+                with open(baseline_path(options['compare'])) as f:
+                    baseline = json.load(f)
+            except OSError as e:
+                raise CommandError(f"Cannot read baseline: {e}")
+
+        values = self.placeholders(client_id)
+        client = Client(HTTP_AUTHORIZATION=f"Bearer {self.token(client_id, values['user'])}")
+        overrides = {
+            'ALLOWED_HOSTS': [*settings.ALLOWED_HOSTS, 'testserver'],
+            'QUERY_STATS': {**getattr(settings, 'QUERY_STATS', {}), 'ENABLED': True, 'HEADER': False},
+        }
+        if not options['report_cache']:
+            overrides['REPORT_CACHE'] = {**getattr(settings, 'REPORT_CACHE', {}), 'ENABLED': False}
+
+        results = {}
+        self.stdout.write(
+            f"{client_id} on {connection.vendor}, {options['repeat']} runs each"
+            + (f", against {baseline['name']} ({baseline['commit']})" if baseline else '')
+        )
+        self.stdout.write(f"{'endpoint':<30} {'status':>6} {'p50 ms':>9} {'p95 ms':>9} {'queries':>8} {'peak KiB':>9} {'KiB':>8}")
+        with override_settings(**overrides):
+            for name in names:
+                path, params = ENDPOINTS[name]
+                params = {key: value.format(**values) for key, value in params.items()}
+                results[name] = self.measure(client, path, params, options['warmup'], options['repeat'])
+                self.stdout.write(self.format_row(name, results[name], baseline and baseline['endpoints'].get(name), options['threshold']))
+
+        regressions = []
+        if baseline:
+            for name, result in results.items():
+                before = baseline['endpoints'].get(name)
+                if before and self.regressed(result, before, options['threshold']):
+                    regressions.append(name)
+            self.stdout.write(f"\n{len(regressions)} regression(s)" + (f": {', '.join(regressions)}" if regressions else ''))
+
+        if options['save']:
+            path = baseline_path(options['save'])
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'w') as f:
+                json.dump({
+                    'name': os.path.splitext(os.path.basename(path))[0],
+                    'created': datetime.now().isoformat(timespec='seconds'),
+                    'commit': git_commit(),
+                    'database': connection.vendor,
+                    'client_id': client_id,
+                    'rows': {
+                        'acc_ledgers': AccLedgers.objects.filter(client_id=client_id).count(),
+                        'sales_today': SalesToday.objects.filter(client_id=client_id).count(),
+                        'stock_report': StockReport.objects.filter(client_id=client_id).count(),
+                    },
+                    'repeat': options['repeat'],
+                    'endpoints': results,
+                }, f, indent=2)
+            self.stdout.write(f"Saved {path}")
+        if regressions and options['fail']:
+            raise CommandError(f"{len(regressions)} endpoint(s) regressed")
+
+    def largest_tenant(self):
+        busiest = AccLedgers.objects.values('client_id').annotate(rows=Count('id')).order_by('-rows').first()
+        if busiest is None:
+            raise CommandError("No ledger rows; fill the database with manage.py generate_tenants first")
+        return busiest['client_id']
+
+    def placeholders(self, client_id):
+        # Codes sort in the generator's activity order, so the first is the busiest
+        def first(queryset):
+            return queryset.filter(client_id=client_id).order_by('code').values_list('code', flat=True).first() or ''
+        user = AccUser.objects.filter(client_id=client_id).order_by('id').values_list('id', flat=True).first()
+        return {
+            'debtor': first(AccMaster.objects.filter(super_code='DEBTO')),
+            'cash': first(CashAndBankAccMaster.objects.filter(super_code='CASH')),
+            'bank': first(CashAndBankAccMaster.objects.filter(super_code='BANK')),
+            'user': user or 'BENCH',
+            'client_id': client_id,
+        }
+
+    def token(self, client_id, user):
+        payload = {
+            'user_id': user,
+            'username': user,
+            'client_id': client_id,
+            'role': 'Admin',
+            'accountcode': None,
+            'exp': datetime.utcnow() + timedelta(hours=24),
+            'iat': datetime.utcnow(),
+        }
+        return jwt.encode(payload, settings.SECRET_KEY, algorithm='HS256')
+
+    def request(self, client, path, params):
+        # Some views print debugging output
+        with contextlib.redirect_stdout(io.StringIO()):
+            response = client.get(path, params)
+            # Streaming bodies are produced (and their statements run) while read
+            size = len(b''.join(response.streaming_content) if response.streaming else response.content)
+        return response, size
+
+    def measure(self, client, path, params, warmup, repeat):
+        for _ in range(warmup):
+            self.request(client, path, params)
+        timings, queries = [], []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            response, size = self.request(client, path, params)
+            timings.append((time.perf_counter() - start) * 1000)
+            queries.append(request_stats().queries)
+
+        # Separately: tracemalloc slows the request down several times
+        tracemalloc.start()
+        self.request(client, path, params)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return {
+            'path': path,
+            'params': params,
+            'status': response.status_code,
+            'p50_ms': round(percentile(timings, 50), 3),
+            'p95_ms': round(percentile(timings, 95), 3),
+            'mean_ms': round(sum(timings) / len(timings), 3),
+            'queries': max(queries),
+            'peak_kib': round(peak / 1024, 1),
+            'bytes': size,
+        }
+
+    def regressed(self, result, before, threshold):
+        # Latency below a millisecond of difference is noise
+        slower = result['p50_ms'] > before['p50_ms'] * (1 + threshold) and result['p50_ms'] - before['p50_ms'] > 1
+        bigger = result['peak_kib'] > before['peak_kib'] * (1 + threshold) and result['peak_kib'] - before['peak_kib'] > 64
+        return slower or bigger or result['queries'] > before['queries'] or result['status'] != before['status']
+
+    def format_row(self, name, result, before, threshold):
+        row = (
+            f"{name:<30} {result['status']:>6} {result['p50_ms']:>9.2f} {result['p95_ms']:>9.2f} "
+            f"{result['queries']:>8} {result['peak_kib']:>9.1f} {result['bytes'] / 1024:>8.1f}"
+        )
+        if before:
+            row += (
+                f"   p50 {(result['p50_ms'] / before['p50_ms'] - 1) * 100 if before['p50_ms'] else 0:+.0f}%"
+                f" queries {result['queries'] - before['queries']:+d}"
+                f" peak {(result['peak_kib'] / before['peak_kib'] - 1) * 100 if before['peak_kib'] else 0:+.0f}%"
+            )
+            if self.regressed(result, before, threshold):
+                row = self.style.WARNING(row + '  REGRESSION')
+        return row
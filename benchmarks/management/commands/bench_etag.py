@@ -0,0 +1,85 @@
+import time
+from datetime import datetime, timedelta
+
+import jwt
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import RequestFactory, override_settings
+from django.urls import resolve
+
+ENDPOINTS = [
+    '/api/get-stock-report/',
+    '/api/get-eventlog/',
+    '/api/get-pdc/',
+    '/api/get-refresh-tag/',
+    '/api/suppiers_api/suppliers/',
+    '/api/users-list/',
+]
+
+
+class QueryTimer:
+    """execute_wrapper that adds up the time spent in the database"""
+
+    def __init__(self):
+        self.queries = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - start
+            self.queries += 1
+
+
+class Command(BaseCommand):
+    help = "Bytes, DB time and total time of a full load vs an If-None-Match repeat load for the ETag list endpoints"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--client-id', required=True, help="Tenant to load the endpoints for")
+        parser.add_argument('--repeat', type=int, default=20, help="Loads per variant")
+        parser.add_argument('--path', action='append', dest='paths', help="Endpoint to measure (repeatable)")
+
+    def handle(self, *args, **options):
+        token = jwt.encode({
+            'client_id': options['client_id'],
+            'username': 'BENCH',
+            'role': 'Admin',
+            'exp': datetime.utcnow() + timedelta(hours=1),
+        }, settings.SECRET_KEY, algorithm='HS256')
+        factory = RequestFactory()
+        repeat = options['repeat']
+
+        # The report cache would hide the cost of a full load
+        with override_settings(REPORT_CACHE={**getattr(settings, 'REPORT_CACHE', {}), 'ENABLED': False}):
+            self.stdout.write(f"{'endpoint':<32} {'full (bytes, db, total)':>36}    {'304 repeat':>32}")
+            for path in options['paths'] or ENDPOINTS:
+                view = resolve(path).func
+
+                def load(**headers):
+                    timer = QueryTimer()
+                    request = factory.get(path, HTTP_AUTHORIZATION=f'Bearer {token}', **headers)
+                    with connection.execute_wrapper(timer):
+                        response = view(request)
+                        if hasattr(response, 'render'):
+                            response.render()
+                    return response, timer
+
+                first, _ = load()
+                etag = first.get('ETag')
+                results = []
+                for headers in ({}, {'HTTP_IF_NONE_MATCH': etag}):
+                    size = db_time = total = 0.0
+                    status = None
+                    for _ in range(repeat):
+                        start = time.perf_counter()
+                        response, timer = load(**headers)
+                        total += time.perf_counter() - start
+                        size += len(response.content)
+                        db_time += timer.seconds
+                        status = response.status_code
+                    results.append(f"{status} {size / repeat:>9.0f} B {db_time / repeat * 1000:7.2f} ms {total / repeat * 1000:8.2f} ms")
+
+                self.stdout.write(f"{path:<32} {results[0]}    {results[1]}")
@@ -0,0 +1,59 @@
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.http import HttpResponse
+from django.test import RequestFactory, override_settings
+
+from monitoring import metrics
+from monitoring.querystats import QueryStatsMiddleware
+
+
+class Command(BaseCommand):
+    help = "Per-request cost of recording the Prometheus metrics (monitoring/metrics.py)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=20000)
+        parser.add_argument('--queries', type=int, default=3, help="SQL statements per request")
+        parser.add_argument('--routes', type=int, default=50, help="Distinct URL names recorded")
+
+    def handle(self, *args, **options):
+        n = options['requests']
+        directory = tempfile.mkdtemp(prefix='bench-metrics-')
+
+        with override_settings(METRICS={'ENABLED': True, 'PATH': directory, 'FLUSH_INTERVAL': 5}):
+            start = time.perf_counter()
+            for i in range(n):
+                metrics.record(f'route_{i % options["routes"]}', 'GET', 200, 0.0123, 0.0042, 3, 2048)
+            self.stdout.write(f"metrics.record():            {(time.perf_counter() - start) / n * 1e6:6.2f} µs per request")
+
+        def view(request):
+            with connection.cursor() as cursor:
+                for _ in range(options['queries']):
+                    cursor.execute('SELECT 1')
+            return HttpResponse(b'x' * 2048)
+
+        factory = RequestFactory()
+        requests = [factory.get('/') for _ in range(n)]
+        timings = {}
+        for label, query_stats, metrics_enabled in (
+            ('off', False, False),
+            ('metrics only', False, True),
+            ('metrics + query stats', True, True),
+        ):
+            with override_settings(
+                QUERY_STATS={'ENABLED': query_stats},
+                METRICS={'ENABLED': metrics_enabled, 'PATH': directory, 'FLUSH_INTERVAL': 5},
+            ):
+                middleware = QueryStatsMiddleware(view)
+                middleware(requests[0])
+                start = time.perf_counter()
+                for request in requests:
+                    middleware(request)
+                timings[label] = (time.perf_counter() - start) / n * 1e6
+            overhead = timings[label] - timings['off']
+            self.stdout.write(
+                f"middleware, {label + ',':<22} {timings[label]:6.2f} µs per request ({overhead:+.2f} µs, "
+                f"{options['queries']} queries)"
+            )
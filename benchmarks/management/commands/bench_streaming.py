@@ -0,0 +1,96 @@
+import tracemalloc
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+import jwt
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory, override_settings
+from django.urls import resolve
+from rest_framework.renderers import JSONRenderer
+
+from task_backend.streaming import stream_response
+
+
+def synthetic_rows(count):
+    """Stock-report shaped rows, generated lazily like a server-side cursor would"""
+    for i in range(count):
+        yield {
+            'code': i,
+            'name': f'Item {i:07d} assorted pack',
+            'productcode': f'P{i:07d}',
+            'barcode': f'{8900000000000 + i}',
+            'bmrp': Decimal('125.50'),
+            'salesprice': Decimal('119.00'),
+            'quantity': Decimal(i % 97),
+            'cost': Decimal('101.25'),
+            'updated': date(2026, 1, 1) + timedelta(days=i % 365),
+        }
+
+
+def peak_bytes(fn):
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    try:
+        size = fn()
+        return tracemalloc.get_traced_memory()[1], size
+    finally:
+        tracemalloc.stop()
+
+
+def drain(response):
+    """Consume a response like the WSGI server would; returns the body size"""
+    if response.streaming:
+        return sum(len(chunk) for chunk in response.streaming_content)
+    if hasattr(response, 'render'):
+        response.render()
+    return len(response.content)
+
+
+class Command(BaseCommand):
+    help = "Peak Python memory (tracemalloc) of list-then-render responses vs the streamed path, by row count"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, nargs='+', default=[10000, 50000, 200000])
+        parser.add_argument('--client-id', help="Also measure the real endpoints for this tenant")
+        parser.add_argument('--path', action='append', dest='paths',
+                            help="Endpoint to measure with --client-id (repeatable)")
+
+    def handle(self, *args, **options):
+        self.stdout.write("synthetic rows: peak traced memory")
+        self.stdout.write(f"{'rows':>9} {'list + render':>16} {'stream=json':>14} {'body':>12}")
+        for count in options['rows']:
+            def buffered():
+                data = list(synthetic_rows(count))
+                return len(JSONRenderer().render({'success': True, 'count': len(data), 'data': data}))
+
+            def streamed():
+                return drain(stream_response(synthetic_rows(count), 'json', count_key='count'))
+
+            list_peak, _ = peak_bytes(buffered)
+            stream_peak, size = peak_bytes(streamed)
+            self.stdout.write(f"{count:>9} {list_peak / 2**20:>13.1f} MiB {stream_peak / 2**20:>11.2f} MiB {size / 2**20:>8.1f} MiB")
+
+        if options['client_id']:
+            self.measure_endpoints(options['client_id'], options['paths'] or [
+                '/api/get-stock-report/', '/api/get-eventlog/', '/api/punch-in/table/',
+                '/api/shop-location/table/', '/api/get-sale-report/',
+            ])
+
+    def measure_endpoints(self, client_id, paths):
+        token = jwt.encode({
+            'client_id': client_id, 'username': 'BENCH', 'role': 'Admin',
+            'exp': datetime.utcnow() + timedelta(hours=1),
+        }, settings.SECRET_KEY, algorithm='HS256')
+        factory = RequestFactory()
+
+        self.stdout.write(f"\nendpoints for {client_id}: peak traced memory")
+        with override_settings(REPORT_CACHE={**getattr(settings, 'REPORT_CACHE', {}), 'ENABLED': False}):
+            for path in paths:
+                view = resolve(path).func
+                results = []
+                for query in ('', '?stream=json'):
+                    request = factory.get(path + query, HTTP_AUTHORIZATION=f'Bearer {token}')
+                    peak, size = peak_bytes(lambda: drain(view(request)))
+                    results.append(f"{peak / 2**20:8.2f} MiB ({size / 2**20:.1f} MiB body)")
+                self.stdout.write(f"  {path:<28} list {results[0]}   stream {results[1]}")
@@ -0,0 +1,436 @@
+import random
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from PunchIn.models import PunchIn, ShopLocation, UserAreas
+from SalesReturnReport.models import SalesReturnReport
+from acc_sales_type.models import AccSalesType
+from accesscontroll.models import AllowedMenu
+from app1.balances import refresh_snapshots
+from app1.models import AccInvmast, AccLedgers, AccMaster, AccUser, CashAndBankAccMaster, Misel
+from eventlog.models import EventLog
+from pdc.models import PDC
+from refresh_tag.models import RefreshTag
+from salestoday_purchasetoday.models import (
+    PurchaseDaywise, PurchaseMonthwise, PurchaseToday, SalesDaywise, SalesMonthwise, SalesReturnDaywise,
+    SalesReturnMonthwise, SalesToday,
+)
+from stock_report.models import StockReport
+from stock_summary.models import StockSummary
+from tendercash.models import TenderCash
+
+# Rows at --scale 1, divided between the tenants.  Tenant-sized tables
+# (users, cash and bank accounts, sales types, summaries) and tendercash (one
+# or two per sale) follow from these.
+ROWS = {
+    'acc_ledgers': 1_000_000,
+    'sales_today': 500_000,
+    'acc_invmast': 200_000,
+    'stock_report': 200_000,
+    'purchase_today': 100_000,
+    'eventlog': 100_000,
+    'acc_master': 20_000,
+    'pdc': 20_000,
+    'salesreturn_report': 20_000,
+    'punchin': 20_000,
+    'shop_location': 5_000,
+    'refresh_tag': 5_000,
+}
+
+LOCAL_HOSTS = ('', 'localhost', '127.0.0.1', '::1')
+
+FIRM_WORDS = ['Ravi', 'Kumar', 'Anil', 'Sunrise', 'Lakshmi', 'Janatha', 'Malabar', 'Royal', 'Green', 'City', 'New', 'Sree']
+FIRM_KINDS = ['Traders', 'Stores', 'Agencies', 'Mart', 'Hotel', 'Enterprises', 'Bakery', 'Medicals', 'Textiles']
+PLACES = ['Kochi', 'Calicut', 'Thrissur', 'Kannur', 'Kollam', 'Palakkad', 'Malappuram', 'Kottayam']
+AREAS = ['NORTH', 'SOUTH', 'EAST', 'WEST', 'CENTRAL', 'RURAL']
+PRODUCTS = ['Rice', 'Sugar', 'Tea', 'Soap', 'Oil', 'Atta', 'Biscuit', 'Detergent', 'Salt', 'Coffee', 'Shampoo', 'Dal']
+SIZES = ['100g', '250g', '500g', '1kg', '5kg', '1L', '500ml', 'Pack of 6']
+# Matches the expense categories of app1/categories.py, plus uncategorised ones
+PARTICULARS = [
+    'Sales', 'Purchase', 'Cash received', 'Cash paid', 'Bank deposit', 'Salary', 'Hotel Grand dining', 'Fuel petrol',
+    'Super Mart purchase', 'Uber ride', 'Restaurant bill', 'Auto parts shop', 'Electricity', 'Rent', 'Discount',
+]
+SALES_TYPES = [('1', 'Retail'), ('2', 'Wholesale'), ('3', 'Counter'), ('4', 'Online')]
+TENDERS = [('CASH', 0.55), ('CARD', 0.2), ('UPI', 0.2), ('CREDIT', 0.05)]
+EVENTS = ['Login', 'Logout', 'Sync started', 'Sync completed', 'Bill saved', 'Bill cancelled', 'Stock updated']
+
+
+def zipf_weights(n, skew):
+    return [1 / (rank ** skew) for rank in range(1, n + 1)]
+
+
+def split(total, weights):
+    """``total`` divided in proportion to ``weights``; the parts add up to it exactly"""
+    shares = [total * w / sum(weights) for w in weights]
+    counts = [int(share) for share in shares]
+    for i in sorted(range(len(shares)), key=lambda i: counts[i] - shares[i])[:total - sum(counts)]:
+        counts[i] += 1
+    return counts
+
+
+class Tenant:
+    """Generator state of one tenant; its random stream depends only on the seed and client_id"""
+
+    def __init__(self, client_id, number, rows, seed, today):
+        self.client_id = client_id
+        self.number = number
+        self.rows = rows
+        self.rng = random.Random(f'{seed}-{client_id}')
+        self.today = today
+        n_users = max(2, min(20, rows['acc_master'] // 100))
+        # Logins (acc_users.id is unique across tenants) and the short user codes of the billing tables
+        self.users = [f'{client_id}U{i:02d}' for i in range(n_users)]
+        self.user_codes = [f'U{i:02d}' for i in range(n_users)]
+
+    def recent_date(self, mean_days=60, max_days=730):
+        """A date before today, most of them recent"""
+        return self.today - timedelta(days=min(int(self.rng.expovariate(1 / mean_days)), max_days))
+
+    def amount(self, median=1000, sigma=1.2):
+        return round(self.rng.lognormvariate(0, sigma) * median, 2)
+
+    def firm_name(self, n):
+        return f'{self.rng.choice(FIRM_WORDS)} {self.rng.choice(FIRM_KINDS)} {n}'
+
+    def skewed(self, population, k, skew=1.0):
+        """``k`` picks from ``population``, the first ones far more often"""
+        if not population:
+            return []
+        cum, total = [], 0.0
+        for w in zipf_weights(len(population), skew):
+            total += w
+            cum.append(total)
+        return self.rng.choices(population, cum_weights=cum, k=k)
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill the database with synthetic tenants for benchmarks (bench_endpoints): every table the "
+        "views read, rows divided between tenants by a Zipf distribution, recent dates and busy accounts "
+        "over-represented"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tenants', type=int, default=20)
+        parser.add_argument('--prefix', default='BENCH', help="client_id prefix: BENCH001, BENCH002, ...")
+        parser.add_argument('--scale', type=float, default=1.0,
+                            help="Multiplies the default row counts (1M acc_ledgers, 500k sales_today, ...)")
+        parser.add_argument('--rows', action='append', default=[], metavar='TABLE=N',
+                            help=f"Total rows of one table (repeatable); tables: {', '.join(ROWS)}")
+        parser.add_argument('--skew', type=float, default=1.0,
+                            help="Zipf exponent of the tenant sizes; 0 gives every tenant the same")
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--create-tables', action='store_true',
+                            help="Create the tables and columns the migrations do not: the unmanaged legacy "
+                                 "tables (acc_ledgers, acc_master, ...) and model fields without a migration; "
+                                 "run migrate first")
+        parser.add_argument('--clear', action='store_true', help="Delete these tenants' rows first")
+        parser.add_argument('--allow-remote', action='store_true',
+                            help="Write to a database that is not on this machine")
+
+    def handle(self, *args, **options):
+        self.batch_size = options['batch_size']
+        if connection.vendor != 'sqlite' and connection.settings_dict['HOST'] not in LOCAL_HOSTS and not options['allow_remote']:
+            raise CommandError(
+                f"The database is on {connection.settings_dict['HOST']}; generate tenants in a local "
+                f"database (DB_HOST=127.0.0.1 or DB_ENGINE=sqlite) or pass --allow-remote"
+            )
+
+        rows = {table: round(count * options['scale']) for table, count in ROWS.items()}
+        for item in options['rows']:
+            table, _, count = item.partition('=')
+            if table not in ROWS or not count.isdigit():
+                raise CommandError(f"--rows takes TABLE=N with TABLE one of: {', '.join(ROWS)}")
+            rows[table] = int(count)
+
+        if options['create_tables']:
+            self.create_tables()
+
+        n = options['tenants']
+        client_ids = [f"{options['prefix']}{i:03d}" for i in range(1, n + 1)]
+        models = [m for m in apps.get_models() if any(f.name == 'client_id' for f in m._meta.concrete_fields)]
+        if options['clear']:
+            for model in models:
+                model.objects.filter(client_id__in=client_ids).delete()
+        elif AccLedgers.objects.filter(client_id__in=client_ids).exists():
+            raise CommandError(f"Tenants {client_ids[0]}..{client_ids[-1]} already have rows; pass --clear")
+
+        weights = zipf_weights(n, options['skew'])
+        per_tenant = {table: split(total, weights) for table, total in rows.items()}
+        today = timezone.localdate()
+        started = time.perf_counter()
+        for i, client_id in enumerate(client_ids):
+            tenant = Tenant(client_id, i + 1, {table: counts[i] for table, counts in per_tenant.items()}, options['seed'], today)
+            tenant_started = time.perf_counter()
+            with transaction.atomic():
+                inserted = self.generate(tenant)
+            refresh_snapshots(client_id, full=True)
+            self.stdout.write(
+                f"{client_id}: {inserted:,} rows in {time.perf_counter() - tenant_started:.1f}s "
+                f"({tenant.rows['acc_ledgers']:,} ledger, {tenant.rows['sales_today']:,} sales)"
+            )
+        # Without statistics on the new rows the planner expects one row per
+        # tenant and nests loops over sequential scans
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        self.stdout.write(self.style.SUCCESS(f"{n} tenants in {time.perf_counter() - started:.1f}s"))
+
+    def create_tables(self):
+        existing = set(connection.introspection.table_names())
+        with connection.schema_editor() as editor:
+            for model in apps.get_models():
+                table = model._meta.db_table
+                if table not in existing:
+                    editor.create_model(model)
+                    self.stdout.write(f"Created {table}")
+                    continue
+                with connection.cursor() as cursor:
+                    columns = {c.name for c in connection.introspection.get_table_description(cursor, table)}
+                for field in model._meta.local_concrete_fields:
+                    if field.column not in columns:
+                        editor.add_field(model, field)
+                        self.stdout.write(f"Added {table}.{field.column}")
+
+    def insert(self, model, objects):
+        """
+        bulk_create of ``objects`` without its per-value overhead (a third
+        of the run): multi-row INSERTs of the fields' database values.
+        """
+        fields = [f for f in model._meta.local_concrete_fields if f is not model._meta.auto_field]
+        now = timezone.now()
+        sql_start = f"INSERT INTO {connection.ops.quote_name(model._meta.db_table)} ({', '.join(connection.ops.quote_name(f.column) for f in fields)}) VALUES "
+        placeholders = f"({', '.join(['%s'] * len(fields))})"
+        rows_per_statement = connection.ops.bulk_batch_size(fields, [None] * self.batch_size)
+
+        def write(batch):
+            with connection.cursor() as cursor:
+                for i in range(0, len(batch), rows_per_statement):
+                    chunk = batch[i:i + rows_per_statement]
+                    cursor.execute(sql_start + ', '.join([placeholders] * len(chunk)), [value for row in chunk for value in row])
+
+        batch, count = [], 0
+        for obj in objects:
+            batch.append([
+                f.get_db_prep_save(now if getattr(f, 'auto_now_add', False) or getattr(f, 'auto_now', False) else getattr(obj, f.attname), connection)
+                for f in fields
+            ])
+            if len(batch) >= self.batch_size:
+                write(batch)
+                count += len(batch)
+                batch = []
+        if batch:
+            write(batch)
+            count += len(batch)
+        return count
+
+    def generate(self, t):
+        rng, c = t.rng, t.client_id
+        count = 0
+
+        count += self.insert(Misel, [Misel(
+            firm_name=t.firm_name(t.number), address=f'{t.number} Market Road', phones='0484 2400000',
+            mobile='9847000000', address1=rng.choice(PLACES), address2='Kerala', address3='India',
+            pagers='', tinno=f'32{t.number:09d}', client_id=c,
+        )])
+        count += self.insert(AccUser, [
+            AccUser(id=user, password='bench', role='Admin' if i == 0 else 'User', accountcode=None, client_id=c)
+            for i, user in enumerate(t.users)
+        ])
+        count += self.insert(AllowedMenu, [
+            AllowedMenu(user_id=user, client_id=c, allowedMenuIds=sorted(rng.sample(range(1, 30), 12)), label='Dashboard', path='/')
+            for user in t.users
+        ])
+        count += self.insert(UserAreas, [
+            UserAreas(user_id=user, client_id=c, area_code=area)
+            for user in t.users for area in rng.sample(AREAS, rng.randint(1, 3))
+        ])
+        count += self.insert(AccSalesType, [AccSalesType(cd=cd, name=name, client_id=c) for cd, name in SALES_TYPES])
+
+        # Accounts: codes are unique across tenants (acc_master.code is the model's primary key)
+        # At least one account of each kind, so every report has rows
+        kinds = ['DEBTO', 'SUNCR', 'EXPNS', 'INCOM']
+        supers = kinds + rng.choices(kinds, weights=[60, 20, 12, 8], k=max(0, t.rows['acc_master'] - len(kinds)))
+        accounts = [(f'{c}-{n:06d}', super_code, t.firm_name(n)) for n, super_code in enumerate(supers, 1)]
+        count += self.insert(AccMaster, (
+            AccMaster(
+                code=code, name=name, super_code=super_code, opening_balance=t.amount(5000),
+                debit=t.amount(20000), credit=t.amount(15000), place=rng.choice(PLACES),
+                phone2=f'98{rng.randint(10000000, 99999999)}', area=rng.choice(AREAS), client_id=c,
+            ) for code, super_code, name in accounts
+        ))
+        debtors = [(code, name) for code, super_code, name in accounts if super_code == 'DEBTO']
+        suppliers = [name for code, super_code, name in accounts if super_code == 'SUNCR']
+        year_start = t.today.replace(year=t.today.year - (t.today.month < 4), month=4, day=1)
+        books = [(f'{c}-CASH{i}', 'CASH') for i in range(1, 3)] + [(f'{c}-BANK{i}', 'BANK') for i in range(1, 4)]
+        count += self.insert(CashAndBankAccMaster, [
+            CashAndBankAccMaster(
+                code=code, name=f'{super_code.title()} account {code[-1]}', super_code=super_code,
+                opening_balance=t.amount(50000), opening_date=year_start,
+                debit=t.amount(500000), credit=t.amount(400000), client_id=c,
+            ) for code, super_code in books
+        ])
+
+        # Ledger: the cash account first, so it is the busiest, then the others by Zipf rank
+        ledger_codes = [books[0][0]] + [code for code, _ in books[1:]] + [code for code, _, _ in accounts]
+        def ledgers():
+            for voucher, code in enumerate(t.skewed(ledger_codes, t.rows['acc_ledgers']), 1):
+                mode = rng.choice(('DR', 'CR'))
+                value = t.amount()
+                yield AccLedgers(
+                    code=code, particulars=rng.choice(PARTICULARS), debit=value if mode == 'DR' else 0,
+                    credit=value if mode == 'CR' else 0, entry_mode=mode, entry_date=t.recent_date(120),
+                    voucher_no=voucher, narration=f'Voucher {voucher}' if rng.random() < 0.3 else None, client_id=c,
+                )
+        count += self.insert(AccLedgers, ledgers())
+
+        type_codes = [cd for cd, _ in SALES_TYPES]
+
+        def invoices():
+            for slno, (code, _) in enumerate(t.skewed(debtors, t.rows['acc_invmast']), 1):
+                total = t.amount(2000)
+                yield AccInvmast(
+                    slno=slno, modeofpayment=rng.choice(('CASH', 'CREDIT', 'CARD')), customerid=code,
+                    invdate=t.recent_date(90), nettotal=total, paid=round(total * rng.choice((1, 1, 0.5, 0)), 2),
+                    bill_ref=f'INV{slno}', userid=rng.choice(t.user_codes), type=rng.choice(type_codes), client_id=c,
+                )
+        count += self.insert(AccInvmast, invoices())
+
+        # Sales with their tenders, adding up the daily / monthly summaries as they go
+        daily_sales, daily_purchases, daily_returns = defaultdict(lambda: [0, 0.0]), defaultdict(lambda: [0, 0.0]), defaultdict(lambda: [0, 0.0])
+        sales = []
+
+        def sales_rows():
+            customers = t.skewed(debtors, t.rows['sales_today'])
+            for slno, (_, customer) in enumerate(customers, 1):
+                day = t.recent_date(45)
+                total = t.amount(800)
+                daily_sales[day][0] += 1
+                daily_sales[day][1] += total
+                sales.append((slno, total))
+                yield SalesToday(
+                    slno=slno, nettotal=total, billno=slno, type=rng.choice(type_codes), userid=rng.choice(t.user_codes),
+                    invdate=day, customername=customer, client_id=c,
+                )
+        count += self.insert(SalesToday, sales_rows())
+
+        tender_codes, tender_weights = zip(*TENDERS)
+
+        def tenders():
+            for slno, total in sales:
+                if rng.random() < 0.2:
+                    part = round(total * rng.random(), 2)
+                    parts = (part, round(total - part, 2))
+                else:
+                    parts = (total,)
+                for value in parts:
+                    yield TenderCash(
+                        client_id=c, mslno=slno, tender_code=rng.choices(tender_codes, tender_weights)[0], amount=value,
+                        currency_code='INR', currency_name='Indian Rupee',
+                    )
+        count += self.insert(TenderCash, tenders())
+
+        def purchases():
+            for billno in range(1, t.rows['purchase_today'] + 1):
+                day = t.recent_date(45)
+                total = t.amount(5000)
+                daily_purchases[day][0] += 1
+                daily_purchases[day][1] += total
+                yield PurchaseToday(
+                    net=round(total * 0.95, 2), billno=billno, pbillno=rng.randint(1, 99999), date=day, total=total,
+                    suppliername=rng.choice(suppliers), client_id=c,
+                )
+        count += self.insert(PurchaseToday, purchases())
+
+        def returns():
+            for invno in range(1, t.rows['salesreturn_report'] + 1):
+                day = t.recent_date(60)
+                total = t.amount(500)
+                daily_returns[day][0] += 1
+                daily_returns[day][1] += total
+                yield SalesReturnReport(
+                    date=day, invno=invno, net=total, customername=rng.choice(debtors)[1],
+                    userid=rng.choice(t.user_codes), client_id=c,
+                )
+        count += self.insert(SalesReturnReport, returns())
+
+        for daywise, monthwise, daily in (
+            (SalesDaywise, SalesMonthwise, daily_sales),
+            (PurchaseDaywise, PurchaseMonthwise, daily_purchases),
+            (SalesReturnDaywise, SalesReturnMonthwise, daily_returns),
+        ):
+            count += self.insert(daywise, [
+                daywise(date=day, total_bills=daily[day][0], total_amount=round(daily[day][1], 3), client_id=c)
+                for day in (t.today - timedelta(days=n) for n in range(8)) if day in daily
+            ])
+            months = defaultdict(lambda: [0, 0.0])
+            for day, (bills, total) in daily.items():
+                months[(day.year, day.month)][0] += bills
+                months[(day.year, day.month)][1] += total
+            count += self.insert(monthwise, [
+                monthwise(
+                    month_name=datetime(year, month, 1).strftime('%B %Y'), month_number=month, year=year,
+                    total_bills=bills, total_amount=round(total, 3), client_id=c,
+                ) for (year, month), (bills, total) in sorted(months.items())
+            ])
+
+        stock_value = 0.0
+
+        def stock():
+            nonlocal stock_value
+            for n in range(1, t.rows['stock_report'] + 1):
+                cost = t.amount(80, 0.9)
+                # Most products have little or no stock left
+                quantity = 0 if rng.random() < 0.3 else round(rng.expovariate(1 / 40), 3)
+                stock_value += cost * quantity
+                yield StockReport(
+                    client_id=c, code=f'P{n:06d}', name=f'{rng.choice(PRODUCTS)} {rng.choice(SIZES)} {n}',
+                    productcode=f'{n:06d}', barcode=f'890{rng.randint(10 ** 9, 10 ** 10 - 1)}' if rng.random() < 0.7 else None,
+                    bmrp=round(cost * 1.35, 2), salesprice=round(cost * 1.25, 2), quantity=quantity, cost=cost,
+                )
+        count += self.insert(StockReport, stock())
+        count += self.insert(StockSummary, [StockSummary(
+            total_products=t.rows['stock_report'], total_stock_value=round(stock_value, 3), barcode_mode='batch', client_id=c,
+        )])
+
+        count += self.insert(EventLog, (
+            EventLog(
+                client_id=c, uid=rng.choice(t.users), edate=t.recent_date(30),
+                etime=f'{rng.randint(8, 21):02d}:{rng.randint(0, 59):02d}:{rng.randint(0, 59):02d}', sevent=rng.choice(EVENTS),
+            ) for _ in range(t.rows['eventlog'])
+        ))
+        # Sync events in order, the last one minutes ago
+        now = timezone.now()
+        count += self.insert(RefreshTag, (
+            RefreshTag(
+                client_id=c, edate=timezone.localdate(moment), etime=moment, userid=rng.choice(t.user_codes), remark='sync',
+            ) for moment in (now - timedelta(minutes=15 * (t.rows['refresh_tag'] - n)) for n in range(1, t.rows['refresh_tag'] + 1))
+        ))
+        count += self.insert(PDC, (
+            PDC(
+                client_id=c, colndate=t.recent_date(60), party=name[:30], amount=t.amount(10000),
+                chequedate=t.today + timedelta(days=rng.randint(-30, 90)), chequeno=f'{rng.randint(100000, 999999)}',
+                colnstatus=rng.choice('YN'), status=rng.choice('PC'),
+            ) for _, name in t.skewed(debtors, t.rows['pdc'])
+        ))
+        # punchin_time / created_at are auto_now_add: every row is stamped with the current time
+        count += self.insert(ShopLocation, (
+            ShopLocation(
+                firm_id=code, latitude=round(rng.uniform(8.3, 12.8), 6), longitude=round(rng.uniform(74.9, 77.4), 6),
+                client_id=c, status=rng.choice(('verified', 'pending', 'rejected')), created_by=rng.choice(t.users),
+            ) for code, _ in t.skewed(debtors, t.rows['shop_location'])
+        ))
+        count += self.insert(PunchIn, (
+            PunchIn(
+                firm_id=code, latitude=round(rng.uniform(8.3, 12.8), 6), longitude=round(rng.uniform(74.9, 77.4), 6),
+                client_id=c, created_by=rng.choice(t.users), status=rng.choice(('pending', 'completed')),
+                address=rng.choice(PLACES),
+            ) for code, _ in t.skewed(debtors, t.rows['punchin'])
+        ))
+        return count
@@ -0,0 +1,233 @@
+import glob
+import http.client
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from urllib.parse import urlsplit
+
+import jwt
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from monitoring.trace import trace_path
+
+from .bench_endpoints import baseline_path, git_commit, percentile
+
+
+def load_trace(paths, methods):
+    """Entries of the JSONL trace files (or directories of them) in ``paths``, oldest first"""
+    files = []
+    for path in paths:
+        files.extend(sorted(glob.glob(os.path.join(path, '*.jsonl'))) if os.path.isdir(path) else [path])
+    entries = []
+    for name in files:
+        try:
+            with open(name) as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    entry = json.loads(line)
+                    if entry['method'] in methods:
+                        entries.append(entry)
+        except (OSError, ValueError, KeyError) as e:
+            raise CommandError(f"Cannot read trace {name}: {e}")
+    entries.sort(key=lambda entry: entry['ts'])
+    return entries
+
+
+class Signer:
+    """Bearer tokens for recorded claims, signed with this SECRET_KEY; one per distinct set of claims"""
+
+    def __init__(self, client_ids):
+        self.client_ids = client_ids
+        self._tokens = {}
+        self._lock = threading.Lock()
+
+    def header(self, entry):
+        if entry.get('auth') == 'invalid':
+            return 'Bearer invalid'
+        claims = entry.get('claims')
+        if not claims:
+            return None
+        key = json.dumps(claims, sort_keys=True)
+        with self._lock:
+            if key not in self._tokens:
+                claims = dict(claims)
+                if 'client_id' in claims:
+                    claims['client_id'] = self.client_ids.get(claims['client_id'], self.client_ids.get('*', claims['client_id']))
+                now = datetime.utcnow()
+                claims.update(iat=now, exp=now + timedelta(hours=24))
+                self._tokens[key] = 'Bearer ' + jwt.encode(claims, settings.SECRET_KEY, algorithm='HS256')
+            return self._tokens[key]
+
+
+class Command(BaseCommand):
+    help = (
+        "Replay a request trace recorded by TRACE_CAPTURE against a running server with N concurrent "
+        "connections; reports throughput and latency percentiles per route"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('trace', nargs='*', help="Trace files or directories (default: TRACE_CAPTURE['PATH'])")
+        parser.add_argument('--base-url', default='http://127.0.0.1:8000')
+        parser.add_argument('--concurrency', type=int, default=8, help="Connections sending requests in parallel")
+        parser.add_argument('--speed', type=float, default=0,
+                            help="Replay at this multiple of the recorded pace (0: as fast as the connections allow)")
+        parser.add_argument('--methods', default='GET,HEAD', help="Comma-separated methods to replay")
+        parser.add_argument('--repeat', type=int, default=1, help="Replay the trace this many times")
+        parser.add_argument('--limit', type=int, help="Replay only the first N requests")
+        parser.add_argument('--client-id', action='append', default=[], metavar='OLD=NEW',
+                            help="Send tenant NEW in place of OLD (repeatable; *=NEW maps every tenant)")
+        parser.add_argument('--timeout', type=float, default=60)
+        parser.add_argument('--save', metavar='NAME', help="Write the results to benchmarks/baselines/NAME.json (or a .json path)")
+
+    def handle(self, *args, **options):
+        methods = {method.strip().upper() for method in options['methods'].split(',') if method.strip()}
+        entries = load_trace(options['trace'] or [trace_path()], methods)
+        if options['limit']:
+            entries = entries[:options['limit']]
+        if not entries:
+            raise CommandError("The trace holds no requests to replay")
+        if options['concurrency'] < 1:
+            raise CommandError("--concurrency must be at least 1")
+        try:
+            client_ids = dict(mapping.split('=', 1) for mapping in options['client_id'])
+        except ValueError:
+            raise CommandError("--client-id takes OLD=NEW")
+        url = urlsplit(options['base_url'])
+        if url.scheme not in ('http', 'https') or not url.hostname:
+            raise CommandError(f"Invalid --base-url {options['base_url']}")
+
+        # Scheduled start of every request, in seconds from the start of the replay
+        span = entries[-1]['ts'] - entries[0]['ts']
+        schedule = []
+        for run in range(options['repeat']):
+            for entry in entries:
+                offset = (run * span + entry['ts'] - entries[0]['ts']) / options['speed'] if options['speed'] else 0
+                schedule.append((offset, entry))
+
+        self.stdout.write(
+            f"Replaying {len(schedule)} requests against {options['base_url']} with {options['concurrency']} connections"
+            + (f" at {options['speed']:g}x the recorded pace" if options['speed'] else ', unpaced')
+        )
+        signer = Signer(client_ids)
+        results = []
+        results_lock = threading.Lock()
+        position = iter(range(len(schedule)))
+        position_lock = threading.Lock()
+        started = time.perf_counter()
+
+        def worker():
+            connection_class = http.client.HTTPSConnection if url.scheme == 'https' else http.client.HTTPConnection
+            conn = connection_class(url.hostname, url.port, timeout=options['timeout'])
+            local = []
+            while True:
+                with position_lock:
+                    index = next(position, None)
+                if index is None:
+                    break
+                offset, entry = schedule[index]
+                due = started + offset
+                delay = due - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                # Measured from the scheduled start, so a server that falls
+                # behind the recorded pace shows as latency instead of being
+                # hidden by fewer requests sent (coordinated omission)
+                begin = due if options['speed'] else time.perf_counter()
+                status, size = self.send(conn, entry, url.path.rstrip('/'), signer)
+                if status is None:
+                    conn.close()
+                local.append((entry.get('route') or entry['path'], entry['method'], status, entry.get('status'),
+                              time.perf_counter() - begin, size))
+            conn.close()
+            with results_lock:
+                results.extend(local)
+
+        threads = [threading.Thread(target=worker, daemon=True) for _ in range(min(options['concurrency'], len(schedule)))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        report = self.report(results, elapsed)
+        self.write_report(report)
+        if options['save']:
+            path = baseline_path(options['save'])
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'w') as f:
+                json.dump({
+                    'name': os.path.splitext(os.path.basename(path))[0],
+                    'created': datetime.now().isoformat(timespec='seconds'),
+                    'commit': git_commit(),
+                    'base_url': options['base_url'],
+                    'concurrency': options['concurrency'],
+                    'speed': options['speed'],
+                    **report,
+                }, f, indent=2)
+            self.stdout.write(f"Saved {path}")
+
+    def send(self, conn, entry, prefix, signer):
+        """(status, response bytes) of one request; status None when the connection failed"""
+        target = prefix + entry['path'] + (f"?{entry['query']}" if entry.get('query') else '')
+        headers = {'Accept-Encoding': 'identity'}
+        authorization = signer.header(entry)
+        if authorization:
+            headers['Authorization'] = authorization
+        body = entry.get('body')
+        if body is not None:
+            body = body.encode('utf-8')
+            headers['Content-Type'] = entry.get('content_type') or 'application/json'
+        try:
+            conn.request(entry['method'], target, body=body, headers=headers)
+            response = conn.getresponse()
+            return response.status, len(response.read())
+        except (OSError, http.client.HTTPException):
+            return None, 0
+
+    def report(self, results, elapsed):
+        routes = defaultdict(list)
+        for result in results:
+            routes[(result[0], result[1])].append(result)
+
+        def summary(rows):
+            latencies = [row[4] * 1000 for row in rows]
+            return {
+                'requests': len(rows),
+                'req_per_s': round(len(rows) / elapsed, 2),
+                'failed': sum(1 for row in rows if row[2] is None),
+                'errors': sum(1 for row in rows if row[2] is not None and row[2] >= 500),
+                # Answered differently than when the trace was recorded
+                'status_changed': sum(1 for row in rows if row[2] is not None and row[3] is not None and row[2] != row[3]),
+                'p50_ms': round(percentile(latencies, 50), 3),
+                'p95_ms': round(percentile(latencies, 95), 3),
+                'p99_ms': round(percentile(latencies, 99), 3),
+                'max_ms': round(max(latencies), 3),
+                'mean_ms': round(sum(latencies) / len(latencies), 3),
+                'bytes': sum(row[5] for row in rows),
+            }
+
+        return {
+            'elapsed_s': round(elapsed, 3),
+            'total': summary(results),
+            'routes': {
+                f'{method} {route}': summary(rows)
+                for (route, method), rows in sorted(routes.items(), key=lambda item: -len(item[1]))
+            },
+        }
+
+    def write_report(self, report):
+        self.stdout.write(
+            f"\n{'route':<48} {'reqs':>6} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9} {'5xx':>5} {'fail':>5} {'chg':>5}"
+        )
+        for name, row in [*report['routes'].items(), ('total', report['total'])]:
+            line = (
+                f"{name[:48]:<48} {row['requests']:>6} {row['req_per_s']:>8.1f} {row['p50_ms']:>9.2f} {row['p95_ms']:>9.2f} "
+                f"{row['p99_ms']:>9.2f} {row['max_ms']:>9.2f} {row['errors']:>5} {row['failed']:>5} {row['status_changed']:>5}"
+            )
+            self.stdout.write(self.style.WARNING(line) if row['errors'] or row['failed'] else line)
+        self.stdout.write(f"\n{report['total']['requests']} requests in {report['elapsed_s']:.1f}s")
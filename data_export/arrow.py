@@ -0,0 +1,161 @@
+"""
+Arrow record batches of a tenant's report tables.
+
+Rows are read with ``values_list().iterator()`` (a named server-side cursor
+on PostgreSQL) and turned into one ``RecordBatch`` per ``batch_size`` rows,
+so memory is bounded by the batch size whatever the table size.  Column types
+come from the model fields; DecimalFields become ``decimal128`` with the
+field's precision and scale, so amounts arrive exactly as stored instead of
+going through ``float()`` as in the JSON APIs.
+
+Decimal columns are selected as text and parsed by Arrow: building a Python
+Decimal per value costs more than the rest of the export together.
+
+Needs ``pyarrow``; ``pa`` is None when it is not installed.
+"""
+from itertools import islice
+
+from django.conf import settings
+from django.db.models import TextField
+from django.db.models.functions import Cast
+
+from app1.models import AccLedgers
+from salestoday_purchasetoday.models import PurchaseToday, SalesToday
+from stock_report.models import StockReport
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+DATASETS = {
+    'stock': StockReport,
+    'sales': SalesToday,
+    'purchases': PurchaseToday,
+    'ledger': AccLedgers,
+}
+
+FILE_FORMATS = ('arrow', 'parquet')
+
+STREAM_CONTENT_TYPE = 'application/vnd.apache.arrow.stream'
+
+
+def default_batch_size():
+    return getattr(settings, 'EXPORT_BATCH_SIZE', 50000)
+
+
+def _arrow_type(field):
+    internal_type = field.get_internal_type()
+    if internal_type == 'DecimalField':
+        return pa.decimal128(field.max_digits, field.decimal_places)
+    if internal_type in ('CharField', 'TextField', 'EmailField', 'SlugField', 'URLField', 'UUIDField'):
+        return pa.string()
+    if internal_type in ('AutoField', 'IntegerField', 'PositiveIntegerField'):
+        return pa.int32()
+    if internal_type in ('BigAutoField', 'BigIntegerField', 'PositiveBigIntegerField'):
+        return pa.int64()
+    if internal_type in ('SmallAutoField', 'SmallIntegerField', 'PositiveSmallIntegerField'):
+        return pa.int16()
+    if internal_type == 'FloatField':
+        return pa.float64()
+    if internal_type == 'BooleanField':
+        return pa.bool_()
+    if internal_type == 'DateField':
+        return pa.date32()
+    if internal_type == 'DateTimeField':
+        return pa.timestamp('us', tz='UTC' if settings.USE_TZ else None)
+    if internal_type == 'TimeField':
+        return pa.time64('us')
+    raise ValueError(f"No Arrow type for {field.model.__name__}.{field.name} ({internal_type})")
+
+
+def dataset_fields(dataset):
+    """Exported model fields of ``dataset``: every column except client_id"""
+    return [field for field in DATASETS[dataset]._meta.concrete_fields if field.name != 'client_id']
+
+
+def dataset_schema(dataset):
+    # Only the primary key is declared non-null: the synced tables are written
+    # by the desktop app and do not always honour the model's null=False
+    return pa.schema(
+        [pa.field(field.column, _arrow_type(field), nullable=not field.primary_key) for field in dataset_fields(dataset)],
+        metadata={'dataset': dataset, 'table': DATASETS[dataset]._meta.db_table},
+    )
+
+
+def iter_batches(dataset, client_id, batch_size=None):
+    """Yield the tenant's rows of ``dataset`` as RecordBatches of at most ``batch_size`` rows, by primary key."""
+    batch_size = batch_size or default_batch_size()
+    schema = dataset_schema(dataset)
+    fields = dataset_fields(dataset)
+    decimals = {field.name for field in fields if field.get_internal_type() == 'DecimalField'}
+    queryset = DATASETS[dataset].objects.filter(client_id=client_id).order_by('pk')
+    if decimals:
+        queryset = queryset.annotate(**{f'{name}_as_text': Cast(name, TextField()) for name in decimals})
+    columns = [f'{field.name}_as_text' if field.name in decimals else field.name for field in fields]
+    as_text = [field.name in decimals for field in fields]
+
+    rows = queryset.values_list(*columns).iterator(chunk_size=batch_size)
+    while True:
+        chunk = list(islice(rows, batch_size))
+        if not chunk:
+            break
+        arrays = []
+        for values, column, text in zip(zip(*chunk), schema, as_text):
+            if text:
+                arrays.append(pa.array(values, type=pa.string()).cast(column.type))
+            else:
+                arrays.append(pa.array(values, type=column.type))
+        yield pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+class _ChunkSink:
+    """Write-only file object that keeps what is written until ``drain()``"""
+
+    closed = False
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def iter_ipc_stream(dataset, client_id, batch_size=None):
+    """Bytes of an Arrow IPC stream of ``dataset``, one piece per record batch"""
+    sink = _ChunkSink()
+    with pa.ipc.new_stream(sink, dataset_schema(dataset)) as writer:
+        yield sink.drain()
+        for batch in iter_batches(dataset, client_id, batch_size):
+            writer.write_batch(batch)
+            yield sink.drain()
+    # End-of-stream marker written on close
+    yield sink.drain()
+
+
+def write_file(dataset, client_id, path, file_format='parquet', batch_size=None):
+    """Write ``dataset`` to ``path`` as Parquet (one row group per batch) or an Arrow IPC file; returns the row count."""
+    schema = dataset_schema(dataset)
+    if file_format == 'parquet':
+        writer = pq.ParquetWriter(path, schema, compression='zstd')
+    else:
+        writer = pa.ipc.new_file(path, schema)
+    rows = 0
+    with writer:
+        for batch in iter_batches(dataset, client_id, batch_size):
+            writer.write_batch(batch)
+            rows += batch.num_rows
+    return rows
@@ -0,0 +1,33 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from data_export import arrow
+
+
+class Command(BaseCommand):
+    help = "Write a tenant's stock / sales / purchases / ledger rows to Parquet or Arrow IPC files"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--client', required=True, help="Client id to export")
+        parser.add_argument('--dataset', action='append', dest='datasets', choices=list(arrow.DATASETS),
+                            help="Dataset to export (repeatable); defaults to all of them")
+        parser.add_argument('--format', default='parquet', choices=arrow.FILE_FORMATS, dest='file_format')
+        parser.add_argument('--output-dir', default='.', help="Directory the files are written to")
+        parser.add_argument('--batch-size', type=int, help="Rows per record batch / Parquet row group")
+
+    def handle(self, *args, **options):
+        if arrow.pa is None:
+            raise CommandError("export_dataset requires the pyarrow package")
+
+        os.makedirs(options['output_dir'], exist_ok=True)
+        extension = 'parquet' if options['file_format'] == 'parquet' else 'arrow'
+        for dataset in options['datasets'] or arrow.DATASETS:
+            path = os.path.join(options['output_dir'], f"{dataset}-{options['client']}.{extension}")
+            start = time.perf_counter()
+            rows = arrow.write_file(dataset, options['client'], path, options['file_format'], options['batch_size'])
+            elapsed = time.perf_counter() - start
+            self.stdout.write(
+                f"{dataset}: {rows} rows -> {path} ({os.path.getsize(path)} bytes, {elapsed:.2f}s)"
+            )
@@ -0,0 +1,38 @@
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from rest_framework.decorators import api_view
+from rest_framework.response import Response
+
+from task_backend.authentication import get_client_from_token
+from . import arrow
+
+
+@api_view(['GET'])
+def export_dataset(request, dataset):
+    """
+    The tenant's ``dataset`` (see arrow.DATASETS) as an Arrow IPC stream,
+    one record batch per ``?batch_size=`` rows.
+    """
+    client_id = get_client_from_token(request)
+
+    if not client_id:
+        return Response({'success': False, 'error': 'Invalid or missing token'}, status=401)
+
+    if dataset not in arrow.DATASETS:
+        return Response({'success': False, 'error': f"dataset must be one of: {', '.join(arrow.DATASETS)}"}, status=404)
+
+    if arrow.pa is None:
+        return Response({'success': False, 'error': 'Arrow export is not available on this server (pyarrow is not installed)'}, status=501)
+
+    try:
+        batch_size = int(request.GET.get('batch_size') or arrow.default_batch_size())
+        if not 1 <= batch_size <= 1000000:
+            raise ValueError
+    except ValueError:
+        return Response({'success': False, 'error': 'batch_size must be between 1 and 1000000'}, status=400)
+
+    response = StreamingHttpResponse(arrow.iter_ipc_stream(dataset, client_id, batch_size), content_type=arrow.STREAM_CONTENT_TYPE)
+    filename = f'{dataset}-{client_id}-{timezone.localdate().isoformat()}.arrows'
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -10,6 +10,9 @@ class EventLog(models.Model):
 
     class Meta:
         db_table = "eventlog"
+        indexes = [
+            models.Index(fields=["client_id", "id"], name="idx_eventlog_client_id"),
+        ]
 
     def __str__(self):
         return f"{self.uid} - {self.sevent}"
@@ -1,3 +1,83 @@
-from django.test import TestCase
+import json
+import tempfile
+import tracemalloc
+from datetime import date, datetime, time, timedelta
 
-# Create your tests here.
+import jwt
+from django.conf import settings
+from django.test import TestCase, override_settings
+
+from .models import EventLog
+
+
+def bearer(client_id):
+    token = jwt.encode({
+        'client_id': client_id, 'username': 'tester', 'role': 'Admin',
+        'exp': datetime.utcnow() + timedelta(hours=1),
+    }, settings.SECRET_KEY, algorithm='HS256')
+    return {'HTTP_AUTHORIZATION': f'Bearer {token}'}
+
+
+@override_settings(STREAM_CHUNK_SIZE=500, REPORT_CACHE={'ENABLED': False})
+class EventLogStreamingTests(TestCase):
+    client_id = 'T001'
+    path = '/api/get-eventlog/'
+
+    def add_rows(self, count):
+        start = EventLog.objects.count()
+        EventLog.objects.bulk_create([
+            EventLog(
+                client_id=self.client_id, uid=f'U{i % 40:02d}',
+                edate=date(2026, 1, 1) + timedelta(days=i % 365), etime=time(i % 24, i % 60),
+                sevent=f'Invoice {i:07d} saved by counter {i % 9}',
+            )
+            for i in range(start, start + count)
+        ], batch_size=2000)
+
+    def request(self, query):
+        """(response, body, peak traced bytes) of one request, body read to the end"""
+        with tempfile.TemporaryFile() as spool:
+            tracemalloc.start()
+            try:
+                response = self.client.get(self.path + query, **bearer(self.client_id))
+                # Spooled, so the chunks read are not held in traced memory
+                for chunk in (response.streaming_content if response.streaming else [response.content]):
+                    spool.write(chunk)
+                peak = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+            spool.seek(0)
+            return response, spool.read(), peak
+
+    def test_streamed_memory_does_not_grow_with_rows(self):
+        # Warm up: imports and caches of the first request are not the view's
+        self.add_rows(10)
+        self.request('?stream=json')
+
+        self.add_rows(2000 - 10)
+        _, small_body, small_peak = self.request('?stream=json')
+        self.assertEqual(json.loads(small_body)['count'], 2000)
+
+        self.add_rows(20000 - 2000)
+        response, body, peak = self.request('?stream=json')
+        data = json.loads(body)
+        self.assertTrue(response.streaming)
+        self.assertEqual(data['count'], 20000)
+        self.assertEqual(len(data['data']), 20000)
+        # Ten times the rows and body, about the same peak
+        self.assertGreater(len(body), 9 * len(small_body))
+        self.assertLess(peak, small_peak * 1.5 + 256 * 1024)
+
+        # The list-then-render path holds every row at once
+        _, listed, list_peak = self.request('')
+        self.assertEqual(json.loads(listed)['count'], 20000)
+        self.assertGreater(list_peak, 5 * peak)
+
+    def test_ndjson_lines(self):
+        self.add_rows(1200)
+        response, body, _ = self.request('?stream=ndjson')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        lines = body.splitlines()
+        self.assertEqual(len(lines), 1200)
+        # Newest first, as in the list response
+        self.assertEqual(json.loads(lines[0])['sevent'], 'Invoice 0001199 saved by counter 2')
@@ -1,43 +1,47 @@
+from django.views.decorators.http import condition
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
 from .models import EventLog
-import jwt
-from django.conf import settings
+from task_backend.authentication import get_client_from_token
+from task_backend.report_cache import cache_report
+from task_backend.bulk import iter_values
+from task_backend.streaming import stream_mode, stream_response
+from task_backend.conditional import tenant_etag
+from task_backend.delta import delta_queryset, delta_response, parse_delta
 
-
-def get_client_from_token(request):
-    auth = request.headers.get("Authorization")
-
-    if not auth or not auth.startswith("Bearer "):
-        return None
-
-    token = auth.split(" ")[1]
-
-    try:
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=["HS256"])
-        return payload.get("client_id")
-    except Exception:
-        return None
+EVENTLOG_FIELDS = ("uid", "edate", "etime", "sevent")
 
 
+@condition(etag_func=tenant_etag())
 @api_view(["GET"])
+@cache_report
 def get_eventlog(request):
     client_id = get_client_from_token(request)
 
     if not client_id:
         return Response({"error": "Invalid or missing token"}, status=401)
 
+    try:
+        mode = stream_mode(request)
+        delta = parse_delta(request)
+        if delta and mode:
+            raise ValueError("since_id / since cannot be combined with stream")
+    except ValueError as e:
+        return Response({"error": str(e)}, status=400)
+
+    if delta:
+        # ?since_id= / ?since=: only the rows after the client's watermark
+        qs = delta_queryset(EventLog.objects.filter(client_id=client_id), delta, timestamp=("edate", "etime"))
+        return delta_response(iter_values(qs, ("id",) + EVENTLOG_FIELDS), delta, client_id=client_id)
+
     qs = EventLog.objects.filter(client_id=client_id).order_by("-id")
 
-    data = [
-        {
-            "uid": i.uid,
-            "edate": i.edate,
-            "etime": i.etime,
-            "sevent": i.sevent
-        }
-        for i in qs
-    ]
+    rows = iter_values(qs, EVENTLOG_FIELDS)
+
+    if mode:
+        return stream_response(rows, mode, {"client_id": client_id}, count_key="count")
+
+    data = list(rows)
 
     return Response({
         "success": True,
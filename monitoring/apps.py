@@ -0,0 +1,12 @@
+from django.apps import AppConfig
+
+
+class MonitoringConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'monitoring'
+
+    def ready(self):
+        from . import slowlog
+
+        if slowlog.slow_query_settings()['ENABLED']:
+            slowlog.install()
@@ -0,0 +1,125 @@
+import glob
+import json
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from monitoring.slowlog import store_path
+
+SORT_KEYS = {
+    'total': lambda e: e['total_ms'],
+    'mean': lambda e: e['total_ms'] / e['calls'],
+    'max': lambda e: e['max_ms'],
+    'calls': lambda e: e['calls'],
+    'slow': lambda e: e['slow_calls'],
+}
+
+# A sequential scan discarding this many rows, and most of what it reads,
+# is worth an index on its filter columns
+SEQ_SCAN_REMOVED = 1000
+
+
+def merge(paths):
+    """Entries of every process file, added up per fingerprint"""
+    merged = {}
+    for path in paths:
+        try:
+            with open(path) as f:
+                entries = json.load(f)['entries']
+        except (OSError, ValueError, KeyError):
+            continue
+        for entry in entries:
+            total = merged.get(entry['fingerprint'])
+            if total is None:
+                merged[entry['fingerprint']] = dict(entry)
+                continue
+            for key in ('calls', 'total_ms', 'rows', 'slow_calls'):
+                total[key] += entry[key]
+            total['max_ms'] = max(total['max_ms'], entry['max_ms'])
+            if total['plan'] in (None, 'pending'):
+                total['plan'] = entry['plan']
+            if entry['sample'] and (not total['sample'] or entry['sample']['ms'] > total['sample']['ms']):
+                total['sample'] = entry['sample']
+    return list(merged.values())
+
+
+def format_plan(plan):
+    """Indented lines for an EXPLAIN (FORMAT JSON) plan, or SQLite plan lines"""
+    if isinstance(plan, str):
+        return [plan]
+    if plan and isinstance(plan[0], str):
+        return plan
+    top = plan[0]
+    lines = []
+
+    def node(n, depth):
+        label = n['Node Type']
+        if 'Relation Name' in n:
+            label += f" on {n['Relation Name']}"
+        if 'Index Name' in n:
+            label += f" using {n['Index Name']}"
+        label += (
+            f"  (rows={n.get('Actual Rows')} loops={n.get('Actual Loops')} "
+            f"time={n.get('Actual Total Time')} ms shared hit={n.get('Shared Hit Blocks', 0)} "
+            f"read={n.get('Shared Read Blocks', 0)})"
+        )
+        pad = '  ' * depth
+        lines.append(pad + label)
+        for key in ('Index Cond', 'Filter', 'Join Filter', 'Hash Cond', 'Sort Key'):
+            if key in n:
+                value = ', '.join(n[key]) if isinstance(n[key], list) else n[key]
+                lines.append(f"{pad}    {key}: {value}")
+        removed = n.get('Rows Removed by Filter', 0)
+        if removed:
+            lines.append(f"{pad}    Rows Removed by Filter: {removed}")
+        if n['Node Type'] == 'Seq Scan' and removed >= SEQ_SCAN_REMOVED and removed > 10 * (n.get('Actual Rows') or 0):
+            lines.append(f"{pad}    ^ sequential scan discarding {removed} rows: candidate for an index on the filter columns")
+        for child in n.get('Plans', ()):
+            node(child, depth + 1)
+
+    node(top['Plan'], 0)
+    lines.append(f"Planning {top.get('Planning Time')} ms, execution {top.get('Execution Time')} ms")
+    return lines
+
+
+class Command(BaseCommand):
+    help = "Top SQL statements by time from the slow-query log (SLOW_QUERIES), with their EXPLAIN plans"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=20, help="Statements to show")
+        parser.add_argument('--sort', default='total', choices=list(SORT_KEYS))
+        parser.add_argument('--path', help="Directory of the per-process files (default SLOW_QUERIES['PATH'])")
+        parser.add_argument('--no-plans', action='store_true', help="Leave out the plans")
+        parser.add_argument('--json', action='store_true', help="Print the merged entries as JSON")
+        parser.add_argument('--clear', action='store_true', help="Delete the per-process files and exit")
+
+    def handle(self, *args, **options):
+        path = options['path'] or store_path()
+        paths = glob.glob(os.path.join(path, '*.json'))
+        if options['clear']:
+            for p in paths:
+                os.remove(p)
+            self.stdout.write(f"Removed {len(paths)} file(s) from {path}")
+            return
+        if not paths:
+            raise CommandError(f"No slow-query files in {path}; is SLOW_QUERIES['ENABLED'] on?")
+
+        entries = sorted(merge(paths), key=SORT_KEYS[options['sort']], reverse=True)[:options['top']]
+        if options['json']:
+            self.stdout.write(json.dumps(entries, indent=2, default=str))
+            return
+
+        self.stdout.write(f"{len(paths)} process file(s) in {path}, top {len(entries)} by {options['sort']}\n")
+        for rank, entry in enumerate(entries, 1):
+            self.stdout.write(
+                f"#{rank}  calls={entry['calls']} total={entry['total_ms']:.1f} ms "
+                f"mean={entry['total_ms'] / entry['calls']:.2f} ms max={entry['max_ms']:.1f} ms "
+                f"slow={entry['slow_calls']} rows={entry['rows']}"
+            )
+            self.stdout.write(f"    {entry['fingerprint'][:500]}")
+            if entry['sample']:
+                self.stdout.write(f"    slowest sample: {entry['sample']['ms']} ms, params {entry['sample']['params']}")
+            if not options['no_plans'] and entry['plan'] not in (None, 'pending'):
+                for line in format_plan(entry['plan']):
+                    self.stdout.write(f"    | {line}")
+            self.stdout.write('')
@@ -0,0 +1,308 @@
+"""
+Per-request database and response statistics.
+
+``QueryStatsMiddleware`` records for every request
+
+- the number of SQL statements, their total time and the rows they returned
+  (the driver's rowcount; SQLite and server-side cursors do not report it);
+- how often each SQL fingerprint (the statement with literals and IN lists
+  collapsed) ran; ``N_PLUS_ONE`` or more runs of one fingerprint are flagged
+  as an N+1 pattern;
+- serialization time (rendering a DRF Response) and response size.
+
+They are added to a per-route report kept in this process (``report()``,
+served by monitoring/views.py to holders of the metrics token) and, with
+``HEADER`` on, sent back in ``X-Query-Stats`` and ``Server-Timing`` headers.  A request over its route's budget in
+``QUERY_STATS['BUDGETS']`` logs a warning.  The same middleware feeds the
+cross-process Prometheus metrics (monitoring/metrics.py) when ``METRICS``
+is enabled.
+
+Statements are counted on every connection opened in the request's context,
+including the worker threads of sync_to_async, so the async views' queries
+count too.  Streaming responses are added to the report once the last chunk
+has been sent.
+"""
+import contextvars
+import logging
+import re
+import threading
+import time
+from collections import Counter
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+_LITERAL = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_IN_LIST = re.compile(r"\(\s*(?:%s|\?)(?:\s*,\s*(?:%s|\?))*\s*\)")
+_SPACE = re.compile(r'\s+')
+
+
+def query_stats_settings():
+    return {
+        'ENABLED': True,
+        'HEADER': False,
+        'N_PLUS_ONE': 5,
+        'BUDGETS': {},
+        **getattr(settings, 'QUERY_STATS', {}),
+    }
+
+
+def fingerprint(sql):
+    """``sql`` with literals as ? and IN lists as (...), whitespace collapsed"""
+    sql = _LITERAL.sub('?', sql)
+    sql = _IN_LIST.sub('(...)', sql)
+    return _SPACE.sub(' ', sql).strip()
+
+
+class RequestStats:
+    def __init__(self, fingerprints=True):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.rows = 0
+        self.fingerprints = Counter()
+        self._fingerprint = fingerprints
+        self.serialize_seconds = 0.0
+        self.response_bytes = None
+        self.finished = False
+        self._lock = threading.Lock()
+
+    def record(self, sql, seconds, rows):
+        key = fingerprint(sql) if self._fingerprint else None
+        with self._lock:
+            if self.finished:
+                return
+            self.queries += 1
+            self.db_seconds += seconds
+            self.rows += max(rows, 0)
+            if key is not None:
+                self.fingerprints[key] += 1
+
+    def n_plus_one(self, threshold):
+        """{fingerprint: runs} of the statements run ``threshold`` times or more"""
+        return {sql: count for sql, count in self.fingerprints.most_common() if count >= threshold}
+
+    def header(self):
+        return '; '.join([
+            f'queries={self.queries}',
+            f'db_ms={self.db_seconds * 1000:.2f}',
+            f'rows={self.rows}',
+            f'serialize_ms={self.serialize_seconds * 1000:.2f}',
+            *([f'bytes={self.response_bytes}'] if self.response_bytes is not None else []),
+            f'n_plus_one={len(self.n_plus_one(query_stats_settings()["N_PLUS_ONE"]))}',
+        ])
+
+
+_current = contextvars.ContextVar('query_stats', default=None)
+
+
+def request_stats():
+    """RequestStats of the last request started in this context, also once it has finished"""
+    return _current.get()
+
+
+def _record_query(execute, sql, params, many, context):
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.record(sql, time.perf_counter() - start, getattr(context['cursor'], 'rowcount', -1))
+
+
+def _install(connection):
+    if _record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_record_query)
+
+
+def _on_connection_created(sender, connection, **kwargs):
+    _install(connection)
+
+
+connection_created.connect(_on_connection_created)
+
+# Threads whose connections opened before this module was imported have
+# been given the wrapper; later ones get it from connection_created
+_swept = threading.local()
+
+
+# ---- Per-route report ----
+
+_report = {}
+_report_lock = threading.Lock()
+
+
+def _budget_for(route, url_name):
+    budgets = query_stats_settings()['BUDGETS']
+    return {**budgets.get('default', {}), **budgets.get(route, {}), **budgets.get(url_name, {})}
+
+
+def _finish(stats, route, url_name, method, status):
+    with stats._lock:
+        stats.finished = True
+    if metrics.metrics_settings()['ENABLED']:
+        metrics.record(
+            url_name or route, method, status, time.perf_counter() - stats.started,
+            stats.db_seconds, stats.queries, stats.response_bytes or 0,
+        )
+    config = query_stats_settings()
+    if not config['ENABLED']:
+        return
+    n_plus_one = stats.n_plus_one(config['N_PLUS_ONE'])
+
+    measured = {
+        'queries': stats.queries,
+        'db_ms': stats.db_seconds * 1000,
+        'rows': stats.rows,
+        'serialize_ms': stats.serialize_seconds * 1000,
+        'bytes': stats.response_bytes or 0,
+    }
+    over = {name: limit for name, limit in _budget_for(route, url_name).items() if measured.get(name, 0) > limit}
+    if over:
+        logger.warning(
+            "%s %s over budget: %s%s", method, route,
+            ', '.join(f'{name} {measured[name]:.0f} > {limit}' for name, limit in over.items()),
+            ''.join(f'\n  {count}x {sql[:200]}' for sql, count in n_plus_one.items()),
+        )
+
+    with _report_lock:
+        entry = _report.setdefault(route, {
+            'requests': 0, 'queries': 0, 'max_queries': 0, 'db_ms': 0.0, 'max_db_ms': 0.0,
+            'rows': 0, 'serialize_ms': 0.0, 'bytes': 0, 'over_budget': 0, 'n_plus_one': Counter(),
+        })
+        entry['requests'] += 1
+        entry['queries'] += stats.queries
+        entry['max_queries'] = max(entry['max_queries'], stats.queries)
+        entry['db_ms'] += measured['db_ms']
+        entry['max_db_ms'] = max(entry['max_db_ms'], measured['db_ms'])
+        entry['rows'] += stats.rows
+        entry['serialize_ms'] += measured['serialize_ms']
+        entry['bytes'] += measured['bytes']
+        entry['over_budget'] += bool(over)
+        entry['n_plus_one'].update(n_plus_one.keys())
+
+
+def report():
+    """Per-route averages and maxima since the process started (or reset()), busiest DB time first"""
+    with _report_lock:
+        entries = {route: {**entry, 'n_plus_one': Counter(entry['n_plus_one'])} for route, entry in _report.items()}
+    routes = []
+    for route, entry in sorted(entries.items(), key=lambda item: -item[1]['db_ms']):
+        count = entry['requests']
+        routes.append({
+            'route': route,
+            'requests': count,
+            'avg_queries': round(entry['queries'] / count, 2),
+            'max_queries': entry['max_queries'],
+            'avg_db_ms': round(entry['db_ms'] / count, 2),
+            'max_db_ms': round(entry['max_db_ms'], 2),
+            'avg_rows': round(entry['rows'] / count, 1),
+            'avg_serialize_ms': round(entry['serialize_ms'] / count, 2),
+            'avg_bytes': round(entry['bytes'] / count),
+            'over_budget': entry['over_budget'],
+            # Fingerprint: number of requests in which it repeated
+            'n_plus_one': dict(entry['n_plus_one'].most_common(5)),
+        })
+    return routes
+
+
+def reset():
+    with _report_lock:
+        _report.clear()
+
+
+# ---- Middleware ----
+
+class QueryStatsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        stats = self._start(request)
+        if stats is None:
+            return self.get_response(request)
+        return self._end(request, self.get_response(request), stats)
+
+    async def __acall__(self, request):
+        stats = self._start(request)
+        if stats is None:
+            return await self.get_response(request)
+        return self._end(request, await self.get_response(request), stats)
+
+    def process_template_response(self, request, response):
+        # Called just before a DRF Response is rendered
+        request._query_stats_render_start = time.perf_counter()
+        return response
+
+    def _start(self, request):
+        query_stats = query_stats_settings()['ENABLED']
+        if not query_stats and not metrics.metrics_settings()['ENABLED']:
+            return None
+        if not getattr(_swept, 'done', False):
+            for connection in connections.all(initialized_only=True):
+                _install(connection)
+            _swept.done = True
+        stats = RequestStats(fingerprints=query_stats)
+        # Left set after the response, so the queries of a streaming
+        # response's iterator still count
+        _current.set(stats)
+        return stats
+
+    def _end(self, request, response, stats):
+        render_start = getattr(request, '_query_stats_render_start', None)
+        if render_start is not None:
+            stats.serialize_seconds = time.perf_counter() - render_start
+        match = request.resolver_match
+        # Unresolved paths (404s) must not each become a route of their own
+        route = match.route if match else 'unmatched'
+        url_name = match.url_name if match else None
+        finish = (stats, route, url_name, request.method, response.status_code)
+
+        if not response.streaming:
+            stats.response_bytes = len(response.content)
+        # A streaming response's header covers only what ran before its first chunk
+        config = query_stats_settings()
+        if config['ENABLED'] and config['HEADER']:
+            response['X-Query-Stats'] = stats.header()
+            response['Server-Timing'] = f'db;dur={stats.db_seconds * 1000:.2f};desc="{stats.queries} queries", serialize;dur={stats.serialize_seconds * 1000:.2f}'
+        if response.streaming:
+            response.streaming_content = self._count_stream(response.streaming_content, finish)
+        else:
+            _finish(*finish)
+        return response
+
+    def _count_stream(self, content, finish):
+        stats = finish[0]
+        stats.response_bytes = 0
+        if hasattr(content, '__aiter__'):
+            async def counted():
+                try:
+                    async for chunk in content:
+                        stats.response_bytes += len(chunk)
+                        yield chunk
+                finally:
+                    _finish(*finish)
+        else:
+            def counted():
+                try:
+                    for chunk in content:
+                        stats.response_bytes += len(chunk)
+                        yield chunk
+                finally:
+                    _finish(*finish)
+        return counted()
@@ -0,0 +1,209 @@
+"""
+Opt-in slow-query log (``SLOW_QUERIES['ENABLED']``).
+
+Every statement is fingerprinted (querystats.fingerprint) and its calls,
+total / max time and rows are added up per fingerprint.  The first time a
+SELECT of a fingerprint takes longer than ``THRESHOLD_MS``, it is run again
+under ``EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON)`` with the same parameters
+on the same connection (``EXPLAIN QUERY PLAN`` on SQLite) and the plan is
+kept with the fingerprint.  Other statements are never explained: ANALYZE
+would execute them a second time.
+
+Bind parameters can hold passwords and personal data, so samples keep only
+their types and lengths, and quoted literals in the plans are masked, unless
+``PARAMS`` is on.
+
+EXPLAIN needs nothing beyond the SELECT privilege the query already had, so
+this works where pg_stat_statements / auto_explain cannot be installed.
+
+At most ``MAX_FINGERPRINTS`` are kept per process; when full, the one with
+the least total time makes room.  Each process writes its store to
+``PATH/<pid>.json`` every ``FLUSH_INTERVAL`` seconds and at exit;
+``manage.py slow_queries`` merges those files.
+"""
+import atexit
+import json
+import logging
+import os
+import re
+import threading
+import time
+
+from django.conf import settings
+from django.db.backends.signals import connection_created
+
+from .querystats import fingerprint
+
+logger = logging.getLogger(__name__)
+
+_QUOTED = re.compile(r"'(?:[^']|'')*'")
+
+
+def slow_query_settings():
+    return {
+        'ENABLED': False,
+        'THRESHOLD_MS': 200,
+        'EXPLAIN': True,
+        'PARAMS': False,
+        'MAX_FINGERPRINTS': 500,
+        'PATH': None,
+        'FLUSH_INTERVAL': 30,
+        **getattr(settings, 'SLOW_QUERIES', {}),
+    }
+
+
+class SlowQueryStore:
+    def __init__(self, max_fingerprints, threshold_ms, explain, params=False):
+        self.max_fingerprints = max_fingerprints
+        self.threshold = threshold_ms / 1000
+        self.explain = explain
+        self.params = params
+        self.entries = {}
+        self._lock = threading.Lock()
+
+    def record(self, connection, sql, params, seconds, rows):
+        key = fingerprint(sql)
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                if len(self.entries) >= self.max_fingerprints:
+                    del self.entries[min(self.entries, key=lambda k: self.entries[k]['total_ms'])]
+                entry = self.entries[key] = {
+                    'fingerprint': key, 'vendor': connection.vendor, 'calls': 0, 'total_ms': 0.0,
+                    'max_ms': 0.0, 'rows': 0, 'slow_calls': 0, 'sample': None, 'plan': None,
+                }
+            entry['calls'] += 1
+            entry['total_ms'] += seconds * 1000
+            entry['max_ms'] = max(entry['max_ms'], seconds * 1000)
+            entry['rows'] += max(rows, 0)
+            if seconds < self.threshold:
+                return
+            entry['slow_calls'] += 1
+            # Claim the EXPLAIN for this fingerprint before running it
+            explain = self.explain and entry['plan'] is None and sql.lstrip()[:6].upper() == 'SELECT'
+            if explain:
+                entry['plan'] = 'pending'
+            entry['sample'] = {'sql': sql, 'params': _jsonable(params, self.params), 'ms': round(seconds * 1000, 2)}
+        if explain:
+            plan = explain_plan(connection, sql, params)
+            if not self.params:
+                plan = _mask_literals(plan)
+            with self._lock:
+                entry['plan'] = plan
+
+    def snapshot(self):
+        with self._lock:
+            return [dict(entry) for entry in self.entries.values()]
+
+
+def _describe(value):
+    """'str[8]', 'int', ...: the type of a parameter, and its length when it has one"""
+    if isinstance(value, (str, bytes, list, tuple)):
+        return f'{type(value).__name__}[{len(value)}]'
+    return type(value).__name__
+
+
+def _jsonable(params, raw=False):
+    """``params`` as strings when ``raw``, otherwise as their types and lengths"""
+    if params is None:
+        return None
+    show = str if raw else _describe
+    if isinstance(params, dict):
+        return {k: show(v) for k, v in params.items()}
+    return [show(v) for v in params]
+
+
+def _mask_literals(plan):
+    """``plan`` with the quoted literals of its conditions replaced by '?'"""
+    if isinstance(plan, str):
+        return _QUOTED.sub("'?'", plan)
+    if isinstance(plan, list):
+        return [_mask_literals(item) for item in plan]
+    if isinstance(plan, dict):
+        return {key: _mask_literals(value) for key, value in plan.items()}
+    return plan
+
+
+def explain_plan(connection, sql, params):
+    """
+    The plan of ``sql`` on ``connection`` as JSON (PostgreSQL) or a list of
+    lines (SQLite); an error message when it cannot be explained.  Runs on a
+    raw cursor, outside the execute wrappers, inside a savepoint when in a
+    transaction so a failure does not abort it.
+    """
+    if connection.vendor == 'postgresql':
+        explain = 'EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) '
+    elif connection.vendor == 'sqlite':
+        explain = 'EXPLAIN QUERY PLAN '
+    else:
+        return f'EXPLAIN is not supported on {connection.vendor}'
+    savepoint = connection.vendor == 'postgresql' and not connection.get_autocommit()
+    cursor = connection.create_cursor()
+    try:
+        if savepoint:
+            cursor.execute('SAVEPOINT slow_query_explain')
+        try:
+            cursor.execute(explain + sql, params)
+            rows = cursor.fetchall()
+        except Exception as e:
+            if savepoint:
+                cursor.execute('ROLLBACK TO SAVEPOINT slow_query_explain')
+            return f'EXPLAIN failed: {e}'
+        if savepoint:
+            cursor.execute('RELEASE SAVEPOINT slow_query_explain')
+    finally:
+        cursor.close()
+    if connection.vendor == 'postgresql':
+        plan = rows[0][0]
+        return json.loads(plan) if isinstance(plan, str) else plan
+    return [row[-1] for row in rows]
+
+
+store = None
+_last_flush = 0.0
+
+
+def _record_query(execute, sql, params, many, context):
+    start = time.perf_counter()
+    result = execute(sql, params, many, context)
+    # Failed statements raise above and are not recorded
+    if not many and store is not None:
+        store.record(context['connection'], sql, params, time.perf_counter() - start, getattr(context['cursor'], 'rowcount', -1))
+        if time.monotonic() - _last_flush > slow_query_settings()['FLUSH_INTERVAL']:
+            flush()
+    return result
+
+
+def _on_connection_created(sender, connection, **kwargs):
+    if _record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_record_query)
+
+
+def store_path():
+    return slow_query_settings()['PATH'] or os.path.join(settings.BASE_DIR, 'slow_queries')
+
+
+def flush():
+    """Write this process's store to PATH/<pid>.json"""
+    global _last_flush
+    _last_flush = time.monotonic()
+    if store is None:
+        return
+    path = store_path()
+    try:
+        os.makedirs(path, exist_ok=True)
+        target = os.path.join(path, f'{os.getpid()}.json')
+        with open(target + '.tmp', 'w') as f:
+            json.dump({'pid': os.getpid(), 'written': time.time(), 'entries': store.snapshot()}, f, default=str)
+        os.replace(target + '.tmp', target)
+    except OSError:
+        logger.exception("Could not write the slow-query log to %s", path)
+
+
+def install():
+    """Start recording (called from MonitoringConfig.ready when enabled)"""
+    global store
+    config = slow_query_settings()
+    store = SlowQueryStore(config['MAX_FINGERPRINTS'], config['THRESHOLD_MS'], config['EXPLAIN'], config['PARAMS'])
+    connection_created.connect(_on_connection_created)
+    atexit.register(flush)
@@ -0,0 +1,140 @@
+"""
+Request trace capture for load tests (``TRACE_CAPTURE['ENABLED']``).
+
+``TraceCaptureMiddleware`` appends one JSON line per request to
+``PATH/<pid>.jsonl``: start time, method, path, query string, URL route,
+status, duration and the claims of the bearer token.  The token itself is
+never written, so a trace holds no credential; ``manage.py replay_trace``
+signs the claims again with the local SECRET_KEY.
+
+Request bodies are kept only with ``BODIES`` (up to ``MAX_BODY`` bytes), as
+they can hold customer data.  Paths under ``EXCLUDE`` (login, the event
+stream, metrics) are never recorded.  ``SAMPLE_RATE`` keeps a fraction of the
+requests.  The duration of a streaming response is to its first byte.
+"""
+import json
+import logging
+import os
+import random
+import threading
+import time
+
+import jwt
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from task_backend.authentication import decode_token, get_bearer_token
+
+logger = logging.getLogger(__name__)
+
+# Replaced by fresh values when the trace is replayed
+VOLATILE_CLAIMS = ('exp', 'iat', 'nbf')
+
+
+def trace_settings():
+    return {
+        'ENABLED': False,
+        'PATH': None,
+        'SAMPLE_RATE': 1.0,
+        'BODIES': False,
+        'MAX_BODY': 65536,
+        'EXCLUDE': ['/api/login/', '/api/refresh-events/', '/api/_metrics', '/admin/'],
+        **getattr(settings, 'TRACE_CAPTURE', {}),
+    }
+
+
+def trace_path():
+    return trace_settings()['PATH'] or os.path.join(settings.BASE_DIR, 'traces')
+
+
+class TraceWriter:
+    """Appends lines to this process's trace file; reopened after a fork"""
+
+    def __init__(self):
+        self._file = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def write(self, entry):
+        line = json.dumps(entry, separators=(',', ':'), default=str) + '\n'
+        with self._lock:
+            try:
+                if self._pid != os.getpid():
+                    path = trace_path()
+                    os.makedirs(path, exist_ok=True)
+                    self._file = open(os.path.join(path, f'{os.getpid()}.jsonl'), 'a', buffering=1)
+                    self._pid = os.getpid()
+                self._file.write(line)
+            except OSError:
+                logger.exception("Could not write the request trace to %s", trace_path())
+
+
+writer = TraceWriter()
+
+
+def _claims(request):
+    """(claims, auth) of the request's bearer token; auth is 'none', 'valid' or 'invalid'"""
+    token = get_bearer_token(request)
+    if token is None:
+        return None, 'none'
+    try:
+        payload = decode_token(token)
+    except jwt.InvalidTokenError:
+        return None, 'invalid'
+    return {k: v for k, v in payload.items() if k not in VOLATILE_CLAIMS}, 'valid'
+
+
+class TraceCaptureMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        entry = self._start(request)
+        if entry is None:
+            return self.get_response(request)
+        return self._end(request, self.get_response(request), entry)
+
+    async def __acall__(self, request):
+        entry = self._start(request)
+        if entry is None:
+            return await self.get_response(request)
+        return self._end(request, await self.get_response(request), entry)
+
+    def _start(self, request):
+        config = trace_settings()
+        if not config['ENABLED'] or any(request.path.startswith(prefix) for prefix in config['EXCLUDE']):
+            return None
+        if config['SAMPLE_RATE'] < 1 and random.random() >= config['SAMPLE_RATE']:
+            return None
+        claims, auth = _claims(request)
+        entry = {
+            'ts': round(time.time(), 6),
+            'method': request.method,
+            'path': request.path,
+            'query': request.META.get('QUERY_STRING', ''),
+            'claims': claims,
+            'auth': auth,
+        }
+        if config['BODIES'] and request.method not in ('GET', 'HEAD', 'OPTIONS'):
+            length = int(request.META.get('CONTENT_LENGTH') or 0)
+            if 0 < length <= config['MAX_BODY']:
+                # Read before the view, which then gets the cached body
+                entry['content_type'] = request.content_type
+                entry['body'] = request.body.decode('utf-8', errors='replace')
+        entry['_started'] = time.perf_counter()
+        return entry
+
+    def _end(self, request, response, entry):
+        entry['ms'] = round((time.perf_counter() - entry.pop('_started')) * 1000, 3)
+        match = request.resolver_match
+        entry['route'] = match.route if match else None
+        entry['status'] = response.status_code
+        writer.write(entry)
+        return response
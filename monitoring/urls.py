@@ -0,0 +1,7 @@
+from django.urls import path
+from .views import prometheus_metrics, query_stats
+
+urlpatterns = [
+    path('monitoring/query-stats/', query_stats, name='query_stats'),
+    path('_metrics', prometheus_metrics, name='prometheus_metrics'),
+]
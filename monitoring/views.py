@@ -0,0 +1,48 @@
+from django.http import HttpResponse
+from django.views.decorators.http import require_GET
+from rest_framework.decorators import api_view
+from rest_framework.response import Response
+
+from . import metrics
+from .querystats import query_stats_settings, report, reset
+
+
+@api_view(['GET', 'DELETE'])
+def query_stats(request):
+    """
+    Per-route query counts, DB time, rows, serialization time, response size
+    and N+1 fingerprints of this worker process.  DELETE starts over.
+
+    The report covers every tenant, so it takes the METRICS_TOKEN like
+    /api/_metrics, not a tenant's JWT.
+    """
+    refusal = metrics.token_refusal(request)
+    if refusal == 404:
+        return Response({'success': False, 'error': 'Not found'}, status=404)
+    if refusal:
+        return Response({'success': False, 'error': 'Invalid or missing token'}, status=401)
+
+    if request.method == 'DELETE':
+        reset()
+        return Response({'success': True})
+
+    config = query_stats_settings()
+    return Response({
+        'success': True,
+        'enabled': config['ENABLED'],
+        'n_plus_one_threshold': config['N_PLUS_ONE'],
+        'budgets': config['BUDGETS'],
+        'routes': report(),
+    })
+
+
+@require_GET
+def prometheus_metrics(request):
+    """Request metrics of all workers in the Prometheus text format, for scrapers"""
+    # Scrapers send a static bearer token (METRICS_TOKEN), not a user JWT
+    refusal = metrics.token_refusal(request)
+    if not metrics.metrics_settings()['ENABLED'] or refusal == 404:
+        return HttpResponse('Metrics are disabled\n', status=404, content_type='text/plain')
+    if refusal:
+        return HttpResponse('Unauthorized\n', status=401, content_type='text/plain')
+    return HttpResponse(metrics.render(), content_type=metrics.CONTENT_TYPE)
@@ -0,0 +1,17 @@
+# Generated by Django 5.0.2 on 2026-10-18 14:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pdc', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='pdc',
+            index=models.Index(fields=['client_id', 'id'], name='idx_pdc_client_id'),
+        ),
+    ]
@@ -16,6 +16,9 @@ class PDC(models.Model):
 
     class Meta:
         db_table = "pdc"
+        indexes = [
+            models.Index(fields=["client_id", "id"], name="idx_pdc_client_id"),
+        ]
 
     def __str__(self):
         return f"{self.party} - {self.amount}"
\ No newline at end of file
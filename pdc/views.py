@@ -1,59 +1,52 @@
+from django.views.decorators.http import condition
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
 from .models import PDC
 from app1.models import AccMaster   # ✅ import acc master
-import jwt
-from django.conf import settings
+from task_backend.authentication import get_client_from_token
+from task_backend.bulk import iter_values
+from task_backend.report_cache import cache_report
+from task_backend.conditional import tenant_etag
+from task_backend.delta import delta_queryset, delta_response, parse_delta
 
-
-def get_client_from_token(request):
-    auth = request.headers.get("Authorization")
-
-    if not auth or not auth.startswith("Bearer "):
-        return None
-
-    token = auth.split(" ")[1]
-
-    try:
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=["HS256"])
-        return payload.get("client_id")
-    except Exception:
-        return None
+PDC_FIELDS = ("colndate", "party", "amount", "chequedate", "chequeno", "colnstatus", "status")
 
 
+@condition(etag_func=tenant_etag())
 @api_view(["GET"])
+@cache_report
 def get_pdc(request):
     client_id = get_client_from_token(request)
 
     if not client_id:
         return Response({"error": "Invalid or missing token"}, status=401)
 
-    qs = PDC.objects.filter(client_id=client_id).order_by("-id")
+    qs = PDC.objects.filter(client_id=client_id)
+    try:
+        delta = parse_delta(request)
+        # ?since_id=: only the rows after the client's watermark (PDC rows
+        # carry no timestamp, so ?since= is rejected)
+        qs = delta_queryset(qs, delta) if delta else qs.order_by("-id")
+    except ValueError as e:
+        return Response({"error": str(e)}, status=400)
+
+    fields = ("id",) + PDC_FIELDS if delta else PDC_FIELDS
+    data = list(iter_values(qs, fields, floats=("amount",)))
 
     # ✅ get all party codes
-    party_codes = [i.party for i in qs if i.party]
+    party_codes = {row["party"] for row in data if row["party"]}
 
-    # ✅ fetch account names in single query
-    accounts = AccMaster.objects.filter(
+    # ✅ fetch account names in single query, as a map {code: name}
+    acc_map = dict(AccMaster.objects.filter(
         code__in=party_codes,
         client_id=client_id
-    )
-
-    # ✅ create map {code: name}
-    acc_map = {a.code: a.name for a in accounts}
-
-    data = []
-
-    for i in qs:
-        data.append({
-            "colndate": i.colndate,
-            "party": acc_map.get(i.party, i.party),   # ✅ NAME instead of CODE
-            "amount": i.amount,
-            "chequedate": i.chequedate,
-            "chequeno": i.chequeno,
-            "colnstatus": i.colnstatus,
-            "status": i.status,
-        })
+    ).values_list("code", "name"))
+
+    for row in data:
+        row["party"] = acc_map.get(row["party"], row["party"])   # ✅ NAME instead of CODE
+
+    if delta:
+        return delta_response(data, delta, client_id=client_id)
 
     return Response({
         "success": True,
@@ -0,0 +1,128 @@
+"""
+Sync-completion events for Server-Sent Events clients.
+
+One ``GenerationWatcher`` per worker process polls ``refresh_tag`` for rows
+above the highest id it has seen (a primary-key range scan that returns
+nothing almost every time) and fans every new generation out to the open
+event streams of that tenant.  However many clients are connected, a worker
+issues one such query per ``REFRESH_EVENTS_POLL_INTERVAL`` seconds, and none
+while no stream is open.
+
+The watcher is a daemon thread; each subscription hands events to its own
+event loop with ``call_soon_threadsafe``, so this works under ASGI (one loop
+for all connections) as well as under WSGI (a loop per request).
+"""
+import asyncio
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import close_old_connections, connections, router
+
+from task_backend.report_cache import format_generation
+
+from .models import RefreshTag
+
+logger = logging.getLogger(__name__)
+
+
+class Subscription:
+    """The newest generation not yet sent to one event stream"""
+
+    def __init__(self, client_id, loop):
+        self.client_id = client_id
+        self.loop = loop
+        # Only the latest generation matters, so older ones are replaced
+        self.queue = asyncio.Queue(maxsize=1)
+
+    def _put(self, generation):
+        if self.queue.full():
+            self.queue.get_nowait()
+        self.queue.put_nowait(generation)
+
+    def publish(self, generation):
+        """Thread-safe; returns False when the stream's loop has gone away."""
+        try:
+            self.loop.call_soon_threadsafe(self._put, generation)
+        except RuntimeError:
+            return False
+        return True
+
+
+class GenerationWatcher:
+    def __init__(self, interval):
+        self.interval = interval
+        self.last_id = None
+        self.polls = 0
+        self._subscriptions = {}
+        self._lock = threading.Lock()
+        self._active = threading.Event()
+        self._thread = None
+
+    def subscribe(self, client_id):
+        """Subscription for ``client_id`` bound to the running event loop"""
+        subscription = Subscription(client_id, asyncio.get_running_loop())
+        with self._lock:
+            self._subscriptions.setdefault(client_id, set()).add(subscription)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='refresh-tag-watcher', daemon=True)
+                self._thread.start()
+        self._active.set()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.client_id)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[subscription.client_id]
+            if not self._subscriptions:
+                self._active.clear()
+
+    def subscriber_count(self):
+        with self._lock:
+            return sum(len(subscriptions) for subscriptions in self._subscriptions.values())
+
+    def _run(self):
+        while True:
+            self._active.wait()
+            try:
+                self.poll()
+            except Exception:
+                logger.exception("refresh_tag watcher poll failed")
+                connections[router.db_for_read(RefreshTag)].close()
+            close_old_connections()
+            time.sleep(self.interval)
+
+    def ensure_watermark(self):
+        """
+        Start from the current newest refresh_tag.  Streams call this before
+        reading the tenant's generation, so no sync can land unseen between
+        the two.
+        """
+        with self._lock:
+            if self.last_id is None:
+                self.last_id = RefreshTag.objects.order_by('-id').values_list('id', flat=True).first() or 0
+
+    def poll(self):
+        """Publish the generations of refresh_tag rows newer than the last poll."""
+        self.ensure_watermark()
+        self.polls += 1
+        tags = RefreshTag.objects.filter(id__gt=self.last_id).order_by('id')
+
+        latest = {}
+        for tag_id, client_id, edate, etime in tags.values_list('id', 'client_id', 'edate', 'etime'):
+            latest[client_id] = format_generation(tag_id, edate, etime)
+            self.last_id = tag_id
+
+        for client_id, generation in latest.items():
+            with self._lock:
+                subscriptions = list(self._subscriptions.get(client_id, ()))
+            for subscription in subscriptions:
+                if not subscription.publish(generation):
+                    self.unsubscribe(subscription)
+
+
+watcher = GenerationWatcher(getattr(settings, 'REFRESH_EVENTS_POLL_INTERVAL', 2))
@@ -0,0 +1,17 @@
+# Generated by Django 5.0.2 on 2026-10-18 14:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('refresh_tag', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='refreshtag',
+            index=models.Index(fields=['client_id', 'id'], name='idx_refresh_tag_client_id'),
+        ),
+    ]
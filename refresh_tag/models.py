@@ -13,6 +13,9 @@ class RefreshTag(models.Model):
 
     class Meta:
         db_table = "refresh_tag"
+        indexes = [
+            models.Index(fields=["client_id", "id"], name="idx_refresh_tag_client_id"),
+        ]
 
     def __str__(self):
         return f"{self.userid} - {self.edate}"
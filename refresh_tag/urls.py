@@ -1,6 +1,8 @@
 from django.urls import path
-from .views import get_refresh_tag
+from .views import get_refresh_tag, refresh_events, report_cache_stats
 
 urlpatterns = [
     path('get-refresh-tag/', get_refresh_tag, name='get_refresh_tag'),
+    path('report-cache/stats/', report_cache_stats, name='report_cache_stats'),
+    path('refresh-events/', refresh_events, name='refresh_events'),
 ]
@@ -1,28 +1,32 @@
 from django.shortcuts import render
 
 # Create your views here.
+import asyncio
+import json
+
+import jwt
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import condition, require_GET
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
 from .models import RefreshTag
-import jwt
-from django.conf import settings
-
-
-def get_client_from_token(request):
-    auth = request.headers.get("Authorization")
-
-    if not auth or not auth.startswith("Bearer "):
-        return None
-
-    token = auth.split(" ")[1]
+from monitoring import metrics
+from task_backend.authentication import decode_token, get_bearer_token, get_client_from_token
+from task_backend.bulk import iter_values
+from task_backend.report_cache import cache_stats, sync_generation
+from task_backend.conditional import tenant_etag
+from task_backend.delta import delta_queryset, delta_response, parse_delta
+from task_backend.pooled_postgresql.pool import pool_stats, released
+from task_backend.replicas import replicas
+from .events import watcher
 
-    try:
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=["HS256"])
-        return payload.get("client_id")
-    except Exception:
-        return None
+REFRESH_TAG_FIELDS = ("edate", "etime", "userid", "remark")
 
 
+@condition(etag_func=tenant_etag(RefreshTag))
 @api_view(["GET"])
 def get_refresh_tag(request):
     client_id = get_client_from_token(request)
@@ -30,17 +34,18 @@ def get_refresh_tag(request):
     if not client_id:
         return Response({"error": "Invalid or missing token"}, status=401)
 
+    try:
+        delta = parse_delta(request)
+    except ValueError as e:
+        return Response({"error": str(e)}, status=400)
+
+    if delta:
+        qs = delta_queryset(RefreshTag.objects.filter(client_id=client_id), delta, timestamp="etime")
+        return delta_response(iter_values(qs, ("id",) + REFRESH_TAG_FIELDS), delta, client_id=client_id)
+
     qs = RefreshTag.objects.filter(client_id=client_id).order_by("-id")
 
-    data = [
-        {
-            "edate": i.edate,
-            "etime": i.etime,
-            "userid": i.userid,
-            "remark": i.remark,
-        }
-        for i in qs
-    ]
+    data = list(iter_values(qs, REFRESH_TAG_FIELDS))
 
     return Response({
         "success": True,
@@ -48,3 +53,93 @@ def get_refresh_tag(request):
         "count": len(data),
         "data": data
     })
+
+
+@api_view(["GET"])
+def report_cache_stats(request):
+    """
+    Hit / miss / eviction counters of the report cache in this process, with
+    the pool, replica and event stream state.  They cover every tenant, so
+    the view takes the METRICS_TOKEN like /api/_metrics; ``?client_id=``
+    adds that tenant's sync generation.
+    """
+    refusal = metrics.token_refusal(request)
+    if refusal == 404:
+        return Response({"error": "Not found"}, status=404)
+    if refusal:
+        return Response({"error": "Invalid or missing token"}, status=401)
+
+    client_id = request.GET.get("client_id")
+    return Response({
+        "success": True,
+        "generation": sync_generation(client_id) if client_id else None,
+        "cache": cache_stats(),
+        "events": {"streams": watcher.subscriber_count(), "polls": watcher.polls},
+        "db_pool": pool_stats(),
+        "replicas": replicas.status,
+    })
+
+
+def _sse(event, data, event_id=None):
+    lines = [f"event: {event}"]
+    if event_id:
+        lines.append(f"id: {event_id}")
+    lines.append(f"data: {json.dumps(data)}")
+    return "\n".join(lines) + "\n\n"
+
+
+async def _generation_events(client_id, last_event_id):
+    subscription = watcher.subscribe(client_id)
+    try:
+        # Watermark first, so a sync landing right now is either in the
+        # generation read below or published by the watcher
+        await sync_to_async(released(watcher.ensure_watermark))()
+        generation = await sync_to_async(released(sync_generation))(client_id)
+        yield f"retry: {getattr(settings, 'REFRESH_EVENTS_RETRY_MS', 5000)}\n\n"
+        # The current generation is always sent first; a client reconnecting
+        # with a matching Last-Event-ID knows nothing was missed
+        yield _sse("generation", {"client_id": client_id, "generation": generation, "changed": generation != last_event_id}, generation)
+
+        keepalive = getattr(settings, 'REFRESH_EVENTS_KEEPALIVE', 15)
+        while True:
+            try:
+                new_generation = await asyncio.wait_for(subscription.queue.get(), timeout=keepalive)
+            except asyncio.TimeoutError:
+                # Comment line: keeps proxies from closing an idle stream
+                yield ": keepalive\n\n"
+                continue
+            if new_generation != generation:
+                generation = new_generation
+                yield _sse("generation", {"client_id": client_id, "generation": generation, "changed": True}, generation)
+    finally:
+        watcher.unsubscribe(subscription)
+
+
+@require_GET
+async def refresh_events(request):
+    """
+    Server-Sent Events stream of the tenant's sync generation: one
+    ``generation`` event on connect and one after every sync, instead of
+    polling get_refresh_tag.  EventSource cannot send headers, so the token
+    may also be passed as ``?token=``.
+
+    ASGI only: a WSGI worker would consume the endless stream to completion
+    and never be freed, so under WSGI the view answers 501.
+    """
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse({"error": "Refresh events need the ASGI server"}, status=501)
+
+    token = get_bearer_token(request) or request.GET.get("token")
+    try:
+        client_id = decode_token(token).get("client_id") if token else None
+    except jwt.InvalidTokenError:
+        client_id = None
+
+    if not client_id:
+        return JsonResponse({"error": "Invalid or missing token"}, status=401)
+
+    last_event_id = request.headers.get("Last-Event-ID") or request.GET.get("last_event_id")
+    response = StreamingHttpResponse(_generation_events(client_id, last_event_id), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
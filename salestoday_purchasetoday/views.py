@@ -1,8 +1,8 @@
 from acc_sales_type.models import AccSalesType
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
-from django.conf import settings
-import jwt
+from task_backend.authentication import get_client_id
+from task_backend.report_cache import cache_report
 from .models import SalesDaywise, SalesMonthwise, SalesToday, PurchaseToday
 from .serializers import SalesDaywiseSerializer, SalesMonthwiseSerializer, SalesTodaySerializer, PurchaseTodaySerializer
 from datetime import datetime
@@ -19,20 +19,7 @@ def _decode_token_get_client_id(request):
     Decode JWT from Authorization: Bearer <token> and return client_id.
     Returns (client_id, None) on success, or (None, Response(...)) on error.
     """
-    auth_header = request.META.get('HTTP_AUTHORIZATION', '')
-    if not auth_header or not auth_header.startswith('Bearer '):
-        return None, Response({'success': False, 'error': 'Missing or invalid authorization header'}, status=401)
-    token = auth_header.split(' ', 1)[1]
-    try:
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=['HS256'])
-        client_id = payload.get('client_id')
-        if not client_id:
-            return None, Response({'success': False, 'error': 'Invalid token: missing client_id'}, status=401)
-        return client_id, None
-    except jwt.ExpiredSignatureError:
-        return None, Response({'success': False, 'error': 'Token has expired'}, status=401)
-    except jwt.InvalidTokenError as e:
-        return None, Response({'success': False, 'error': f'Invalid token: {str(e)}'}, status=401)
+    return get_client_id(request)
 
 def _current_date_in_kolkata():
     """
@@ -58,6 +45,7 @@ from django.db.models import Sum, Count
 
 
 @api_view(['GET'])
+@cache_report
 def get_sales_today_usersummary(request):
     """
     Returns USER wise sales summary for today
@@ -107,6 +95,7 @@ def get_sales_today_usersummary(request):
 
 
 @api_view(['GET'])
+@cache_report
 def get_purchase_today(request):
     """
     Returns PurchaseToday records for the requesting client's client_id
@@ -134,6 +123,7 @@ def get_purchase_today(request):
 
 
 @api_view(['GET'])
+@cache_report
 def get_sales_daywise(request):
     """
     Returns SalesDaywise records for the requesting client's client_id.
@@ -171,6 +161,7 @@ def get_sales_daywise(request):
     })
 
 @api_view(['GET'])
+@cache_report
 def get_sales_monthwise(request):
     """
     Returns ALL monthwise sales data from DB
@@ -196,6 +187,7 @@ def get_sales_monthwise(request):
 
 
 @api_view(['GET'])
+@cache_report
 def get_sale_report(request):
     """
     Returns individual sale records for the dashboard.
@@ -319,6 +311,7 @@ def get_sale_report(request):
 
 
 @api_view(['GET'])
+@cache_report
 def get_sales_today_usersummary(request):
     """
     Returns sales summary by user for today
@@ -391,6 +384,7 @@ def get_sales_today_usersummary(request):
 from django.db.models import Sum, Count, OuterRef, Subquery
 
 @api_view(['GET'])
+@cache_report
 def get_sales_today_typewise(request):
     """
     Returns SALE TYPE wise sales summary for today (with type name)
@@ -448,6 +442,7 @@ def get_sales_today_typewise(request):
 
 
 @api_view(['GET'])
+@cache_report
 def get_sales_today_details(request):
     """
     Returns bill level sales details for today
@@ -495,6 +490,7 @@ def get_sales_today_details(request):
 
 
 @api_view(['GET'])
+@cache_report
 def get_purchase_daywise(request):
     """
     Returns PurchaseDaywise records for the requesting client's client_id.
@@ -525,6 +521,7 @@ def get_purchase_daywise(request):
 
 
 @api_view(['GET'])
+@cache_report
 def get_purchase_monthwise(request):
     """
     Returns PurchaseMonthwise records for the requesting client's client_id.
@@ -558,6 +555,7 @@ def get_purchase_monthwise(request):
 
 
 @api_view(['GET'])
+@cache_report
 def get_salesreturn_daywise(request):
     """
     Returns SalesReturnDaywise records for the requesting client's client_id.
@@ -591,6 +589,7 @@ def get_salesreturn_daywise(request):
 
 
 @api_view(['GET'])
+@cache_report
 def get_salesreturn_monthwise(request):
     """
     Returns SalesReturnMonthwise records for the requesting client's client_id.
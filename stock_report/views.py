@@ -1,51 +1,43 @@
 from django.shortcuts import render
 
 # Create your views here.
+from django.views.decorators.http import condition
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
 from .models import StockReport
-import jwt
-from django.conf import settings
+from task_backend.authentication import get_client_from_token
+from task_backend.report_cache import cache_report
+from task_backend.bulk import iter_values
+from task_backend.streaming import stream_mode, stream_response
+from task_backend.conditional import tenant_etag
 
-
-def get_client_from_token(request):
-    auth = request.headers.get("Authorization")
-
-    if not auth or not auth.startswith("Bearer "):
-        return None
-
-    token = auth.split(" ")[1]
-
-    try:
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=["HS256"])
-        return payload.get("client_id")
-    except Exception:
-        return None
+STOCK_FIELDS = ("code", "name", "productcode", "barcode", "bmrp", "salesprice", "quantity", "cost")
+STOCK_NUMERIC_FIELDS = ("bmrp", "salesprice", "quantity", "cost")
 
 
+@condition(etag_func=tenant_etag())
 @api_view(["GET"])
+@cache_report
 def get_stock_report(request):
     client_id = get_client_from_token(request)
 
     if not client_id:
         return Response({"error": "Invalid or missing token"}, status=401)
 
+    try:
+        mode = stream_mode(request)
+    except ValueError as e:
+        return Response({"error": str(e)}, status=400)
+
     qs = StockReport.objects.filter(client_id=client_id)
 
-    data = [
-        {
-            "code": i.code,
-            "name": i.name,
-            "productcode": i.productcode,
-            "barcode": i.barcode,
-            "bmrp": i.bmrp,
-            "salesprice": i.salesprice,
-            "quantity": i.quantity,
-            "cost": i.cost,  # Added
-
-        }
-        for i in qs
-    ]
+    rows = iter_values(qs, STOCK_FIELDS, floats=STOCK_NUMERIC_FIELDS)
+
+    if mode:
+        # ?stream=json|ndjson: rows go straight from a server-side cursor to the client
+        return stream_response(rows, mode, {"client_id": client_id}, count_key="count")
+
+    data = list(rows)
 
     return Response({
         "success": True,
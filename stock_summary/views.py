@@ -1,7 +1,7 @@
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
-from django.conf import settings
-import jwt
+from task_backend.authentication import get_client_id
+from task_backend.report_cache import cache_report
 
 from .models import StockSummary
 
@@ -11,33 +11,11 @@ def _get_client_id(request):
     Decode JWT from Authorization header and return client_id.
     Returns (client_id, None) on success or (None, Response) on failure.
     """
-    auth_header = request.META.get('HTTP_AUTHORIZATION')
-
-    if not auth_header or not auth_header.startswith('Bearer '):
-        return None, Response(
-            {'success': False, 'error': 'Missing or invalid authorization header'},
-            status=401
-        )
-
-    token = auth_header.split(' ')[1]
-
-    try:
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=['HS256'])
-        client_id = payload.get('client_id')
-        if not client_id:
-            return None, Response(
-                {'success': False, 'error': 'Invalid token: missing client_id'},
-                status=401
-            )
-        return client_id, None
-
-    except jwt.ExpiredSignatureError:
-        return None, Response({'success': False, 'error': 'Token has expired'}, status=401)
-    except jwt.InvalidTokenError as e:
-        return None, Response({'success': False, 'error': f'Invalid token: {str(e)}'}, status=401)
+    return get_client_id(request)
 
 
 @api_view(['GET'])
+@cache_report
 def get_stock_summary(request):
     """
     GET /api/stock-summary/
@@ -1,11 +1,16 @@
+from django.views.decorators.http import condition
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
 from django.conf import settings
 import jwt
+from task_backend.authentication import decode_token
+from task_backend.conditional import tenant_etag
+from app1.search import search_rows
 
 from .models import AccMaster
 
 
+@condition(etag_func=tenant_etag())
 @api_view(['GET'])
 def suppliers_list(request):
     try:
@@ -22,7 +27,7 @@ def suppliers_list(request):
 
         # 2️⃣ Decode JWT token
         try:
-            payload = jwt.decode(token, settings.SECRET_KEY, algorithms=['HS256'])
+            payload = decode_token(token)
             client_id = payload.get('client_id')
 
             if not client_id:
@@ -54,6 +59,11 @@ def suppliers_list(request):
             'super_code'
         ).order_by('code')
 
+        # 4️⃣ Optional ?search= over name, code, place and area, best match first
+        search_term = request.GET.get('search', '').strip()
+        if search_term:
+            suppliers = search_rows(suppliers, client_id, [search_term], super_code='SUNCR')
+
         return Response({'success': True, 'data': list(suppliers)})
 
     except Exception as e:
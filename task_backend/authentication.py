@@ -0,0 +1,190 @@
+"""
+Shared JWT authentication.
+
+Tokens are issued by ``app1.views.login`` (HS256, signed with SECRET_KEY).
+A dashboard load fires a dozen or more requests carrying the same token, so
+verified payloads are kept in a bounded LRU keyed by the token digest.  The
+``exp`` claim is re-checked on every cache hit, so an expired token is never
+served from the cache.
+
+``TenantJWTAuthentication`` is installed as the DRF default authenticator and
+puts a ``TenantContext`` on ``request.tenant``.  It never rejects a request by
+itself: views keep reporting auth errors in their own response format through
+the helpers below.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+import jwt
+from django.conf import settings
+from rest_framework.authentication import BaseAuthentication
+from rest_framework.response import Response
+
+
+class TokenCache:
+    """Thread-safe LRU of verified token payloads."""
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def set(self, key, payload, expires):
+        with self._lock:
+            self._entries[key] = (payload, expires)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def discard(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+
+token_cache = TokenCache(getattr(settings, 'JWT_TOKEN_CACHE_SIZE', 1024))
+
+
+def decode_token(token):
+    """
+    Verify ``token`` and return its payload.
+
+    Raises the usual ``jwt.InvalidTokenError`` subclasses (including
+    ``ExpiredSignatureError``).  Only successfully verified tokens are cached.
+    """
+    key = hashlib.sha256(f'{settings.SECRET_KEY}:{token}'.encode()).digest()
+    entry = token_cache.get(key)
+    if entry is not None:
+        payload, expires = entry
+        if expires is not None and expires <= time.time():
+            token_cache.discard(key)
+            raise jwt.ExpiredSignatureError('Signature has expired')
+        return dict(payload)
+
+    payload = jwt.decode(token, settings.SECRET_KEY, algorithms=['HS256'])
+    expires = payload.get('exp')
+    token_cache.set(key, payload, float(expires) if expires is not None else None)
+    return dict(payload)
+
+
+class TenantContext:
+    """The tenant a request acts for, taken from a verified token."""
+
+    __slots__ = ('client_id', 'username', 'role', 'payload')
+
+    is_authenticated = True
+    is_anonymous = False
+
+    def __init__(self, payload):
+        self.client_id = payload.get('client_id')
+        self.username = payload.get('username')
+        self.role = payload.get('role')
+        self.payload = payload
+
+    @property
+    def is_admin(self):
+        return (self.role or '').lower() == 'admin'
+
+    def __repr__(self):
+        return f'<TenantContext client_id={self.client_id!r} username={self.username!r} role={self.role!r}>'
+
+
+def get_bearer_token(request):
+    """Return the raw token from ``Authorization: Bearer <token>``, or None."""
+    auth_header = request.META.get('HTTP_AUTHORIZATION')
+    if not auth_header or not auth_header.startswith('Bearer '):
+        return None
+    return auth_header.split(' ', 1)[1]
+
+
+def get_tenant(request):
+    """
+    Return the TenantContext for ``request``, or None when no bearer token was
+    sent.  Raises ``jwt.InvalidTokenError`` for a bad or expired token.
+    """
+    tenant = getattr(request, 'tenant', None)
+    if tenant is not None:
+        return tenant
+    token = get_bearer_token(request)
+    if token is None:
+        return None
+    return TenantContext(decode_token(token))
+
+
+def decode_jwt_token(request):
+    """Return the token payload, or None if the token is missing or invalid."""
+    try:
+        tenant = get_tenant(request)
+    except jwt.InvalidTokenError:
+        return None
+    return tenant.payload if tenant else None
+
+
+def get_client_from_token(request):
+    """Return the token's client_id, or None if the token is missing or invalid."""
+    payload = decode_jwt_token(request)
+    return payload.get('client_id') if payload else None
+
+
+def get_client_id(request):
+    """
+    Return ``(client_id, None)`` on success, or ``(None, Response(...))`` with
+    the standard 401 payload on error.
+    """
+    try:
+        tenant = get_tenant(request)
+    except jwt.ExpiredSignatureError:
+        return None, Response({'success': False, 'error': 'Token has expired'}, status=401)
+    except jwt.InvalidTokenError as e:
+        return None, Response({'success': False, 'error': f'Invalid token: {str(e)}'}, status=401)
+
+    if tenant is None:
+        return None, Response({'success': False, 'error': 'Missing or invalid authorization header'}, status=401)
+    if not tenant.client_id:
+        return None, Response({'success': False, 'error': 'Invalid token: missing client_id'}, status=401)
+    return tenant.client_id, None
+
+
+class TenantJWTAuthentication(BaseAuthentication):
+    """
+    DRF authenticator that sets ``request.tenant`` from the bearer token.
+
+    Invalid tokens are not rejected here; the request continues unauthenticated
+    and the view reports the error in its own format.
+    """
+
+    def authenticate(self, request):
+        token = get_bearer_token(request)
+        if token is None:
+            return None
+        try:
+            tenant = TenantContext(decode_token(token))
+        except jwt.InvalidTokenError:
+            return None
+        request.tenant = tenant
+        return (tenant, token)
+
+    def authenticate_header(self, request):
+        return 'Bearer'
@@ -0,0 +1,31 @@
+"""
+Bulk reads for unbounded per-tenant querysets.
+
+``iter_values()`` skips model instantiation: rows come from
+``values_list().iterator(chunk_size)`` (a named server-side cursor on
+PostgreSQL), numeric columns are cast to float in SQL (``::float8``) so no
+Decimal objects are built, and each tuple is zipped into a dict in C.
+
+The float cast is only for columns whose values fit in a double (15
+significant digits), which covers every price/quantity column the API
+returns; DRF renders Decimals as floats anyway, so the JSON is unchanged.
+"""
+from functools import partial
+
+from django.db.models import FloatField
+from django.db.models.functions import Cast
+
+from .streaming import default_chunk_size
+
+
+def iter_values(queryset, fields, floats=(), chunk_size=None):
+    """
+    Lazy iterator of ``{field: value}`` for every row of ``queryset``.  ``floats`` names
+    the subset of ``fields`` to read as float8 instead of numeric.
+    """
+    annotations = {f'{name}_as_float': Cast(name, FloatField()) for name in floats}
+    columns = [f'{name}_as_float' if name in floats else name for name in fields]
+    if annotations:
+        queryset = queryset.annotate(**annotations)
+    rows = queryset.values_list(*columns).iterator(chunk_size=chunk_size or default_chunk_size())
+    return map(dict, map(partial(zip, fields), rows))
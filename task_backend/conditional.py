@@ -0,0 +1,55 @@
+"""
+Strong ETags for tenant list endpoints.
+
+``tenant_etag()`` builds an ``etag_func`` for Django's ``condition``
+decorator.  Placed above ``@api_view`` it answers a matching
+``If-None-Match`` with 304 before authentication, the main query or
+serialization run::
+
+    @condition(etag_func=tenant_etag())
+    @api_view(["GET"])
+    def get_pdc(request):
+        ...
+
+The tag is derived from the tenant's sync generation (latest refresh_tag),
+or, for tables that change outside the sync, from ``model``'s row count and
+max primary key for the tenant.  Those two miss rows updated in place, so
+for small tables whose rows are edited ``fields`` names the returned
+columns, and a hash of the tenant's values of them is used instead.  The path, query string and Accept header
+are part of it, so different filters or renderers never share a tag.
+"""
+import hashlib
+
+import jwt
+from django.db.models import Count, Max
+
+from .authentication import get_tenant
+from .report_cache import sync_generation
+
+
+def tenant_etag(model=None, fields=None):
+    def etag_func(request, *args, **kwargs):
+        try:
+            tenant = get_tenant(request)
+        except jwt.InvalidTokenError:
+            return None
+        if tenant is None or not tenant.client_id:
+            # No conditional handling; the view reports the auth error
+            return None
+
+        if model is None:
+            version = sync_generation(tenant.client_id)
+        elif fields:
+            rows = model.objects.filter(client_id=tenant.client_id).order_by('pk').values_list(*fields)
+            version = hashlib.sha1(repr(list(rows)).encode()).hexdigest()
+        else:
+            fingerprint = model.objects.filter(client_id=tenant.client_id).aggregate(rows=Count('pk'), last=Max('pk'))
+            version = f"{fingerprint['rows']}:{fingerprint['last']}"
+
+        query = '&'.join(f'{k}={v}' for k, v in sorted(request.GET.lists()))
+        # Accept selects the renderer (e.g. columnar) just like ?format= does
+        accept = request.META.get('HTTP_ACCEPT', '')
+        raw = f'{request.path}|{tenant.client_id}|{version}|{query}|{accept}'
+        return hashlib.sha1(raw.encode()).hexdigest()
+
+    return etag_func
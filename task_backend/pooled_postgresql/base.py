@@ -0,0 +1,58 @@
+"""
+The PostgreSQL backend with a connection pool per worker process (pool.py).
+
+    'ENGINE': 'task_backend.pooled_postgresql',
+    'CONN_MAX_AGE': 0,
+    'OPTIONS': {'pool': {'max_size': 10, 'timeout': 10}},
+
+Django still "closes" the connection at the end of every request; here that
+puts it back in the pool, so requests skip the TCP, TLS and authentication
+round trips to the server.  ``'pool': True`` uses the defaults in
+pool.DEFAULTS; without ``'pool'`` this is the stock backend.
+
+The options mirror the ``pool`` option of Django 5.1+'s own backend (which
+needs psycopg 3), so switching later is a settings change.
+"""
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.postgresql import base
+from django.db.backends.postgresql.psycopg_any import IsolationLevel
+from django.utils.asyncio import async_unsafe
+
+from .pool import get_pool
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    @property
+    def pool(self):
+        options = self.settings_dict['OPTIONS'].get('pool')
+        if not options:
+            return None
+        if self.settings_dict['CONN_MAX_AGE'] != 0:
+            raise ImproperlyConfigured("Pooled connections require CONN_MAX_AGE = 0")
+        return get_pool(self.alias, {} if options is True else options)
+
+    def get_connection_params(self):
+        conn_params = super().get_connection_params()
+        conn_params.pop('pool', None)
+        return conn_params
+
+    @async_unsafe
+    def get_new_connection(self, conn_params):
+        pool = self.pool
+        if pool is None:
+            return super().get_new_connection(conn_params)
+        connection = pool.getconn(lambda: super(DatabaseWrapper, self).get_new_connection(conn_params))
+        # Normally set by get_new_connection, which a reused connection skipped
+        self.isolation_level = IsolationLevel(
+            self.settings_dict['OPTIONS'].get('isolation_level', IsolationLevel.READ_COMMITTED)
+        )
+        return connection
+
+    def _close(self):
+        pool = self.pool
+        if pool is None or self.connection is None:
+            return super()._close()
+        with self.wrap_database_errors:
+            # Closed inside atomic(), the wrapper keeps its reference to the
+            # connection, so it must not be handed to anyone else
+            pool.putconn(self.connection, discard=self.in_atomic_block)
@@ -0,0 +1,263 @@
+"""
+A thread-safe pool of psycopg2 connections, one per database alias and
+worker process.
+
+Checkout hands out the most recently returned connection (the one most
+likely to still be alive), after
+
+- dropping it when it has outlived ``max_lifetime`` or sat idle longer than
+  ``max_idle``;
+- resetting its session (``DISCARD ALL``) when ``reset`` is on; the reset
+  doubles as the health check, so a connection the server or a firewall has
+  dropped is replaced instead of failing the request;
+- otherwise running ``SELECT 1`` when it has been idle longer than
+  ``check_idle`` seconds.
+
+When all ``max_size`` connections are checked out, callers wait up to
+``timeout`` seconds for one to come back.  ``stats()`` reports the waits and
+how busy the pool has been.
+"""
+import functools
+import logging
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.db import OperationalError, connections
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'max_size': 10,
+    'timeout': 10,
+    'max_lifetime': 1800,
+    'max_idle': 600,
+    'check_idle': 30,
+    'reset': True,
+}
+
+
+class PoolTimeout(OperationalError):
+    pass
+
+
+class _Entry:
+    def __init__(self, connection):
+        self.connection = connection
+        self.created = self.returned = time.monotonic()
+        self.checked_out = None
+
+
+class ConnectionPool:
+    def __init__(self, alias, **options):
+        unknown = set(options) - set(DEFAULTS)
+        if unknown:
+            raise ValueError(f"Unknown pool options: {', '.join(sorted(unknown))}")
+        for name, default in DEFAULTS.items():
+            setattr(self, name, options.get(name, default))
+        self.alias = alias
+        self.pid = os.getpid()
+        self.started = time.monotonic()
+
+        self._cond = threading.Condition()
+        self._idle = []
+        self._in_use = {}
+        self._size = 0
+
+        self.checkouts = 0
+        self.created = 0
+        self.discarded = 0
+        self.waits = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self.timeouts = 0
+        self.busy_seconds = 0.0
+        self.peak_in_use = 0
+
+    # ---- checkout / checkin ----
+
+    def getconn(self, connect):
+        """A connection from the pool, or a new one from ``connect()``"""
+        start = time.monotonic()
+        deadline = start + self.timeout
+        waited = new = False
+        while True:
+            with self._cond:
+                while not self._idle and self._size >= self.max_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.timeouts += 1
+                        logger.warning("No free %r connection after %ss (%s in use)", self.alias, self.timeout, len(self._in_use))
+                        raise PoolTimeout(f"No free database connection after {self.timeout}s")
+                    waited = True
+                    self._cond.wait(remaining)
+                entry = self._idle.pop() if self._idle else None
+                # Reserve the slot before connecting, outside the lock
+                self._size += 1 if entry is None else 0
+
+            if entry is None:
+                try:
+                    entry = _Entry(connect())
+                except Exception:
+                    self._release_slot()
+                    raise
+                new = True
+            elif not self._checkout_ok(entry):
+                self._discard(entry)
+                continue
+            break
+
+        now = time.monotonic()
+        with self._cond:
+            entry.checked_out = now
+            self._in_use[id(entry.connection)] = entry
+            self.checkouts += 1
+            self.created += new
+            self.peak_in_use = max(self.peak_in_use, len(self._in_use))
+            if waited:
+                self.waits += 1
+                self.wait_seconds += now - start
+                self.max_wait_seconds = max(self.max_wait_seconds, now - start)
+        return entry.connection
+
+    def putconn(self, connection, discard=False):
+        with self._cond:
+            entry = self._in_use.pop(id(connection), None)
+            if entry is None:
+                # Not ours (e.g. checked out before a fork); just close it
+                connection.close()
+                return
+            now = time.monotonic()
+            self.busy_seconds += now - entry.checked_out
+
+        if discard or not self._checkin_ok(entry, now):
+            self._discard(entry)
+            return
+        entry.returned = now
+        with self._cond:
+            self._idle.append(entry)
+            self._cond.notify()
+
+    def _checkin_ok(self, entry, now):
+        connection = entry.connection
+        if connection.closed or now - entry.created > self.max_lifetime:
+            return False
+        # Never park a connection in the middle of a transaction
+        if connection.info.transaction_status != 0:  # TRANSACTION_STATUS_IDLE
+            try:
+                connection.rollback()
+            except Exception:
+                return False
+        return True
+
+    def _checkout_ok(self, entry):
+        now = time.monotonic()
+        if entry.connection.closed or now - entry.created > self.max_lifetime or now - entry.returned > self.max_idle:
+            return False
+        sql = 'DISCARD ALL' if self.reset else 'SELECT 1' if now - entry.returned > self.check_idle else None
+        if sql is None:
+            return True
+        try:
+            entry.connection.autocommit = True
+            with entry.connection.cursor() as cursor:
+                cursor.execute(sql)
+        except Exception:
+            return False
+        return True
+
+    def _discard(self, entry):
+        try:
+            entry.connection.close()
+        except Exception:
+            pass
+        self._release_slot(discarded=True)
+
+    def _release_slot(self, discarded=False):
+        with self._cond:
+            self._size -= 1
+            self.discarded += discarded
+            self._cond.notify()
+
+    # ---- reporting ----
+
+    def stats(self):
+        with self._cond:
+            in_use = len(self._in_use)
+            elapsed = time.monotonic() - self.started
+            busy = self.busy_seconds + sum(time.monotonic() - e.checked_out for e in self._in_use.values())
+            return {
+                'max_size': self.max_size,
+                'size': self._size,
+                'in_use': in_use,
+                'idle': len(self._idle),
+                'peak_in_use': self.peak_in_use,
+                'checkouts': self.checkouts,
+                'created': self.created,
+                'discarded': self.discarded,
+                'waits': self.waits,
+                'wait_ms_avg': round(self.wait_seconds / self.waits * 1000, 2) if self.waits else 0.0,
+                'wait_ms_max': round(self.max_wait_seconds * 1000, 2),
+                'timeouts': self.timeouts,
+                # Share of the pool's capacity spent checked out since it started
+                'utilization': round(busy / (self.max_size * elapsed), 4) if elapsed else 0.0,
+            }
+
+
+_pools = {}
+_inherited = []
+_pools_lock = threading.Lock()
+
+
+def get_pool(alias, options):
+    """The pool for ``alias`` in this process, created on first use"""
+    with _pools_lock:
+        pool = _pools.get(alias)
+        if pool is not None and pool.pid != os.getpid():
+            # Forked after connecting (e.g. gunicorn --preload).  The parent
+            # owns those sockets: keep them referenced, never close them here.
+            _inherited.append(pool)
+            pool = None
+        if pool is None:
+            pool = _pools[alias] = ConnectionPool(alias, **options)
+        return pool
+
+
+def pool_stats():
+    """stats() of every pool in this process, by alias"""
+    with _pools_lock:
+        pools = [pool for pool in _pools.values() if pool.pid == os.getpid()]
+    return {pool.alias: pool.stats() for pool in pools}
+
+
+def smallest_pool_size():
+    """The smallest max_size among the pooled databases, None when none is pooled"""
+    sizes = []
+    for database in settings.DATABASES.values():
+        options = database.get('OPTIONS', {}).get('pool')
+        if options:
+            sizes.append({**DEFAULTS, **({} if options is True else options)}['max_size'])
+    return min(sizes) if sizes else None
+
+
+def release_connections():
+    """
+    Return the calling thread's pooled connections to their pools (those
+    outside atomic()).  Django only does so when the request finishes, so a
+    connection used by an async view through sync_to_async would otherwise
+    hold a pool slot for the rest of the request, or of an event stream.
+    """
+    for connection in connections.all(initialized_only=True):
+        if getattr(connection, 'pool', None) is not None and not connection.in_atomic_block:
+            connection.close()
+
+
+def released(func):
+    """``func``, returning its thread's pooled connections when it is done"""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        try:
+            return func(*args, **kwargs)
+        finally:
+            release_connections()
+    return wrapper
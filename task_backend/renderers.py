@@ -0,0 +1,95 @@
+"""
+Columnar JSON for tabular responses (``?format=columnar``).
+
+Every list of same-shaped dicts in the response (``data``, ``users``,
+``firms``...) is sent as column names plus one array per column::
+
+    "data": {
+        "rows": 2,
+        "columns": ["id", "status", "amount"],
+        "values": [[1, 2], [0, 0], [10.5, 7.0]],
+        "dictionaries": {"status": ["pending"]},
+        "aliases": {"total_amount": "amount"}
+    }
+
+``dictionaries``  low-cardinality string columns hold indexes into the listed
+                  values (null stays null)
+``aliases``       columns identical to an earlier column are sent once; the
+                  alias maps the dropped column to the one that holds its values
+
+Everything else in the response is left as it is, so error payloads and
+scalar fields look the same as with plain JSON.
+"""
+from rest_framework.renderers import JSONRenderer
+
+# A string column is dictionary-encoded when it has at most this share of
+# distinct values
+DICTIONARY_MAX_RATIO = 0.5
+
+
+def _is_table(value):
+    if not isinstance(value, list) or not value or not isinstance(value[0], dict):
+        return False
+    keys = value[0].keys()
+    return all(isinstance(row, dict) and row.keys() == keys for row in value)
+
+
+def _dictionary_encode(column):
+    distinct = {}
+    for value in column:
+        if value is not None:
+            if not isinstance(value, str):
+                return None
+            distinct.setdefault(value, len(distinct))
+    if not distinct or len(distinct) > len(column) * DICTIONARY_MAX_RATIO:
+        return None
+    return list(distinct), [None if value is None else distinct[value] for value in column]
+
+
+def _same_column(a, b):
+    # Type-strict, so True / 1 / 1.0 columns are never merged
+    return a == b and all(type(x) is type(y) for x, y in zip(a, b))
+
+
+def encode_table(rows):
+    """Columnar form of a list of dicts that all have the same keys"""
+    names = list(rows[0])
+    columns = [[row[name] for row in rows] for name in names]
+
+    kept_names, kept_columns, aliases = [], [], {}
+    for name, column in zip(names, columns):
+        original = next((kept for kept, values in zip(kept_names, kept_columns) if _same_column(values, column)), None)
+        if original is not None:
+            aliases[name] = original
+        else:
+            kept_names.append(name)
+            kept_columns.append(column)
+
+    dictionaries = {}
+    for i, name in enumerate(kept_names):
+        encoded = _dictionary_encode(kept_columns[i])
+        if encoded is not None:
+            dictionaries[name], kept_columns[i] = encoded
+
+    table = {'rows': len(rows), 'columns': kept_names, 'values': kept_columns}
+    if dictionaries:
+        table['dictionaries'] = dictionaries
+    if aliases:
+        table['aliases'] = aliases
+    return table
+
+
+def to_columnar(data):
+    if _is_table(data):
+        return encode_table(data)
+    if isinstance(data, dict):
+        return {key: encode_table(value) if _is_table(value) else value for key, value in data.items()}
+    return data
+
+
+class ColumnarJSONRenderer(JSONRenderer):
+    media_type = 'application/vnd.columnar+json'
+    format = 'columnar'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return super().render(to_columnar(data), accepted_media_type, renderer_context)
@@ -0,0 +1,244 @@
+"""
+Read replicas for the report endpoints.
+
+``ReplicaRouter`` sends ORM reads, and raw SQL run on
+``connections[router.db_for_read(Model)]``, to a replica listed in
+``REPLICAS['DATABASES']``; writes and everything under ``connection.cursor()``
+stay on ``default``.  A replica is skipped while
+
+- its newest refresh_tag is more than ``MAX_LAG`` seconds behind the
+  primary's (measured from the first sync it is missing), or
+- it failed its last check.
+
+Checks run inline, at most every ``CHECK_INTERVAL`` seconds per process, by
+whichever request gets there first; the others keep using the last result.
+With no usable replica, reads go to the primary.
+
+Within a request every read goes to the replica chosen by its first read,
+so the report cache's sync generation (task_backend/report_cache.py) and
+the data cached under it come from the same server.
+
+``ReplicaPinningMiddleware`` pins a request to the primary when it is not a
+GET/HEAD/OPTIONS or as soon as it writes through the ORM, and then keeps
+the client's reads on the primary for ``PIN_SECONDS``, so clients see their
+own writes: per tenant and user of the bearer token, in the report cache's
+backend (shared by the workers unless it is locmem), and with a cookie for
+clients that send one back.
+"""
+import contextvars
+import itertools
+import logging
+import threading
+import time
+
+import jwt
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.utils import timezone
+
+from .authentication import get_tenant
+from .report_cache import get_backend
+
+logger = logging.getLogger(__name__)
+
+PIN_COOKIE = 'primary_pin'
+PIN_KEY = 'primary_pin:{client_id}:{username}'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+def replica_settings():
+    return {
+        'DATABASES': [],
+        'SELECTION': 'round_robin',  # round_robin | least_latency
+        'MAX_LAG': 30,
+        'CHECK_INTERVAL': 5,
+        'PIN_SECONDS': 30,
+        **getattr(settings, 'REPLICAS', {}),
+    }
+
+
+_UNCHOSEN = object()
+
+
+class _Pin:
+    def __init__(self, primary):
+        self.primary = primary
+        self.wrote = False
+        self.replica = _UNCHOSEN
+        self._lock = threading.Lock()
+
+    def replica_for_read(self):
+        """The replica alias (None for the primary) of the request's first read"""
+        if self.replica is _UNCHOSEN:
+            with self._lock:
+                if self.replica is _UNCHOSEN:
+                    self.replica = replicas.choose()
+        return self.replica
+
+
+# A mutable object, so a write in a thread that copied the context (e.g.
+# sync_to_async) still pins the rest of the request
+_pin = contextvars.ContextVar('replica_pin', default=None)
+
+
+def pin_to_primary():
+    """Send the rest of the current request's reads to the primary."""
+    pin = _pin.get()
+    if pin is not None:
+        pin.primary = pin.wrote = True
+
+
+class ReplicaSet:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._next_check = 0
+        self._round_robin = itertools.count()
+        self.status = {}
+
+    def choose(self):
+        """A usable replica alias, or None for the primary"""
+        config = replica_settings()
+        if not config['DATABASES']:
+            return None
+        self._check_if_due(config)
+        usable = [
+            alias for alias in config['DATABASES']
+            if self.status.get(alias, {}).get('healthy') and self.status[alias]['lag_seconds'] <= config['MAX_LAG']
+        ]
+        if not usable:
+            return None
+        if config['SELECTION'] == 'least_latency':
+            alias = min(usable, key=lambda a: self.status[a]['latency_ms'])
+        else:
+            alias = usable[next(self._round_robin) % len(usable)]
+        self.status[alias]['reads'] += 1
+        return alias
+
+    def _check_if_due(self, config):
+        if time.monotonic() < self._next_check or not self._lock.acquire(blocking=False):
+            return
+        try:
+            if time.monotonic() >= self._next_check:
+                self.check(config['DATABASES'])
+                self._next_check = time.monotonic() + config['CHECK_INTERVAL']
+        finally:
+            self._lock.release()
+
+    def check(self, aliases):
+        """Measure each replica's refresh_tag lag and round-trip time."""
+        from refresh_tag.models import RefreshTag
+
+        tags = RefreshTag.objects.order_by('-id').values_list('id', flat=True)
+        try:
+            newest = tags.using('default').first() or 0
+        except Exception:
+            logger.exception("Replica check could not read the primary")
+            return
+
+        for alias in aliases:
+            status = self.status.setdefault(alias, {'healthy': False, 'lag_seconds': 0.0, 'latency_ms': 0.0, 'reads': 0})
+            start = time.perf_counter()
+            try:
+                replica_newest = tags.using(alias).first() or 0
+            except Exception as e:
+                if status['healthy']:
+                    logger.warning("Replica %s failed its check: %s", alias, e)
+                status['healthy'] = False
+                continue
+            latency = (time.perf_counter() - start) * 1000
+            # Moving average, so one slow probe does not flip the choice
+            status['latency_ms'] = round(latency if not status['latency_ms'] else 0.7 * status['latency_ms'] + 0.3 * latency, 2)
+            status['healthy'] = True
+
+            if replica_newest >= newest:
+                status['lag_seconds'] = 0.0
+                continue
+            missing = RefreshTag.objects.using('default').filter(id__gt=replica_newest).order_by('id').values_list('etime', flat=True).first()
+            status['lag_seconds'] = round(max((timezone.now() - missing).total_seconds(), 0), 1) if missing else 0.0
+
+
+replicas = ReplicaSet()
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        pin = _pin.get()
+        if pin is None:
+            return replicas.choose()
+        if pin.primary:
+            return 'default'
+        return pin.replica_for_read()
+
+    def db_for_write(self, model, **hints):
+        pin_to_primary()
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get the schema by replication
+        if db in replica_settings()['DATABASES']:
+            return False
+        return None
+
+
+class ReplicaPinningMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        pin = _Pin(request.method not in SAFE_METHODS or self._pinned(request))
+        token = _pin.set(pin)
+        try:
+            response = self.get_response(request)
+        finally:
+            _pin.reset(token)
+        if pin.wrote or request.method not in SAFE_METHODS:
+            self._pin_client(request, response)
+        return response
+
+    async def __acall__(self, request):
+        pin = _Pin(request.method not in SAFE_METHODS or await sync_to_async(self._pinned)(request))
+        token = _pin.set(pin)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _pin.reset(token)
+        if pin.wrote or request.method not in SAFE_METHODS:
+            await sync_to_async(self._pin_client)(request, response)
+        return response
+
+    def _pin_key(self, request):
+        try:
+            tenant = get_tenant(request)
+        except jwt.InvalidTokenError:
+            return None
+        if tenant is None or not tenant.client_id:
+            return None
+        return PIN_KEY.format(client_id=tenant.client_id, username=tenant.username or '')
+
+    def _pinned(self, request):
+        if PIN_COOKIE in request.COOKIES:
+            return True
+        # Nothing to look up while every read goes to the primary anyway
+        if not replica_settings()['DATABASES']:
+            return False
+        key = self._pin_key(request)
+        # The value is the pin's expiry, as the backend's own timeout is the
+        # report cache's
+        return key is not None and (get_backend().get(key) or 0) > time.time()
+
+    def _pin_client(self, request, response):
+        seconds = replica_settings()['PIN_SECONDS']
+        response.set_cookie(PIN_COOKIE, '1', max_age=seconds, httponly=True, samesite='Lax')
+        key = self._pin_key(request)
+        if key is not None:
+            get_backend().set(key, time.time() + seconds)
@@ -0,0 +1,344 @@
+"""
+Response cache for GET report endpoints.
+
+Report data only changes when the desktop sync runs, and every sync leaves a
+row in ``refresh_tag``.  The tenant's latest refresh_tag (id, edate, etime)
+is therefore used as a *generation* inside every cache key: once a new sync
+lands the old keys are simply never asked for again and age out of the
+backend, so no per-endpoint TTL has to be guessed.
+
+Usage, below ``@api_view`` so the wrapped function sees the DRF request::
+
+    @api_view(['GET'])
+    @cache_report
+    def get_pdc(request):
+        ...
+
+Backends are chosen with ``REPORT_CACHE['BACKEND']``:
+
+``locmem``  per-process LRU (default)
+``file``    pickles under ``LOCATION``, shared by the workers of one host
+``redis``   any Redis-compatible server at ``LOCATION`` (needs ``redis``)
+"""
+import asyncio
+import functools
+import hashlib
+import os
+import pickle
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+import jwt
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.http import HttpResponse, JsonResponse
+from django.utils import timezone
+from rest_framework.response import Response
+
+from .authentication import get_tenant
+from .pooled_postgresql.pool import released
+
+
+class CacheStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.sets = self.evictions = 0
+
+    def incr(self, name, amount=1):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + amount)
+
+    def as_dict(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'sets': self.sets,
+            'evictions': self.evictions,
+            'hit_ratio': round(self.hits / lookups, 4) if lookups else None,
+        }
+
+
+class LocMemBackend:
+    """Thread-safe LRU dict holding at most ``max_entries`` responses."""
+
+    name = 'locmem'
+
+    def __init__(self, max_entries, timeout, **options):
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self.stats = CacheStats()
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires, value = item
+            if expires < time.time():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        evicted = 0
+        with self._lock:
+            self._data[key] = (time.time() + self.timeout, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                evicted += 1
+        if evicted:
+            self.stats.incr('evictions', evicted)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def info(self):
+        return {'entries': len(self._data), 'max_entries': self.max_entries}
+
+
+class FileBackend:
+    """
+    One pickle per key in ``location``.  When the directory grows past
+    ``max_entries`` the least recently written tenth is removed.
+    """
+
+    name = 'file'
+
+    def __init__(self, max_entries, timeout, location=None, **options):
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self.location = location or os.path.join(tempfile.gettempdir(), 'report_cache')
+        self.stats = CacheStats()
+        os.makedirs(self.location, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.location, hashlib.sha1(key.encode()).hexdigest() + '.pickle')
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                expires, value = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+        if expires < time.time():
+            self._remove(path)
+            return None
+        return value
+
+    def set(self, key, value):
+        path = self._path(key)
+        # Write then rename so readers never see a partial file
+        fd, tmp_path = tempfile.mkstemp(dir=self.location, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump((time.time() + self.timeout, value), f, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+        self._cull()
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+            return True
+        except OSError:
+            return False
+
+    def _entries(self):
+        with os.scandir(self.location) as it:
+            return [entry for entry in it if entry.name.endswith('.pickle')]
+
+    def _cull(self):
+        entries = self._entries()
+        if len(entries) <= self.max_entries:
+            return
+        entries.sort(key=lambda entry: entry.stat().st_mtime)
+        doomed = entries[:max(len(entries) - self.max_entries, self.max_entries // 10)]
+        removed = sum(self._remove(entry.path) for entry in doomed)
+        self.stats.incr('evictions', removed)
+
+    def clear(self):
+        for entry in self._entries():
+            self._remove(entry.path)
+
+    def info(self):
+        return {'entries': len(self._entries()), 'max_entries': self.max_entries, 'location': self.location}
+
+
+class RedisBackend:
+    """
+    Redis-compatible server.  Size limits and eviction are the server's job
+    (``maxmemory-policy allkeys-lru``); its ``evicted_keys`` counter is
+    reported alongside the local counters.
+    """
+
+    name = 'redis'
+
+    def __init__(self, max_entries, timeout, location=None, key_prefix='report:', **options):
+        try:
+            import redis
+        except ImportError:
+            raise ImproperlyConfigured("REPORT_CACHE backend 'redis' requires the redis package")
+        self.client = redis.Redis.from_url(location or 'redis://localhost:6379/0')
+        self.timeout = timeout
+        self.key_prefix = key_prefix
+        self.stats = CacheStats()
+
+    def get(self, key):
+        value = self.client.get(self.key_prefix + key)
+        return pickle.loads(value) if value is not None else None
+
+    def set(self, key, value):
+        self.client.set(self.key_prefix + key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL), ex=self.timeout)
+
+    def clear(self):
+        for key in self.client.scan_iter(match=self.key_prefix + '*', count=1000):
+            self.client.delete(key)
+
+    def info(self):
+        server = self.client.info('stats')
+        return {'server_evicted_keys': server.get('evicted_keys'), 'server_expired_keys': server.get('expired_keys')}
+
+
+BACKENDS = {
+    'locmem': LocMemBackend,
+    'file': FileBackend,
+    'redis': RedisBackend,
+}
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                options = getattr(settings, 'REPORT_CACHE', {})
+                name = options.get('BACKEND', 'locmem')
+                if name not in BACKENDS:
+                    raise ImproperlyConfigured(f"REPORT_CACHE BACKEND must be one of: {', '.join(BACKENDS)}")
+                _backend = BACKENDS[name](
+                    max_entries=options.get('MAX_ENTRIES', 5000),
+                    timeout=options.get('TIMEOUT', 86400),
+                    location=options.get('LOCATION'),
+                )
+    return _backend
+
+
+def format_generation(tag_id, edate, etime):
+    return f'{tag_id}:{edate.isoformat()}:{etime.isoformat()}'
+
+
+def sync_generation(client_id):
+    """
+    The tenant's latest refresh_tag as 'id:edate:etime', '0' before the first
+    sync.  Read through the router: in a request that is the replica (or the
+    primary) all of its reads use, so a generation never labels older data.
+    """
+    from refresh_tag.models import RefreshTag
+
+    latest = RefreshTag.objects.filter(client_id=client_id).order_by('-id').values_list('id', 'edate', 'etime').first()
+    if latest is None:
+        return '0'
+    return format_generation(*latest)
+
+
+def cache_key(request, view_name, tenant, generation):
+    # The path covers views that take URL arguments
+    query = request.path + '?' + '&'.join(f'{k}={v}' for k, v in sorted(request.GET.lists()))
+    # Today's date is part of the key for the "today" reports
+    return ':'.join([
+        view_name, str(tenant.client_id), str(tenant.username or ''), str(tenant.role or ''),
+        generation, timezone.localdate().isoformat(), hashlib.sha1(query.encode()).hexdigest(),
+    ])
+
+
+def _lookup(request, view_name):
+    """(backend, key, cached value) for a cacheable request, None otherwise"""
+    if request.method != 'GET' or not getattr(settings, 'REPORT_CACHE', {}).get('ENABLED', True):
+        return None
+    try:
+        tenant = get_tenant(request)
+    except jwt.InvalidTokenError:
+        tenant = None
+    if tenant is None or not tenant.client_id:
+        return None
+
+    backend = get_backend()
+    key = cache_key(request, view_name, tenant, sync_generation(tenant.client_id))
+    cached = backend.get(key)
+    backend.stats.incr('hits' if cached is not None else 'misses')
+    return backend, key, cached
+
+
+def _store(backend, key, value):
+    backend.set(key, value)
+    backend.stats.incr('sets')
+
+
+def cache_report(view):
+    """
+    Cache successful GET responses of ``view`` per tenant, user, query string
+    and sync generation.  Requests without a valid token are passed through
+    so the view reports the auth error itself.
+
+    Async views (plain Django views returning JSON) are supported too; their
+    rendered body is cached instead of the DRF ``response.data``.
+    """
+    view_name = f'{view.__module__}.{view.__name__}'
+
+    if asyncio.iscoroutinefunction(view):
+        @functools.wraps(view)
+        async def async_wrapper(request, *args, **kwargs):
+            lookup = await sync_to_async(released(_lookup))(request, view_name)
+            if lookup is None:
+                return await view(request, *args, **kwargs)
+
+            backend, key, cached = lookup
+            if cached is not None:
+                response = HttpResponse(cached, content_type='application/json')
+                response['X-Report-Cache'] = 'hit'
+                return response
+
+            response = await view(request, *args, **kwargs)
+            if isinstance(response, JsonResponse) and response.status_code == 200:
+                await sync_to_async(released(_store))(backend, key, response.content)
+                response['X-Report-Cache'] = 'miss'
+            return response
+
+        return async_wrapper
+
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        lookup = _lookup(request, view_name)
+        if lookup is None:
+            return view(request, *args, **kwargs)
+
+        backend, key, cached = lookup
+        if cached is not None:
+            response = Response(cached)
+            response['X-Report-Cache'] = 'hit'
+            return response
+
+        response = view(request, *args, **kwargs)
+        # Only plain 200 DRF responses; streamed and error responses are never stored
+        if isinstance(response, Response) and response.status_code == 200:
+            _store(backend, key, response.data)
+            response['X-Report-Cache'] = 'miss'
+        return response
+
+    return wrapper
+
+
+def cache_stats():
+    backend = get_backend()
+    return {'backend': backend.name, **backend.stats.as_dict(), **backend.info()}
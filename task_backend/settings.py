@@ -1,6 +1,6 @@
 
 from pathlib import Path
-from decouple import config
+from decouple import Csv, config
 # import cloudinary
 # import cloudinary.uploader
 # import cloudinary.api
@@ -33,6 +33,8 @@ CORS_ALLOW_HEADERS = ['*']
 CORS_ALLOW_METHODS = ['*']
 CORS_ALLOW_CREDENTIALS = True
 CORS_ALLOW_ALL_ORIGINS = True  # For development only
+# Let browser clients read the conditional-GET and cache headers
+CORS_EXPOSE_HEADERS = ['ETag', 'X-Report-Cache']
 
 # Application definition
 
@@ -64,6 +66,9 @@ INSTALLED_APPS = [
     'type_wise_sales_today',
     'tender_cash_byuser',
     'tender_cash_bytype',
+    'benchmarks',
+    'data_export',
+    'monitoring',
     
 ]
 
@@ -79,15 +84,118 @@ SIMPLE_JWT = {
     'REFRESH_TOKEN_LIFETIME': timedelta(days=1),
     'ROTATE_REFRESH_TOKENS': True,
 }
+
+# Verified JWT payloads kept per process (see task_backend/authentication.py)
+JWT_TOKEN_CACHE_SIZE = 2048
+
+# Account search (app1/search.py): 'auto' uses pg_trgm on PostgreSQL when the
+# extension is installed (manage.py create_search_indexes), else an in-process index
+ACCOUNT_SEARCH_BACKEND = 'auto'
+ACCOUNT_SEARCH_INDEX_TTL = 300
+
+# Report response cache (task_backend/report_cache.py).  Entries are keyed on
+# the tenant's latest refresh_tag, so TIMEOUT is only an upper bound.
+REPORT_CACHE = {
+    'ENABLED': config('REPORT_CACHE_ENABLED', default=True, cast=bool),
+    'BACKEND': config('REPORT_CACHE_BACKEND', default='locmem'),  # locmem | file | redis
+    'LOCATION': config('REPORT_CACHE_LOCATION', default=None),
+    'MAX_ENTRIES': config('REPORT_CACHE_MAX_ENTRIES', default=5000, cast=int),
+    'TIMEOUT': 86400,
+}
+
+# Sync events (refresh_tag/events.py): one refresh_tag poll per worker every
+# POLL_INTERVAL seconds while any event stream is open
+REFRESH_EVENTS_POLL_INTERVAL = 2
+REFRESH_EVENTS_KEEPALIVE = 15
+
+# Refresh a client's ledger snapshots (app1/balances.py) on a background
+# thread when account-balances finds rows they do not cover yet; off, only
+# manage.py refresh_ledger_snapshots refreshes them
+LEDGER_SNAPSHOTS_AUTO_REFRESH = config('LEDGER_SNAPSHOTS_AUTO_REFRESH', default=True, cast=bool)
+
+# Threads (and database connections) per process for the queries of the
+# async dashboard views (app1/dashboard.py); capped at DB_POOL_SIZE when the
+# pool is on, so widget queries never wait on slots held by other threads
+DASHBOARD_ASYNC_THREADS = 16
+
+# Per-request query statistics (monitoring/querystats.py).  BUDGETS maps a URL
+# name or route ('default' for all) to limits on queries, db_ms, rows,
+# serialize_ms and bytes; a request over its limits logs a warning.
+QUERY_STATS = {
+    'ENABLED': config('QUERY_STATS_ENABLED', default=True, cast=bool),
+    # X-Query-Stats and Server-Timing on every response; they show any caller
+    # the route's SQL counts and timings, so keep them to development
+    'HEADER': config('QUERY_STATS_HEADER', default=False, cast=bool),
+    # The same SQL fingerprint this many times in one request is an N+1 pattern
+    'N_PLUS_ONE': 5,
+    'BUDGETS': {
+        'default': {'queries': 20, 'db_ms': 1000},
+    },
+}
+
+# Prometheus metrics (monitoring/metrics.py) at /api/_metrics.  Every worker
+# writes its counters to PATH, which all workers of a deployment must share;
+# empty it on deploy.  Scrapers send "Authorization: Bearer <TOKEN>"; the
+# endpoint is not served (404) until METRICS_TOKEN is set.  The same token
+# opens /api/monitoring/query-stats/ and /api/report-cache/stats/.
+METRICS = {
+    'ENABLED': config('METRICS_ENABLED', default=True, cast=bool),
+    'PATH': config('METRICS_DIR', default=str(BASE_DIR / 'metrics')),
+    'FLUSH_INTERVAL': 5,
+    'TOKEN': config('METRICS_TOKEN', default=''),
+}
+
+# Opt-in slow-query log (monitoring/slowlog.py): totals per SQL fingerprint
+# and an EXPLAIN (ANALYZE, BUFFERS) of the first SELECT of each fingerprint
+# slower than THRESHOLD_MS.  Read with manage.py slow_queries.
+SLOW_QUERIES = {
+    'ENABLED': config('SLOW_QUERIES_ENABLED', default=False, cast=bool),
+    'THRESHOLD_MS': config('SLOW_QUERIES_THRESHOLD_MS', default=200, cast=int),
+    'EXPLAIN': True,
+    # Keep bind parameters (and literals in plans) as they are; otherwise only
+    # their types and lengths.  They include passwords from the login lookup.
+    'PARAMS': config('SLOW_QUERIES_PARAMS', default=False, cast=bool),
+    'MAX_FINGERPRINTS': 500,
+    'PATH': BASE_DIR / 'slow_queries',  # one <pid>.json per worker process
+    'FLUSH_INTERVAL': 30,
+}
+
+# Request trace capture for load tests (monitoring/trace.py): one JSONL line
+# per request in PATH/<pid>.jsonl, replayed with manage.py replay_trace.
+# Token claims are kept, tokens are not; request bodies only with BODIES.
+TRACE_CAPTURE = {
+    'ENABLED': config('TRACE_CAPTURE_ENABLED', default=False, cast=bool),
+    'PATH': config('TRACE_CAPTURE_DIR', default=str(BASE_DIR / 'traces')),
+    'SAMPLE_RATE': config('TRACE_CAPTURE_SAMPLE_RATE', default=1.0, cast=float),
+    'BODIES': config('TRACE_CAPTURE_BODIES', default=False, cast=bool),
+    'MAX_BODY': 65536,
+    'EXCLUDE': ['/api/login/', '/api/refresh-events/', '/api/_metrics', '/admin/'],
+}
+
+# Rows per Arrow record batch / Parquet row group in data_export; bounds the
+# memory of one export
+EXPORT_BATCH_SIZE = 50000
+
 REST_FRAMEWORK = {
-    'DEFAULT_AUTHENTICATION_CLASSES': [],
+    'DEFAULT_AUTHENTICATION_CLASSES': [
+        'task_backend.authentication.TenantJWTAuthentication',
+    ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.AllowAny',  # Allow all by default
     ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'rest_framework.renderers.JSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+        # Opt-in with ?format=columnar (task_backend/renderers.py)
+        'task_backend.renderers.ColumnarJSONRenderer',
+    ],
 }
 
 MIDDLEWARE = [
+    'monitoring.querystats.QueryStatsMiddleware',
+    'monitoring.trace.TraceCaptureMiddleware',
     'corsheaders.middleware.CorsMiddleware',
+    'task_backend.replicas.ReplicaPinningMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -122,19 +230,88 @@ WSGI_APPLICATION = 'task_backend.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.0/ref/settings/#databases
 
+# DB_POOL_SIZE > 0 serves connections from a pool per worker process
+# (task_backend/pooled_postgresql); 0 (the default) opens one per request, or
+# keeps it for DB_CONN_MAX_AGE seconds.  Before enabling it, budget:
+# - DB_POOL_SIZE x worker processes (and x databases, replicas included)
+#   against the server's max_connections;
+# - per process, at least the requests served at once (WSGI threads, or ASGI
+#   requests in a sync view) plus DASHBOARD_ASYNC_THREADS, which is capped at
+#   DB_POOL_SIZE; a request waits up to DB_POOL_TIMEOUT for a free slot.
+DB_POOL_SIZE = config('DB_POOL_SIZE', default=0, cast=int)
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
-        'NAME': 'task_sync_db',
-        'USER': 'postgres',
-        'PASSWORD': 'info@imc',
-        'HOST': '88.222.212.14',
-        'PORT': '5432',
+        'ENGINE': 'task_backend.pooled_postgresql',
+        'NAME': config('DB_NAME', default='task_sync_db'),
+        'USER': config('DB_USER', default='postgres'),
+        'PASSWORD': config('DB_PASSWORD', default='info@imc'),
+        'HOST': config('DB_HOST', default='88.222.212.14'),
+        'PORT': config('DB_PORT', default='5432'),
         'TIME_ZONE': 'Asia/Kolkata',
+        'CONN_MAX_AGE': 0 if DB_POOL_SIZE else config('DB_CONN_MAX_AGE', default=0, cast=int),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'pool': DB_POOL_SIZE and {
+                'max_size': DB_POOL_SIZE,
+                # Seconds to wait for a free connection before failing the request
+                'timeout': config('DB_POOL_TIMEOUT', default=10, cast=int),
+                # Replace connections older than this, so server-side memory
+                # and failovers are picked up
+                'max_lifetime': config('DB_POOL_MAX_LIFETIME', default=1800, cast=int),
+                'max_idle': config('DB_POOL_MAX_IDLE', default=600, cast=int),
+                # SELECT 1 before reusing a connection idle this long (when
+                # reset is off; DISCARD ALL already proves it alive)
+                'check_idle': config('DB_POOL_CHECK_IDLE', default=30, cast=int),
+                # DISCARD ALL on checkout: no session state leaks between requests
+                'reset': config('DB_POOL_RESET', default=True, cast=bool),
+            },
+        },
     }
 }
 
 
+# DB_ENGINE=sqlite uses a local SQLite file (DB_NAME, default db.sqlite3)
+# instead, e.g. to benchmark on tenants from manage.py generate_tenants.
+# PostgreSQL-only features (pool, replicas, trigram search) are then off.
+DB_ENGINE = config('DB_ENGINE', default='postgresql')  # postgresql | sqlite
+if DB_ENGINE == 'sqlite':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': config('DB_NAME', default=str(BASE_DIR / 'db.sqlite3')),
+        }
+    }
+
+# Read replicas (task_backend/replicas.py): DB_REPLICA_HOSTS=host[:port],...
+# adds replica_1, replica_2, ... with the primary's credentials.  Report reads
+# go to them; writes, and requests that wrote, stay on the primary.
+_replica_hosts = config('DB_REPLICA_HOSTS', default='', cast=Csv()) if DB_ENGINE == 'postgresql' else []
+for _i, _host in enumerate(_replica_hosts, 1):
+    _host, _, _port = _host.partition(':')
+    DATABASES[f'replica_{_i}'] = {
+        **DATABASES['default'],
+        'HOST': _host,
+        'PORT': _port or DATABASES['default']['PORT'],
+        'OPTIONS': dict(DATABASES['default']['OPTIONS']),
+        'TEST': {'MIRROR': 'default'},
+    }
+
+REPLICAS = {
+    'DATABASES': [alias for alias in DATABASES if alias.startswith('replica_')],
+    'SELECTION': config('DB_REPLICA_SELECTION', default='round_robin'),  # round_robin | least_latency
+    # Skip a replica whose refresh_tag is further behind the primary than this
+    'MAX_LAG': config('DB_REPLICA_MAX_LAG', default=30, cast=int),
+    'CHECK_INTERVAL': 5,
+    # How long a client's reads stay on the primary after it wrote; kept per
+    # tenant and user in the REPORT_CACHE backend (use file or redis with
+    # several workers) and in a cookie
+    'PIN_SECONDS': config('DB_REPLICA_PIN_SECONDS', default=30, cast=int),
+}
+
+DATABASE_ROUTERS = ['task_backend.replicas.ReplicaRouter']
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
 
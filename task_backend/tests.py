@@ -0,0 +1,280 @@
+import threading
+import time
+from unittest import mock
+
+from django.db import OperationalError
+from django.test import SimpleTestCase
+
+from .pooled_postgresql import pool as pool_module
+from .pooled_postgresql.base import DatabaseWrapper
+from .pooled_postgresql.pool import ConnectionPool, PoolTimeout, get_pool, release_connections, released
+
+
+class FakeConnection:
+    """The parts of a psycopg2 connection the pool uses"""
+
+    def __init__(self):
+        self.closed = 0
+        self.autocommit = False
+        self.executed = []
+        self.rolled_back = False
+        self.fail_rollback = False
+        self.info = mock.Mock(transaction_status=0)
+
+    def close(self):
+        self.closed = 1
+
+    def rollback(self):
+        if self.fail_rollback:
+            raise OperationalError('connection lost')
+        self.rolled_back = True
+        self.info.transaction_status = 0
+
+    def cursor(self):
+        connection = self
+
+        class Cursor:
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *exc):
+                return False
+
+            def execute(self, sql):
+                if connection.closed:
+                    raise OperationalError('connection already closed')
+                connection.executed.append(sql)
+
+        return Cursor()
+
+
+class ConnectionPoolTests(SimpleTestCase):
+    def make_pool(self, **options):
+        self.connects = []
+        return ConnectionPool('test', **{'max_size': 2, 'timeout': 0.05, 'reset': False, **options})
+
+    def connect(self):
+        connection = FakeConnection()
+        self.connects.append(connection)
+        return connection
+
+    def test_returned_connection_is_reused(self):
+        pool = self.make_pool()
+        first = pool.getconn(self.connect)
+        pool.putconn(first)
+        self.assertIs(pool.getconn(self.connect), first)
+        self.assertEqual(len(self.connects), 1)
+        self.assertEqual(pool.stats()['created'], 1)
+        self.assertEqual(pool.stats()['checkouts'], 2)
+
+    def test_checkout_times_out_when_every_slot_is_in_use(self):
+        pool = self.make_pool(max_size=1)
+        pool.getconn(self.connect)
+        with self.assertRaises(PoolTimeout):
+            pool.getconn(self.connect)
+        stats = pool.stats()
+        self.assertEqual(stats['timeouts'], 1)
+        self.assertEqual(stats['size'], 1)
+        self.assertEqual(len(self.connects), 1)
+
+    def test_waiter_gets_the_connection_put_back(self):
+        pool = self.make_pool(max_size=1, timeout=5)
+        held = pool.getconn(self.connect)
+        timer = threading.Timer(0.05, pool.putconn, (held,))
+        timer.start()
+        self.assertIs(pool.getconn(self.connect), held)
+        timer.join()
+        self.assertEqual(pool.stats()['waits'], 1)
+
+    def test_failed_connect_releases_its_slot(self):
+        pool = self.make_pool(max_size=1)
+
+        def refuse():
+            raise OperationalError('could not connect')
+
+        with self.assertRaises(OperationalError):
+            pool.getconn(refuse)
+        self.assertEqual(pool.stats()['size'], 0)
+        # The slot is free again: no PoolTimeout
+        pool.getconn(self.connect)
+        self.assertEqual(pool.stats()['size'], 1)
+
+    def test_discarded_connection_is_closed_and_frees_its_slot(self):
+        pool = self.make_pool(max_size=1)
+        connection = pool.getconn(self.connect)
+        pool.putconn(connection, discard=True)
+        self.assertTrue(connection.closed)
+        stats = pool.stats()
+        self.assertEqual((stats['size'], stats['idle'], stats['discarded']), (0, 0, 1))
+        self.assertIsNot(pool.getconn(self.connect), connection)
+
+    def test_closed_idle_connection_is_replaced(self):
+        pool = self.make_pool()
+        connection = pool.getconn(self.connect)
+        pool.putconn(connection)
+        connection.closed = 1
+        self.assertIsNot(pool.getconn(self.connect), connection)
+        self.assertEqual(pool.stats()['discarded'], 1)
+
+    def test_connections_past_max_idle_or_max_lifetime_are_dropped(self):
+        pool = self.make_pool(max_idle=60, max_lifetime=600)
+        connection = pool.getconn(self.connect)
+        pool.putconn(connection)
+        pool._idle[-1].returned -= 61
+        self.assertIsNot(pool.getconn(self.connect), connection)
+
+        old = pool.getconn(self.connect)
+        pool._in_use[id(old)].created -= 601
+        pool.putconn(old)
+        self.assertTrue(old.closed)
+        self.assertEqual(pool.stats()['discarded'], 2)
+
+    def test_idle_check_and_reset(self):
+        pool = self.make_pool(check_idle=30)
+        connection = pool.getconn(self.connect)
+        pool.putconn(connection)
+        pool.getconn(self.connect)
+        self.assertEqual(connection.executed, [])
+        pool.putconn(connection)
+        pool._idle[-1].returned -= 31
+        pool.getconn(self.connect)
+        self.assertEqual(connection.executed, ['SELECT 1'])
+
+        pool.reset = True
+        pool.putconn(connection)
+        pool.getconn(self.connect)
+        self.assertEqual(connection.executed, ['SELECT 1', 'DISCARD ALL'])
+
+    def test_open_transaction_is_rolled_back_on_checkin(self):
+        pool = self.make_pool()
+        connection = pool.getconn(self.connect)
+        connection.info.transaction_status = 2  # TRANSACTION_STATUS_INTRANS
+        pool.putconn(connection)
+        self.assertTrue(connection.rolled_back)
+        self.assertEqual(pool.stats()['idle'], 1)
+
+        connection = pool.getconn(self.connect)
+        connection.info.transaction_status = 2
+        connection.fail_rollback = True
+        pool.putconn(connection)
+        self.assertTrue(connection.closed)
+        self.assertEqual(pool.stats()['idle'], 0)
+
+    def test_connection_from_another_pool_is_closed(self):
+        pool = self.make_pool()
+        stranger = FakeConnection()
+        pool.putconn(stranger)
+        self.assertTrue(stranger.closed)
+        self.assertEqual(pool.stats()['idle'], 0)
+
+    def test_forked_process_gets_its_own_pool(self):
+        with mock.patch.dict(pool_module._pools, clear=True), mock.patch.object(pool_module, '_inherited', []):
+            parent = get_pool('test', {'max_size': 1})
+            self.assertIs(get_pool('test', {'max_size': 1}), parent)
+            with mock.patch.object(pool_module.os, 'getpid', return_value=parent.pid + 1):
+                child = get_pool('test', {'max_size': 1})
+            self.assertIsNot(child, parent)
+            # The parent's sockets stay referenced, never closed by the child
+            self.assertEqual(pool_module._inherited, [parent])
+
+
+class PooledWrapperTests(SimpleTestCase):
+    settings_dict = {
+        'ENGINE': 'task_backend.pooled_postgresql', 'NAME': 'test', 'USER': '', 'PASSWORD': '',
+        'HOST': '', 'PORT': '', 'CONN_MAX_AGE': 0, 'CONN_HEALTH_CHECKS': False, 'AUTOCOMMIT': True,
+        'ATOMIC_REQUESTS': False, 'TIME_ZONE': None, 'OPTIONS': {'pool': {'max_size': 1}},
+    }
+
+    def setUp(self):
+        self.pool = ConnectionPool('pooled', max_size=1, timeout=0.05, reset=False)
+        patcher = mock.patch('task_backend.pooled_postgresql.base.get_pool', return_value=self.pool)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.wrapper = DatabaseWrapper(dict(self.settings_dict), alias='pooled')
+        self.wrapper.connection = self.pool.getconn(FakeConnection)
+
+    def test_close_returns_the_connection(self):
+        connection = self.wrapper.connection
+        self.wrapper._close()
+        self.assertFalse(connection.closed)
+        self.assertEqual(self.pool.stats()['idle'], 1)
+
+    def test_close_inside_atomic_discards_the_connection(self):
+        # atomic() keeps its reference to the connection, so it must not be
+        # handed to another thread
+        connection = self.wrapper.connection
+        self.wrapper.in_atomic_block = True
+        self.wrapper._close()
+        self.assertTrue(connection.closed)
+        stats = self.pool.stats()
+        self.assertEqual((stats['idle'], stats['size'], stats['discarded']), (0, 0, 1))
+
+
+class ReleaseConnectionsTests(SimpleTestCase):
+    def fake_connections(self):
+        pooled = mock.Mock(pool=object(), in_atomic_block=False)
+        in_atomic = mock.Mock(pool=object(), in_atomic_block=True)
+        unpooled = mock.Mock(pool=None, in_atomic_block=False)
+        connections = mock.Mock()
+        connections.all.return_value = [pooled, in_atomic, unpooled]
+        return connections, pooled, in_atomic, unpooled
+
+    def test_only_pooled_connections_outside_atomic_are_closed(self):
+        connections, pooled, in_atomic, unpooled = self.fake_connections()
+        with mock.patch.object(pool_module, 'connections', connections):
+            release_connections()
+        connections.all.assert_called_once_with(initialized_only=True)
+        pooled.close.assert_called_once_with()
+        in_atomic.close.assert_not_called()
+        unpooled.close.assert_not_called()
+
+    def test_released_returns_connections_even_when_the_function_fails(self):
+        connections, pooled, _, _ = self.fake_connections()
+
+        @released
+        def lookup(value):
+            if value is None:
+                raise ValueError('no value')
+            return value * 2
+
+        with mock.patch.object(pool_module, 'connections', connections):
+            self.assertEqual(lookup(2), 4)
+            with self.assertRaises(ValueError):
+                lookup(None)
+        self.assertEqual(pooled.close.call_count, 2)
+        self.assertEqual(lookup.__name__, 'lookup')
+
+
+class PoolConcurrencyTests(SimpleTestCase):
+    def test_threads_never_exceed_max_size(self):
+        pool = ConnectionPool('test', max_size=3, timeout=5, reset=False)
+        in_use = []
+        peak = []
+        lock = threading.Lock()
+        errors = []
+
+        def worker():
+            try:
+                for _ in range(20):
+                    connection = pool.getconn(FakeConnection)
+                    with lock:
+                        in_use.append(connection)
+                        peak.append(len(in_use))
+                    time.sleep(0.001)
+                    with lock:
+                        in_use.remove(connection)
+                    pool.putconn(connection)
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        self.assertLessEqual(max(peak), 3)
+        stats = pool.stats()
+        self.assertEqual(stats['in_use'], 0)
+        self.assertLessEqual(stats['created'], 3)
+        self.assertEqual(stats['checkouts'], 160)
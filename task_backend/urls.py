@@ -35,6 +35,8 @@ urlpatterns = [
     path('api/', include('tender_cash_byuser.urls')),
     path('api/', include('tender_cash_bytype.urls')),
     path("api/", include("stock_summary.urls")),
+    path('api/', include('data_export.urls')),
+    path('api/', include('monitoring.urls')),
     
     
 
@@ -1,17 +1,21 @@
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
-from django.db import connection
+from django.db import connections, router
 import jwt
 from django.conf import settings
+from task_backend.authentication import decode_token
+from task_backend.report_cache import cache_report
+from tendercash.models import TenderCash
 
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
-from django.db import connection
+from django.db import connections, router
 import jwt
 from django.conf import settings
 
 
 @api_view(['GET'])
+@cache_report
 def tender_cash_by_user(request):
     try:
         # 🔐 JWT validation
@@ -22,7 +26,7 @@ def tender_cash_by_user(request):
         token = auth_header.split(' ')[1]
 
         try:
-            payload = jwt.decode(token, settings.SECRET_KEY, algorithms=['HS256'])
+            payload = decode_token(token)
         except jwt.ExpiredSignatureError:
             return Response({'success': False, 'error': 'Token expired'}, status=401)
         except jwt.InvalidTokenError:
@@ -44,7 +48,7 @@ def tender_cash_by_user(request):
             ORDER BY s.userid, t.tender_code
         """
 
-        with connection.cursor() as cursor:
+        with connections[router.db_for_read(TenderCash)].cursor() as cursor:
             cursor.execute(query, [client_id])
             rows = cursor.fetchall()
 
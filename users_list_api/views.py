@@ -1,13 +1,18 @@
 from django.shortcuts import render
 
 # Create your views here.
+from django.views.decorators.http import condition
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
 from app1.models import AccUser
 import jwt
 from django.conf import settings
+from task_backend.authentication import decode_token
+from task_backend.conditional import tenant_etag
 
 
+# Roles are edited in place, so the tag covers the returned columns
+@condition(etag_func=tenant_etag(AccUser, fields=('id', 'role')))
 @api_view(['GET'])
 def users_list(request):
     """Return users list filtered by logged user's client_id"""
@@ -21,7 +26,7 @@ def users_list(request):
 
     try:
         # Decode token
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=['HS256'])
+        payload = decode_token(token)
         client_id = payload.get('client_id')
 
         if not client_id: